@@ -10,13 +10,23 @@ Blackstone repo here -> https://github.com/ICLRandD/Blackstone
 ScispaCy repo here -> https://github.com/allenai/scispacy
 """
 
+import bisect
+import functools
+import itertools
 from collections import defaultdict
-from collections.abc import Iterable
+from collections.abc import Iterable, Iterator
 
+import numpy as np
+from spacy.attrs import ORTH
 from spacy.language import Language
-from spacy.matcher import Matcher
+from spacy.matcher import PhraseMatcher
 from spacy.tokens import Doc, Span
 
+PARENTHESIS = "parenthesis"
+SHORT_FORM = "short_form"
+MAX_BRACKET_SPAN = 8
+"""Most tokens after an opening bracket, up to and including its closing bracket, in a definition"""
+
 
 def find_abbreviation(long_form_candidate: Span, short_form_candidate: Span) -> tuple[Span, Span | None]:
     """
@@ -36,29 +46,62 @@ def find_abbreviation(long_form_candidate: Span, short_form_candidate: Span) ->
     -------
     A Tuple[Span, Optional[Span]], representing the short form abbreviation and the
     span corresponding to the long form expansion, or None if a match is not found.
+    Judgments define the same abbreviations in the same words again and again, so the search
+    is cached on the words of the long form and the text of the short form.
+    """
+    starting_index = long_form_start(tuple(token.text for token in long_form_candidate), short_form_candidate.text)
+    if starting_index is None:
+        return short_form_candidate, None
+    return short_form_candidate, long_form_candidate[starting_index:]
+
+
+def lowered(text: str) -> str | list[str]:
+    """
+    The text lower cased a character at a time, as a string when no character lowers to more than one
     """
-    long_form = " ".join([x.text for x in long_form_candidate])
-    short_form = " ".join([x.text for x in short_form_candidate])
+    lower = text.lower()
+    if len(lower) == len(text):
+        return lower
+    return [character.lower() for character in text]
+
+
+@functools.lru_cache(maxsize=4096)
+def long_form_start(long_words: tuple[str, ...], short_text: str) -> int | None:
+    """
+    Search for the short form's characters in the long form's words, from the end of both.
+    Non alpha-numeric characters of the short form are skipped, so its text gives the same result as its words.
+    Parameters
+    ----------
+    long_words: Tuple[str], required.
+        The text of each word of the long form candidate.
+    short_text: str, required.
+        The text of the short form candidate.
+    Returns
+    -------
+    The index of the word the long form starts at, or None if a match is not found.
+    """
+    long_form = " ".join(long_words)
+    long_lower = lowered(long_form)
+    short_lower = lowered(short_text)
 
     long_index = len(long_form) - 1
-    short_index = len(short_form) - 1
+    short_index = len(short_lower) - 1
     contains_date = 0
     while short_index >= 0:
-        current_char = short_form[short_index].lower()
+        current_char = short_lower[short_index]
         # We don't check non alpha-numeric characters.
         if not current_char.isalnum():
             short_index -= 1
             continue
 
         # ignoring dates that are part of the references to the legislation/legislation abbreviation
-        abrv_date = False
-        if current_char.isnumeric():
-            abrv_date = True
+        abrv_date = current_char.isnumeric()
+        if abrv_date:
             # adjust the index to reflect the fact that it contains a date
             contains_date += 1
 
         while (
-            (long_index >= 0 and long_form[long_index].lower() != current_char and abrv_date is not True)
+            (long_index >= 0 and long_lower[long_index] != current_char and not abrv_date)
             or
             # .... or if we are checking the first character of the abbreviation, we enforce
             # to be the _starting_ character of a span.
@@ -66,7 +109,7 @@ def find_abbreviation(long_form_candidate: Span, short_form_candidate: Span) ->
         ):
             long_index -= 1
             if long_index < 0:
-                return short_form_candidate, None
+                return None
 
         long_index -= 1
         short_index -= 1
@@ -74,17 +117,11 @@ def find_abbreviation(long_form_candidate: Span, short_form_candidate: Span) ->
     # If we complete the string, we end up with -1 here, but really we want all of the text.
     long_index = max(long_index, 0)
 
-    # Converts the char index to the first token beginning after that value so a spaCy span can be returned.
-    word_lengths = contains_date
-    starting_index = None
-
-    for i, word in enumerate(long_form_candidate):
-        word_lengths += len(word)
-        if word_lengths > long_index:
-            starting_index = i
-            break
-
-    return short_form_candidate, long_form_candidate[starting_index:]
+    # Converts the char index to the first word ending after that value, counting the characters of the words
+    # without the spaces between them. When no word does, the long form is all of the text.
+    word_ends = list(itertools.accumulate(len(word) for word in long_words))
+    starting_index = bisect.bisect_right(word_ends, long_index - contains_date)
+    return starting_index if starting_index < len(long_words) else 0
 
 
 def contains(string: str, string_set: Iterable[str]) -> bool:
@@ -206,7 +243,39 @@ def short_form_filter(span: Span) -> bool:
     return True
 
 
-def verify_match_format(matcher_output: list[tuple[int, int, int]], doc: Doc) -> list[tuple[Span, Span]]:
+def bracket_groups(doc: Doc, max_span: int = MAX_BRACKET_SPAN) -> Iterator[tuple[int, int]]:
+    """
+    Pair each closing bracket with the nearest opening bracket before it that is still open, in one pass over the
+    brackets in the document, and yield the innermost pairs. Pairs with other brackets inside them, or with their
+    closing bracket more than `max_span` tokens after the opening one, could not be a definition so are skipped.
+    Parameters
+    ----------
+    doc: Doc, required.
+        Doc object of the judgment content.
+    max_span: int, optional.
+        Most tokens from the opening to the closing bracket of a pair.
+    Returns
+    -------
+    Iterator[Tuple[int, int]], start and end position of each group, including its brackets
+    """
+    orths = doc.to_array(ORTH)
+    is_opening = orths == doc.vocab.strings["("]
+    brackets = np.flatnonzero(is_opening | (orths == doc.vocab.strings[")"]))
+
+    still_open: list[int] = []
+    previous = -1
+    for position, opening in zip(brackets.tolist(), is_opening[brackets].tolist(), strict=True):
+        if opening:
+            still_open.append(position)
+        elif still_open:
+            start = still_open.pop()
+            # the pair is innermost when its opening bracket was the last bracket seen
+            if start == previous and position - start <= max_span:
+                yield start, position + 1
+        previous = position
+
+
+def verify_match_format(matcher_output: list[tuple[int, int, int]], doc: Doc) -> list[tuple[int, int, int]]:
     """
     Verify that the matches appear in a form where such as ("abbrv") or ("long_form") with quotes
     and brackets as the first two and final two characters
@@ -219,31 +288,25 @@ def verify_match_format(matcher_output: list[tuple[int, int, int]], doc: Doc) ->
         Doc object of the judgment content.
     Returns
     -------
-    List[Tuple[Span, Span]], List of match start and end position
+    List[Tuple[int, int, int]], the matches in that form, in the order they were given
     """
+    QUOTES = ['"', "'", "‘", "’", "“", "”"]
+    BRACKETS = ["(", ")"]
+    verified = []
     for match in matcher_output:
-        QUOTES = ['"', "'", "‘", "’", "“", "”"]
-        BRACKETS = ["(", ")"]
         start = match[1]
         end = match[2] - 1
 
-        if end - start > 8:
-            matcher_output.remove(match)
-
-        # verify that the match is wrapped in quotes and brackets
-        elif (
-            not contains(str(doc[start + 1]), QUOTES)
-            or not contains(str(doc[end - 1]), QUOTES)
-            or not contains(str(doc[start]), BRACKETS)
-            or not contains(str(doc[end]), BRACKETS)
+        # verify that the match is short enough, and wrapped in quotes and brackets
+        if (
+            end - start <= MAX_BRACKET_SPAN
+            and contains(str(doc[start + 1]), QUOTES)
+            and contains(str(doc[end - 1]), QUOTES)
+            and contains(str(doc[start]), BRACKETS)
+            and contains(str(doc[end]), BRACKETS)
         ):
-            print(str(doc[start:end]))
-            matcher_output.remove(match)
-    return None  # type:ignore
-    # This return value is depended on elsewhere in the code, but previously
-    # it did not exist at all. Understanding how the abbreviation code is
-    # meant to work is a task for the future.
-    # TODO: https://trello.com/c/horD3P3F/693-enrichment-pipeline-abbreviations-not-functional
+            verified.append(match)
+    return verified
 
 
 class AbbreviationDetector:
@@ -258,7 +321,7 @@ class AbbreviationDetector:
 
     def __init__(self, nlp: Language) -> None:
         """
-        Initialises the patterns and vocabulary to be used by spaCy's matcher
+        Initialises the extensions set by the detector
         Parameters
         ----------
         nlp: construct a Doc object via spaCy's nlp object
@@ -266,10 +329,7 @@ class AbbreviationDetector:
         Doc.set_extension("abbreviations", default=[], force=True)
         Span.set_extension("long_form", default=None, force=True)
 
-        self.matcher = Matcher(nlp.vocab)
-        patterns = [[{"ORTH": "("}, {"OP": "+"}, {"ORTH": ")"}]]
-        self.matcher.add("parenthesis", patterns)
-        self.global_matcher = Matcher(nlp.vocab)
+        self.match_id = nlp.vocab.strings.add(PARENTHESIS)
 
     def find(self, span: Span, doc: Doc) -> tuple[Span, set[Span]]:
         """
@@ -307,26 +367,19 @@ class AbbreviationDetector:
         -------
         Doc, Doc object of the judgment content.
         """
-        matches = self.matcher(doc)
-
-        matches_brackets = [(x[0], x[1], x[2]) for x in matches]
+        matches_brackets = [(self.match_id, start, end) for start, end in bracket_groups(doc)]
 
         matcher_output = verify_match_format(matches_brackets, doc)
-        # verify_match_format returns None, which is incorrect and means this section can not
-        # have been run in it's current format.
-        print(matcher_output)
-        if matcher_output:
-            matches_no_brackets = [
-                (x[0], x[1] + 1, x[2] - 1)  # type:ignore
-                for x in matcher_output
-            ]
-            filtered = filter_matches(matches_no_brackets, doc)
-            occurrences = self.find_matches_for(filtered, doc)
-
-            for long_form, short_forms in occurrences:
-                for short in short_forms:
-                    short._.long_form = long_form
-                    doc._.abbreviations.append(short)
+        matches_no_brackets = [(match_id, start + 1, end - 1) for match_id, start, end in matcher_output]
+        filtered = filter_matches(matches_no_brackets, doc)
+        occurrences = self.find_matches_for(filtered, doc)
+
+        # set a new list on each doc, as the extension's default list is shared by every doc
+        doc._.abbreviations = []
+        for long_form, short_forms in occurrences:
+            for short in short_forms:
+                short._.long_form = long_form
+                doc._.abbreviations.append(short)
 
         return doc
 
@@ -344,7 +397,7 @@ class AbbreviationDetector:
         List[Tuple[Span, Set[Span]]], for all short form and long form candidates found after filtering,
         list of the match and every occurance of the match in the judgment body
         """
-        rules = {}
+        long_forms: dict[tuple[int, ...], list[Span]] = defaultdict(list)
         all_occurences: dict[Span, set[Span]] = defaultdict(set)
         already_seen_long: set[str] = set()
         already_seen_short: set[str] = set()
@@ -355,24 +408,25 @@ class AbbreviationDetector:
             # pathalogical case also, as it would mean an abbreviation had been
             # defined twice in a document. There's not much we can do about this,
             # but at least the case which is discarded will be picked up below by
-            # the global matcher. So it's likely that things will work out ok most of the time.
+            # the phrase matcher. So it's likely that things will work out ok most of the time.
             new_long = long.text not in already_seen_long if long else False
             new_short = short.text not in already_seen_short
             if long is not None and new_long and new_short:
                 already_seen_long.add(long.text)
                 already_seen_short.add(short.text)
                 all_occurences[long].add(short)
-                rules[long.text] = long
-                # Add a rule to a matcher to find exactly this substring.
-                self.global_matcher.add(long.text, [[{"ORTH": x.text} for x in short]])
-        to_remove = set()
-        global_matches = self.global_matcher(doc)
-        for match, start, end in global_matches:
-            string_key = self.global_matcher.vocab.strings[match]
-            to_remove.add(string_key)
-            all_occurences[rules[string_key]].add(doc[start:end])
-        for key in to_remove:
-            # Clean up the global matcher.
-            self.global_matcher.remove(key)
+                long_forms[tuple(token.orth for token in short)].append(long)
+        if not long_forms:
+            return []
+
+        # Find every occurrence of the short forms at once, with a matcher built for this document alone
+        # so that the detector holds no state between documents.
+        patterns = [Doc(doc.vocab, words=[doc.vocab.strings[orth] for orth in orths]) for orths in long_forms]
+        matcher = PhraseMatcher(doc.vocab)
+        matcher.add(SHORT_FORM, patterns)
+        for _, start, end in matcher(doc):
+            occurrence = doc[start:end]
+            for long in long_forms[tuple(token.orth for token in occurrence)]:
+                all_occurences[long].add(occurrence)
 
         return list(all_occurences.items())
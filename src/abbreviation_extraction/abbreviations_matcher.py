@@ -8,6 +8,7 @@ from collections import namedtuple
 from spacy.language import Language
 
 from abbreviation_extraction.abbreviations import AbbreviationDetector
+from utils.metrics import instrument_stage
 
 abb = namedtuple("abb", "abb_match longform")
 
@@ -39,6 +40,7 @@ def chunking_mechanism(docobj, n, start, end):
     return judgment_chunks
 
 
+@instrument_stage("abbreviations")
 def abb_pipeline(judgment_content_text: str, nlp) -> list[abb]:
     """
     Main controller of the abbreviation detection pipeline.
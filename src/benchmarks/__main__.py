@@ -0,0 +1,293 @@
+"""
+Command line for the enrichment benchmarks. Run from `src`:
+
+    python -m benchmarks run --output results.json
+    python -m benchmarks run --judgments synthetic --synthetic 500:2:30 --stages caselaw legislation
+    python -m benchmarks run --judgments synthetic --synthetic 2000:4:10:50 --stages caselaw
+    python -m benchmarks compare baseline.json results.json --threshold 0.2
+    python -m benchmarks pipeline --judgments synthetic --synthetic 500:2:30
+    python -m benchmarks cold-start --handlers vlex_upload fetch_xml
+    python -m benchmarks corrections --count 10000
+    python -m benchmarks brackets --judgments synthetic --synthetic 2000:4:10
+    python -m benchmarks abbreviations --judgments fixtures
+    python -m benchmarks legislation-workers --judgments synthetic --synthetic 500:3:40 --workers 1 2 4 8
+"""
+
+import argparse
+import sys
+
+from benchmarks import abbreviations, brackets, cold_start, corrections, legislation_workers
+from benchmarks.orchestration import pipeline_results, run_pipeline
+from benchmarks.runner import (
+    DEFAULT_REPEAT,
+    DEFAULT_THRESHOLD,
+    compare_results,
+    read_results,
+    run_benchmarks,
+    write_results,
+)
+from benchmarks.stages import STAGES, BenchmarkInput, fixture_inputs, synthetic_input
+
+DEFAULT_SYNTHETIC = ["50:1:5", "200:2:20"]
+
+
+def synthetic_size(value: str) -> tuple[int, float, int, int | None]:
+    """
+    Parse a PARAGRAPHS:DENSITY:YEARS[:CASES] size for a synthetic judgment
+    """
+    try:
+        paragraphs, density, years, *cases = value.split(":")
+        if len(cases) > 1:
+            raise ValueError
+        return int(paragraphs), float(density), int(years), int(cases[0]) if cases else None
+    except ValueError as exception:
+        msg = f"expected PARAGRAPHS:DENSITY:YEARS[:CASES], got {value!r}"
+        raise argparse.ArgumentTypeError(msg) from exception
+
+
+def benchmark_inputs(judgments: str, sizes: list[tuple[int, float, int, int | None]]) -> list[BenchmarkInput]:
+    inputs = []
+    if judgments in {"fixtures", "all"}:
+        inputs.extend(fixture_inputs())
+    if judgments in {"synthetic", "all"}:
+        inputs.extend(synthetic_input(*size) for size in sizes)
+    return inputs
+
+
+def report_cold_starts(handlers: list[str], budgets: str, repeat: int, top: int) -> int:
+    cold_starts, problems = cold_start.audit(handlers, cold_start.read_budgets(budgets), repeat)
+    for measured in cold_starts:
+        packages = ", ".join(f"{package} {duration}ms" for package, duration in measured.top(top))
+        print(f"{measured.handler}: {measured.total_ms}ms ({packages})")
+    for handler, found in problems.items():
+        for problem in found:
+            print(f"OVER BUDGET {handler} {problem}")
+    return 1 if problems else 0
+
+
+def report_pipeline(judgments: list[BenchmarkInput], parallel: bool, output: str | None) -> None:
+    timings = {}
+    for judgment in judgments:
+        _, timings[judgment.name] = run_pipeline(judgment, parallel=parallel)
+        print(f"{judgment.name}: {timings[judgment.name]}")
+    if output:
+        write_results({"results": pipeline_results(timings)}, output)
+
+
+def report_corrections(count: int, repeat: int, output: str | None) -> None:
+    result = corrections.time_corrections(*corrections.manifest_citations(count), repeat)
+    print(f"{result['citations']} citations: median {result['median_s']:.4f}s, {result['citations_per_s']}/s")
+    if output:
+        write_results({"results": {f"corrections/{count}": result}}, output)
+
+
+def report_brackets(judgments: list[BenchmarkInput], output: str | None) -> None:
+    measurements = {}
+    for judgment in judgments:
+        measurements[judgment.name] = brackets.measure_brackets(judgment)
+        for finder, found in measurements[judgment.name].items():
+            print(
+                f"{judgment.name} {finder}: {found['groups']} groups in {found['time_s']:.4f}s, "
+                f"peak {found['peak_bytes'] / 2**20:.1f}MiB",
+            )
+    if output:
+        write_results({"results": measurements}, output)
+
+
+def report_abbreviations(judgments: list[BenchmarkInput], repeat: int, output: str | None) -> None:
+    timings = {}
+    for judgment in judgments:
+        timings[judgment.name] = abbreviations.measure_occurrences(judgment, repeat)
+        for finder, found in timings[judgment.name].items():
+            print(
+                f"{judgment.name} {finder}: {found['occurrences']} occurrences of {found['abbreviations']} "
+                f"abbreviations, median {found['median_s']:.4f}s",
+            )
+    timings["find_abbreviation"] = abbreviations.measure_find_abbreviation(judgments, repeat)
+    for search, found in timings["find_abbreviation"].items():
+        print(
+            f"find_abbreviation {search}: {found['candidates']} candidates, median {found['median_s']:.6f}s, "
+            f"{found['candidates_per_s']}/s",
+        )
+    if output:
+        write_results({"results": timings}, output)
+
+
+def report_legislation_workers(
+    judgments: list[BenchmarkInput],
+    workers: list[int],
+    repeat: int,
+    output: str | None,
+) -> None:
+    timings = {}
+    for judgment in judgments:
+        timings[judgment.name] = legislation_workers.time_workers(judgment, workers, repeat)
+        for found in timings[judgment.name].values():
+            print(
+                f"{judgment.name} {found['workers']} workers: {found['references']} references"
+                f"{'' if found['same_references'] else ' (DIFFERENT)'}, median {found['median_s']:.4f}s, "
+                f"{found['speedup']}x",
+            )
+    if output:
+        write_results({"results": timings}, output)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmark the enrichment stages")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="time the stages and write the results as JSON")
+    run_parser.add_argument("--output", default="benchmark_results.json")
+    run_parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    run_parser.add_argument("--judgments", choices=["fixtures", "synthetic", "all"], default="all")
+    run_parser.add_argument(
+        "--synthetic",
+        nargs="+",
+        type=synthetic_size,
+        default=[synthetic_size(size) for size in DEFAULT_SYNTHETIC],
+        metavar="PARAGRAPHS:DENSITY:YEARS[:CASES]",
+        help=(
+            "sizes of the synthetic judgments, with density given as citations per paragraph, "
+            "and optionally the number of distinct cases cited"
+        ),
+    )
+    run_parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+
+    compare_parser = commands.add_parser("compare", help="flag benchmarks that have slowed down")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="fractional slowdown that counts as a regression",
+    )
+
+    pipeline_parser = commands.add_parser(
+        "pipeline",
+        help="enrich judgments with the detectors running at the same time and report the critical path",
+    )
+    pipeline_parser.add_argument("--output", help="also write the timings as JSON")
+    pipeline_parser.add_argument("--judgments", choices=["fixtures", "synthetic", "all"], default="all")
+    pipeline_parser.add_argument(
+        "--synthetic",
+        nargs="+",
+        type=synthetic_size,
+        default=[synthetic_size(size) for size in DEFAULT_SYNTHETIC],
+        metavar="PARAGRAPHS:DENSITY:YEARS[:CASES]",
+    )
+    pipeline_parser.add_argument("--sequential", action="store_true", help="run the detectors one after another")
+
+    cold_start_parser = commands.add_parser(
+        "cold-start",
+        help="time importing each lambda's handler and check it against its budget",
+    )
+    cold_start_parser.add_argument(
+        "--handlers",
+        nargs="+",
+        choices=cold_start.handlers(),
+        default=cold_start.handlers(),
+    )
+    cold_start_parser.add_argument("--budgets", default=cold_start.DEFAULT_BUDGETS)
+    cold_start_parser.add_argument("--repeat", type=int, default=cold_start.DEFAULT_REPEAT)
+    cold_start_parser.add_argument("--top", type=int, default=5, help="number of the slowest packages to list")
+
+    corrections_parser = commands.add_parser(
+        "corrections",
+        help="measure how many case law citations are corrected and given URIs each second",
+    )
+    corrections_parser.add_argument("--count", type=int, default=corrections.DEFAULT_COUNT)
+    corrections_parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    corrections_parser.add_argument("--output", help="also write the result as JSON, for `compare`")
+
+    brackets_parser = commands.add_parser(
+        "brackets",
+        help="compare the memory used finding bracketed groups by pairing brackets and by the parenthesis Matcher",
+    )
+    brackets_parser.add_argument("--output", help="also write the measurements as JSON")
+    brackets_parser.add_argument("--judgments", choices=["fixtures", "synthetic", "all"], default="all")
+    brackets_parser.add_argument(
+        "--synthetic",
+        nargs="+",
+        type=synthetic_size,
+        default=[synthetic_size(size) for size in DEFAULT_SYNTHETIC],
+        metavar="PARAGRAPHS:DENSITY:YEARS[:CASES]",
+    )
+
+    abbreviations_parser = commands.add_parser(
+        "abbreviations",
+        help="compare the time taken finding every occurrence of each abbreviation a judgment defines",
+    )
+    abbreviations_parser.add_argument("--output", help="also write the timings as JSON")
+    abbreviations_parser.add_argument("--judgments", choices=["fixtures", "synthetic", "all"], default="fixtures")
+    abbreviations_parser.add_argument(
+        "--synthetic",
+        nargs="+",
+        type=synthetic_size,
+        default=[synthetic_size(size) for size in DEFAULT_SYNTHETIC],
+        metavar="PARAGRAPHS:DENSITY:YEARS[:CASES]",
+    )
+    abbreviations_parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+
+    workers_parser = commands.add_parser(
+        "legislation-workers",
+        help="time fuzzy matching legislation split by year between different numbers of worker processes",
+    )
+    workers_parser.add_argument("--output", help="also write the timings as JSON")
+    workers_parser.add_argument("--judgments", choices=["fixtures", "synthetic", "all"], default="synthetic")
+    workers_parser.add_argument(
+        "--synthetic",
+        nargs="+",
+        type=synthetic_size,
+        default=[synthetic_size("500:3:40")],
+        metavar="PARAGRAPHS:DENSITY:YEARS[:CASES]",
+    )
+    workers_parser.add_argument("--workers", nargs="+", type=int, default=legislation_workers.DEFAULT_WORKERS)
+    workers_parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "legislation-workers":
+        report_legislation_workers(
+            benchmark_inputs(args.judgments, args.synthetic),
+            args.workers,
+            args.repeat,
+            args.output,
+        )
+        return 0
+
+    if args.command == "abbreviations":
+        report_abbreviations(benchmark_inputs(args.judgments, args.synthetic), args.repeat, args.output)
+        return 0
+
+    if args.command == "brackets":
+        report_brackets(benchmark_inputs(args.judgments, args.synthetic), args.output)
+        return 0
+
+    if args.command == "corrections":
+        report_corrections(args.count, args.repeat, args.output)
+        return 0
+
+    if args.command == "cold-start":
+        return report_cold_starts(args.handlers, args.budgets, args.repeat, args.top)
+
+    if args.command == "pipeline":
+        report_pipeline(benchmark_inputs(args.judgments, args.synthetic), not args.sequential, args.output)
+        return 0
+
+    if args.command == "run":
+        results = run_benchmarks(benchmark_inputs(args.judgments, args.synthetic), args.stages, args.repeat)
+        write_results(results, args.output)
+        for name, result in results["results"].items():
+            print(f"{name}: median {result['median_s']:.4f}s")
+        return 0
+
+    comparisons, regressions = compare_results(read_results(args.baseline), read_results(args.current), args.threshold)
+    for comparison in comparisons:
+        flag = "REGRESSION " if comparison in regressions else ""
+        print(f"{flag}{comparison}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+"""
+Throughput of finding every occurrence of the abbreviations defined in a judgment, comparing the phrase matcher
+`AbbreviationDetector.find_matches_for` builds for each document with the shared Matcher it used to add a rule to for
+each abbreviation and clear again afterwards.
+
+Also the throughput of `find_abbreviation` on the definitions in the judgments, with its cache cleared before each run
+and kept warm between runs, against the search it replaced, which joined and lowered the text of every candidate:
+
+    python -m benchmarks abbreviations --judgments fixtures
+"""
+
+import statistics
+import time
+from collections import defaultdict
+from collections.abc import Callable
+from typing import Any
+
+from spacy.matcher import Matcher
+from spacy.tokens import Doc, Span
+
+from abbreviation_extraction.abbreviations import (
+    AbbreviationDetector,
+    bracket_groups,
+    filter_matches,
+    find_abbreviation,
+    long_form_start,
+)
+from benchmarks.stages import BenchmarkInput, blank_nlp
+
+Occurrences = list[tuple[Span, set[Span]]]
+
+
+def harvest_candidates(doc: Doc) -> list[tuple[Span, Span]]:
+    """
+    The long and short form candidates of the definitions in a document, as the detector filters them
+    """
+    return filter_matches([(0, start + 1, end - 1) for start, end in bracket_groups(doc)], doc)
+
+
+def character_scan_abbreviation(long_form_candidate: Span, short_form_candidate: Span) -> tuple[Span, Span | None]:
+    """
+    The long form of an abbreviation found as it was before `find_abbreviation` was cached, lowering each character
+    of the joined text of the candidates as it is compared
+    """
+    long_form = " ".join([x.text for x in long_form_candidate])
+    short_form = " ".join([x.text for x in short_form_candidate])
+
+    long_index = len(long_form) - 1
+    short_index = len(short_form) - 1
+    contains_date = 0
+    while short_index >= 0:
+        current_char = short_form[short_index].lower()
+        if not current_char.isalnum():
+            short_index -= 1
+            continue
+
+        abrv_date = False
+        if current_char.isnumeric():
+            abrv_date = True
+            contains_date += 1
+
+        while (long_index >= 0 and long_form[long_index].lower() != current_char and abrv_date is not True) or (
+            short_index == 0 and long_index > 0 and long_form[long_index - 1].isalnum()
+        ):
+            long_index -= 1
+            if long_index < 0:
+                return short_form_candidate, None
+
+        long_index -= 1
+        short_index -= 1
+
+    long_index = max(long_index, 0)
+
+    word_lengths = contains_date
+    starting_index = None
+    for i, word in enumerate(long_form_candidate):
+        word_lengths += len(word)
+        if word_lengths > long_index:
+            starting_index = i
+            break
+
+    return short_form_candidate, long_form_candidate[starting_index:]
+
+
+def matcher_occurrences(filtered: list[tuple[Span, Span]], doc: Doc, matcher: Matcher) -> Occurrences:
+    """
+    Occurrences of the abbreviations found as they were with a shared Matcher, one rule for each abbreviation
+    """
+    rules = {}
+    all_occurences: dict[Span, set[Span]] = defaultdict(set)
+    already_seen_long: set[str] = set()
+    already_seen_short: set[str] = set()
+    for long_candidate, short_candidate in filtered:
+        short, long = find_abbreviation(long_candidate, short_candidate)
+        new_long = long.text not in already_seen_long if long else False
+        new_short = short.text not in already_seen_short
+        if long is not None and new_long and new_short:
+            already_seen_long.add(long.text)
+            already_seen_short.add(short.text)
+            all_occurences[long].add(short)
+            rules[long.text] = long
+            matcher.add(long.text, [[{"ORTH": x.text} for x in short]])
+    for match, start, end in matcher(doc):
+        all_occurences[rules[doc.vocab.strings[match]]].add(doc[start:end])
+    for key in rules:
+        matcher.remove(key)
+    return list(all_occurences.items())
+
+
+def time_occurrences(
+    finder: Callable[[list[tuple[Span, Span]], Doc], Occurrences],
+    filtered: list[tuple[Span, Span]],
+    doc: Doc,
+    repeat: int,
+) -> dict[str, Any]:
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        occurrences = finder(filtered, doc)
+        runs.append(time.perf_counter() - start)
+    median_s = statistics.median(runs)
+    return {
+        "abbreviations": len(occurrences),
+        "occurrences": sum(len(found) for _, found in occurrences),
+        "min_s": round(min(runs), 6),
+        "median_s": round(median_s, 6),
+        "documents_per_s": round(1 / median_s) if median_s else None,
+    }
+
+
+def measure_occurrences(judgment: BenchmarkInput, repeat: int) -> dict[str, dict[str, Any]]:
+    """
+    Time each way of finding the occurrences of the abbreviations defined in a judgment
+    """
+    nlp = blank_nlp()
+    doc = nlp(judgment.text)
+    filtered = harvest_candidates(doc)
+    detector = AbbreviationDetector(nlp)
+    matcher = Matcher(nlp.vocab)
+    finders: dict[str, Callable[[list[tuple[Span, Span]], Doc], Occurrences]] = {
+        "matcher": lambda filtered, doc: matcher_occurrences(filtered, doc, matcher),
+        "phrase_matcher": detector.find_matches_for,
+    }
+    return {name: time_occurrences(finder, filtered, doc, repeat) for name, finder in finders.items()}
+
+
+def time_find_abbreviation(candidates: list[tuple[Span, Span]], repeat: int) -> dict[str, dict[str, Any]]:
+    """
+    Time finding the long form of every candidate definition with each search
+    """
+
+    def cold(long_form_candidate: Span, short_form_candidate: Span) -> tuple[Span, Span | None]:
+        return find_abbreviation(long_form_candidate, short_form_candidate)
+
+    searches: dict[str, Callable[[Span, Span], tuple[Span, Span | None]]] = {
+        "character_scan": character_scan_abbreviation,
+        "cached_cold": cold,
+        "cached_warm": find_abbreviation,
+    }
+    timings = {}
+    long_form_start.cache_clear()
+    for name, search in searches.items():
+        runs = []
+        for _ in range(repeat):
+            if name == "cached_cold":
+                long_form_start.cache_clear()
+            start = time.perf_counter()
+            for long_candidate, short_candidate in candidates:
+                search(long_candidate, short_candidate)
+            runs.append(time.perf_counter() - start)
+        median_s = statistics.median(runs)
+        timings[name] = {
+            "candidates": len(candidates),
+            "min_s": round(min(runs), 6),
+            "median_s": round(median_s, 6),
+            "candidates_per_s": round(len(candidates) / median_s) if median_s else None,
+        }
+    return timings
+
+
+def measure_find_abbreviation(judgments: list[BenchmarkInput], repeat: int) -> dict[str, dict[str, Any]]:
+    """
+    Time each search on the candidate definitions harvested from all of the judgments
+    """
+    nlp = blank_nlp()
+    candidates = [candidate for judgment in judgments for candidate in harvest_candidates(nlp(judgment.text))]
+    return time_find_abbreviation(candidates, repeat)
@@ -0,0 +1,60 @@
+"""
+Memory and time taken to find the bracketed groups that may define an abbreviation, comparing the single pass bracket
+pairing `AbbreviationDetector` uses with the parenthesis Matcher it replaced. The Matcher matched from every opening
+bracket to every later closing bracket, so its matches grew with the square of the brackets in a judgment:
+
+    python -m benchmarks brackets --judgments synthetic --synthetic 2000:4:10
+"""
+
+import time
+import tracemalloc
+from collections.abc import Callable
+from typing import Any
+
+from spacy.matcher import Matcher
+from spacy.tokens import Doc
+
+from abbreviation_extraction.abbreviations import bracket_groups
+from benchmarks.stages import BenchmarkInput, blank_nlp
+
+
+def parenthesis_matches(doc: Doc) -> list[tuple[int, int]]:
+    """
+    Every span from an opening bracket to a later closing bracket, as the parenthesis Matcher found them
+    """
+    matcher = Matcher(doc.vocab)
+    matcher.add("parenthesis", [[{"ORTH": "("}, {"OP": "+"}, {"ORTH": ")"}]])
+    return [(start, end) for _, start, end in matcher(doc)]
+
+
+def paired_brackets(doc: Doc) -> list[tuple[int, int]]:
+    return list(bracket_groups(doc))
+
+
+FINDERS: dict[str, Callable[[Doc], list[tuple[int, int]]]] = {
+    "matcher": parenthesis_matches,
+    "pairing": paired_brackets,
+}
+
+
+def measure(finder: Callable[[Doc], list[tuple[int, int]]], doc: Doc) -> dict[str, Any]:
+    """
+    Find the groups in a document, tracing the memory allocated while doing so
+    """
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        groups = finder(doc)
+        duration = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"groups": len(groups), "time_s": round(duration, 6), "peak_bytes": peak}
+
+
+def measure_brackets(judgment: BenchmarkInput) -> dict[str, dict[str, Any]]:
+    """
+    Measure each way of finding the bracketed groups in a judgment
+    """
+    doc = blank_nlp()(judgment.text)
+    return {name: measure(finder, doc) for name, finder in FINDERS.items()}
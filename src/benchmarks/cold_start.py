@@ -0,0 +1,162 @@
+"""
+Audit how long each lambda's handler module takes to import, which is paid on every cold start.
+
+Each handler is imported in a fresh interpreter with `python -X importtime`, and the time is attributed to the
+top level packages it pulls in. Budgets for the total import time, and packages a handler should not import at all,
+are read from `cold_start_budgets.json`:
+
+    python -m benchmarks cold-start
+    python -m benchmarks cold-start --handlers vlex_upload fetch_xml --top 10
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, NamedTuple
+
+SRC_DIR = Path(__file__).parent.parent.resolve()
+LAMBDAS_DIR = SRC_DIR / "lambdas"
+DEFAULT_BUDGETS = Path(__file__).parent / "cold_start_budgets.json"
+DEFAULT_REPEAT = 3
+
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$")
+ENV_VARIABLE = re.compile(r"""(?:validate_env_variable|os\.getenv|os\.environ\.get)\(\s*["']([A-Z0-9_]+)["']""")
+
+# environment variables read when handlers are imported which need a particular form of value
+ENVIRONMENT_OVERRIDES = {
+    "FORWARD_TO_VLEX_ENABLED": "false",
+    "VALIDATE_USING_SCHEMA": "0",
+    "DETECTION_QUEUE_NAMES": "cold-start-audit",
+    "AWS_DEFAULT_REGION": "eu-west-2",
+}
+
+
+class ImportTiming(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(output: str) -> list[ImportTiming]:
+    """
+    Read the lines written to stderr by `python -X importtime`
+    """
+    timings = []
+    for line in output.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            timings.append(ImportTiming(module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return timings
+
+
+def package_times(timings: list[ImportTiming]) -> Counter[str]:
+    """
+    Total import time in microseconds of each top level package, including its own submodules
+    """
+    totals: Counter[str] = Counter()
+    for timing in timings:
+        totals[timing.module.partition(".")[0]] += timing.self_us
+    return totals
+
+
+def handlers() -> list[str]:
+    return sorted(path.parent.name for path in LAMBDAS_DIR.glob("*/index.py"))
+
+
+def handler_environment(handler: str) -> dict[str, str]:
+    """
+    Placeholder values for every environment variable the handler reads, so it can be imported outside Lambda
+    """
+    names = ENV_VARIABLE.findall((LAMBDAS_DIR / handler / "index.py").read_text())
+    placeholders = {name: ENVIRONMENT_OVERRIDES.get(name, "cold-start-audit") for name in names}
+    # as deployed, the handler's directory comes first, with the shared packages copied in alongside it
+    python_path = os.pathsep.join([str(LAMBDAS_DIR / handler), str(SRC_DIR)])
+    return {**os.environ, **ENVIRONMENT_OVERRIDES, **placeholders, "PYTHONPATH": python_path}
+
+
+def import_handler(handler: str) -> list[ImportTiming]:
+    """
+    Import a handler's module in a fresh interpreter and time every import it makes
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import index"],
+        cwd=LAMBDAS_DIR / handler,
+        env=handler_environment(handler),
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if result.returncode:
+        error = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+        msg = f"Could not import {handler}: {error[-1] if error else result.returncode}"
+        raise RuntimeError(msg)
+    return parse_importtime(result.stderr)
+
+
+@dataclass
+class ColdStart:
+    handler: str
+    total_ms: float
+    """Median time to import the handler's module, including everything it imports"""
+    packages_ms: dict[str, float]
+    """Time taken by each top level package in the median run, slowest first"""
+
+    def top(self, count: int) -> list[tuple[str, float]]:
+        return list(self.packages_ms.items())[:count]
+
+
+def measure_cold_start(handler: str, repeat: int = DEFAULT_REPEAT) -> ColdStart:
+    runs = []
+    for _ in range(repeat):
+        timings = import_handler(handler)
+        handler_module = next(timing for timing in timings if timing.module == "index")
+        runs.append((handler_module.cumulative_us, timings))
+    total_us, timings = sorted(runs, key=lambda run: run[0])[len(runs) // 2]
+    packages = package_times(timings)
+    return ColdStart(
+        handler,
+        round(total_us / 1000, 1),
+        {package: round(us / 1000, 1) for package, us in packages.most_common()},
+    )
+
+
+def read_budgets(path: str | Path = DEFAULT_BUDGETS) -> dict[str, Any]:
+    with open(path, encoding="utf-8") as budgets_file:
+        return json.load(budgets_file)
+
+
+def check_budget(cold_start: ColdStart, budgets: dict[str, Any]) -> list[str]:
+    """
+    :return: a description of each way the handler's imports break its budget
+    """
+    budget = {**budgets.get("default", {}), **budgets.get("handlers", {}).get(cold_start.handler, {})}
+    problems = []
+    if "total_ms" in budget and cold_start.total_ms > budget["total_ms"]:
+        problems.append(f"imports take {cold_start.total_ms}ms, over its budget of {budget['total_ms']}ms")
+    problems.extend(
+        f"imports {package}, which it should only load when needed"
+        for package in budget.get("forbidden", [])
+        if package in cold_start.packages_ms
+    )
+    return problems
+
+
+def audit(
+    handler_names: list[str],
+    budgets: dict[str, Any],
+    repeat: int = DEFAULT_REPEAT,
+) -> tuple[list[ColdStart], dict[str, list[str]]]:
+    """
+    Measure the cold start imports of each handler and check them against their budgets
+    :return: the measurements, and the problems found with each handler over budget
+    """
+    cold_starts = [measure_cold_start(handler, repeat) for handler in handler_names]
+    problems = {cold_start.handler: check_budget(cold_start, budgets) for cold_start in cold_starts}
+    return cold_starts, {handler: found for handler, found in problems.items() if found}
@@ -0,0 +1,71 @@
+"""
+Throughput of resolving case law citations: correcting malformed citations to their canonical form and building their
+URIs, which `case_pipeline` does for every distinct citation in a judgment.
+
+The citations are the match and canonical examples from the citation manifest, drawn at random from a fixed seed:
+
+    python -m benchmarks corrections --count 10000
+"""
+
+import csv
+import random
+import statistics
+import time
+from typing import Any
+
+from benchmarks.fake_db import MANIFEST_CSV
+from caselaw_extraction.caselaw_matcher import compile_rule
+from database.db_connection import MatchedRule
+
+DEFAULT_COUNT = 10_000
+
+
+def manifest_citations(
+    count: int = DEFAULT_COUNT,
+    seed: int = 0,
+) -> tuple[dict[str, MatchedRule], list[tuple[str, str]]]:
+    """
+    Citations from the manifest's examples
+    :return: the manifest rules by id, and each citation with the id of the rule that matches it
+    """
+    rules = {}
+    with open(MANIFEST_CSV, encoding="utf-8", newline="") as manifest_file:
+        for row in csv.DictReader(manifest_file):
+            rules[row["id"]] = (
+                MatchedRule(
+                    row["family"].lower(),
+                    row["uri_template"] or None,
+                    row["is_neutral"] == "TRUE",
+                    row["is_canonical"] == "TRUE",
+                    row["citation_type"],
+                    row["canonical_form"],
+                ),
+                row["match_example"],
+            )
+    rng = random.Random(seed)  # noqa: S311 -- repeatable samples, not security
+    citations = [(rule_id, rules[rule_id][1]) for rule_id in rng.choices(list(rules), k=count)]
+    return {rule_id: rule for rule_id, (rule, _) in rules.items()}, citations
+
+
+def time_corrections(rules: dict[str, MatchedRule], citations: list[tuple[str, str]], repeat: int) -> dict[str, Any]:
+    """
+    Resolve every citation `repeat` times and summarise the throughput.
+    As in `case_pipeline`, each run compiles the rules before resolving the citations.
+    """
+    runs = []
+    for _ in range(repeat):
+        compile_rule.cache_clear()
+        start = time.perf_counter()
+        compiled = {rule_id: compile_rule(rule) for rule_id, rule in rules.items()}
+        for rule_id, citation_match in citations:
+            compiled[rule_id].resolve(citation_match)
+        runs.append(time.perf_counter() - start)
+    median_s = statistics.median(runs)
+    return {
+        "citations": len(citations),
+        "runs_s": [round(run, 6) for run in runs],
+        "min_s": round(min(runs), 6),
+        "median_s": round(median_s, 6),
+        "mean_s": round(statistics.fmean(runs), 6),
+        "citations_per_s": round(len(citations) / median_s) if median_s else None,
+    }
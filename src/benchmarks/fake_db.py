@@ -0,0 +1,104 @@
+"""
+SQLite stand-in for the enrichment Postgres database.
+
+The queries in `database.db_connection` use psycopg2 placeholders (``%(name)s`` and ``%s``), and Postgres arrays for
+batched lookups (``= ANY(%(name)s)``). The connection returned by `create_benchmark_database` rewrites those to SQLite's
+own placeholders, with each array expanded into an ``IN`` list, so the real query functions can be benchmarked without a
+Postgres server.
+"""
+
+import re
+import sqlite3
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+
+RULES_DIR = Path(__file__).parent.parent.resolve() / "caselaw_extraction" / "rules"
+MANIFEST_CSV = RULES_DIR / "2022_06_30_Citation_Manifest.csv"
+
+NAMED_PLACEHOLDER = re.compile(r"%\((\w+)\)s")
+ANY_PLACEHOLDER = re.compile(r"= ANY\(%\((\w+)\)s\)")
+ACT_TITLE = re.compile(r"\b((?:[A-Z][a-z]+,? )(?:(?:and|of|the|for|to|in) |[A-Z][a-z]+,? ){0,8}Act (\d{4}))\b")
+
+
+def to_sqlite(sql: str) -> str:
+    """
+    Rewrite psycopg2 placeholders as SQLite placeholders
+    """
+    return NAMED_PLACEHOLDER.sub(r":\1", sql).replace("%s", "?")
+
+
+def expand_arrays(sql: str, parameters: Any) -> tuple[str, Any]:
+    """
+    Rewrite each ``= ANY(%(name)s)`` as an ``IN`` list with a placeholder for every item in the array
+    """
+    if not isinstance(parameters, dict):
+        return sql, parameters
+    expanded = dict(parameters)
+
+    def in_list(match: re.Match) -> str:
+        name = match.group(1)
+        items = expanded.pop(name)
+        expanded.update({f"{name}_{index}": item for index, item in enumerate(items)})
+        return "IN (" + ", ".join(f"%({name}_{index})s" for index in range(len(items))) + ")"
+
+    return ANY_PLACEHOLDER.sub(in_list, sql), expanded
+
+
+class TranslatingCursor(sqlite3.Cursor):
+    def execute(self, sql: str, parameters: Any = (), /) -> "TranslatingCursor":
+        sql, parameters = expand_arrays(sql, parameters)
+        return super().execute(to_sqlite(sql), parameters)
+
+    def executemany(self, sql: str, seq_of_parameters: Iterable[Any], /) -> "TranslatingCursor":
+        return super().executemany(to_sqlite(sql), seq_of_parameters)
+
+
+class TranslatingConnection(sqlite3.Connection):
+    def cursor(self, factory: Any = TranslatingCursor) -> TranslatingCursor:  # type: ignore[override]
+        return super().cursor(factory)
+
+
+def legislation_rows(titles: Iterable[str]) -> list[tuple[str, str, str, int, bool]]:
+    """
+    Build ukpga_lookup rows for act titles ending in a year
+    """
+    rows = []
+    for number, title in enumerate(sorted(set(titles)), start=1):
+        year = int(title[-4:])
+        rows.append((title, f"http://www.legislation.gov.uk/ukpga/{year}/{number}", f"{title[:-5]} {year}", year, True))
+    return rows
+
+
+def act_titles_in(text: str) -> set[str]:
+    """
+    Titles of acts mentioned in a text, used to give fixture judgments something to match against
+    """
+    return {match.group(1) for match in ACT_TITLE.finditer(text)}
+
+
+def create_benchmark_database(act_titles: Iterable[str] = ()) -> sqlite3.Connection:
+    """
+    Create an in-memory database holding the citation manifest and a legislation lookup table
+    :param act_titles: titles of acts to include in the legislation lookup table, each ending in its year
+    :return: connection that accepts psycopg2 style queries
+    """
+    conn = sqlite3.connect(":memory:", factory=TranslatingConnection, check_same_thread=False)
+    pd.read_csv(MANIFEST_CSV).to_sql("manifest", conn, index=False)
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        CREATE TABLE ukpga_lookup (
+            candidate_titles VARCHAR(100) NOT NULL,
+            ref VARCHAR(100) NOT NULL,
+            citation VARCHAR(100) NOT NULL,
+            year BIGINT NOT NULL,
+            for_fuzzy BOOLEAN NOT NULL
+        )
+        """,
+    )
+    cursor.executemany("INSERT INTO ukpga_lookup VALUES (%s, %s, %s, %s, %s)", legislation_rows(act_titles))
+    conn.commit()
+    return conn
@@ -0,0 +1,57 @@
+"""
+How fuzzy matching legislation scales when its titles are split by year between worker processes, against matching
+them all in this process. The window cache is cleared before each run, so every run fuzzy matches its windows:
+
+    python -m benchmarks legislation-workers --judgments synthetic --synthetic 500:3:40 --workers 1 2 4 8
+"""
+
+import contextlib
+import io
+import statistics
+import time
+from typing import Any
+
+from benchmarks.stages import BenchmarkInput, blank_nlp
+from database.db_connection import get_legtitles
+from legislation_extraction.text_windows import leg_pipeline_from_text
+from legislation_extraction.window_cache import WINDOW_CACHE
+
+DEFAULT_WORKERS = [1, 2, 4, 8]
+
+
+def time_workers(judgment: BenchmarkInput, workers: list[int], repeat: int) -> dict[str, dict[str, Any]]:
+    """
+    Time finding the legislation in a judgment with each number of workers, checking each finds the same references
+    """
+    nlp = blank_nlp()
+    leg_titles = get_legtitles(judgment.db_conn)
+    timings: dict[str, dict[str, Any]] = {}
+    expected = None
+    for count in workers:
+        runs = []
+        for _ in range(repeat):
+            WINDOW_CACHE.clear()
+            start = time.perf_counter()
+            # the pipeline prints how many references it found
+            with contextlib.redirect_stdout(io.StringIO()):
+                found = leg_pipeline_from_text(
+                    leg_titles,
+                    nlp,
+                    judgment.text,
+                    judgment.db_conn,
+                    judgment.judgment_date,
+                    workers=count,
+                )
+            runs.append(time.perf_counter() - start)
+        if expected is None:
+            expected = found
+        median_s = statistics.median(runs)
+        timings[f"{count}_workers"] = {
+            "workers": count,
+            "references": len(found),
+            "same_references": found == expected,
+            "min_s": round(min(runs), 6),
+            "median_s": round(median_s, 6),
+            "speedup": round(timings[f"{workers[0]}_workers"]["median_s"] / median_s, 2) if timings else 1.0,
+        }
+    return timings
@@ -0,0 +1,144 @@
+"""
+Run the first phase of enrichment locally the way it runs when deployed: the text is extracted, the caselaw,
+legislation and abbreviation detectors run at the same time in a process pool, each producing its own shard of
+replacements, and the replacer runs once every shard exists.
+
+As the detectors do not depend on each other, the time to enrich a judgment is the critical path of extraction, the
+slowest detector and the replacer, rather than the sum of every stage.
+"""
+
+import contextlib
+import dataclasses
+import functools
+import io
+import multiprocessing
+import os
+import time
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Any
+from unittest import mock
+
+from benchmarks.stages import BenchmarkInput, detect_legislation, run_abbreviations, run_caselaw, run_legislation
+from replacer.make_replacments import make_post_header_replacements
+from utils.helper import parse_file
+from utils.replacement_shards import SHARD_KINDS
+from utils.replacements import encode_replacements
+
+DETECTORS: dict[str, Callable[[BenchmarkInput], list]] = {
+    "case": run_caselaw,
+    "leg": run_legislation,
+    "abb": run_abbreviations,
+}
+"""The detector writing each kind of shard"""
+
+
+@dataclass(frozen=True)
+class PipelineTiming:
+    extract_s: float
+    detectors_s: dict[str, float]
+    replace_s: float
+    wall_s: float
+
+    @property
+    def critical_path_s(self) -> float:
+        """Time to enrich the judgment with the detectors running at the same time"""
+        return self.extract_s + max(self.detectors_s.values(), default=0.0) + self.replace_s
+
+    @property
+    def sequential_s(self) -> float:
+        """Time to enrich the judgment with the detectors chained one after another"""
+        return self.extract_s + sum(self.detectors_s.values()) + self.replace_s
+
+    def __str__(self) -> str:
+        detectors = ", ".join(f"{kind} {duration:.4f}s" for kind, duration in self.detectors_s.items())
+        return (
+            f"extract {self.extract_s:.4f}s, detectors ({detectors}), replace {self.replace_s:.4f}s: "
+            f"critical path {self.critical_path_s:.4f}s, sequential {self.sequential_s:.4f}s, wall {self.wall_s:.4f}s"
+        )
+
+
+def detect(judgment: BenchmarkInput, kind: str) -> tuple[bytes, float]:
+    """
+    Run one detector on a judgment, as its lambda would
+    :return: the detector's shard, and how long the detector took. Building the database and models it needs is not
+        included, as a warm lambda has these already.
+    """
+    # build the inputs before timing
+    judgment.text  # noqa: B018
+    judgment.db_conn  # noqa: B018
+    judgment_date = judgment.judgment_date
+    detector = functools.partial(detect_legislation, judgment_date=judgment_date) if kind == "leg" else DETECTORS[kind]
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        found = detector(judgment)
+        duration = time.perf_counter() - start
+    return encode_replacements(found), duration
+
+
+def _make_executor(parallel: bool) -> Executor:
+    if not parallel:
+        return ThreadPoolExecutor(max_workers=1)
+    # each detector starts in a fresh interpreter, as it would in its own lambda, rather than a copy of this one
+    return ProcessPoolExecutor(max_workers=len(DETECTORS), mp_context=multiprocessing.get_context("spawn"))
+
+
+def run_pipeline(judgment: BenchmarkInput, parallel: bool = True) -> tuple[str, PipelineTiming]:
+    """
+    Enrich a judgment with the first phase stages, fanning the detectors out and their shards back in
+    :param parallel: run the detectors in a process pool, rather than one after another
+    :return: the enriched judgment and the time taken by each stage
+    """
+    wall_start = time.perf_counter()
+
+    start = time.perf_counter()
+    parse_file(judgment.xml)
+    extract_s = time.perf_counter() - start
+    # each worker gets a copy without the parent's database connection or models, which cannot be sent to it
+    detector_input = dataclasses.replace(judgment)
+
+    shards: dict[str, bytes] = {}
+    detectors_s: dict[str, float] = {}
+    enriched = None
+    replace_s = 0.0
+    # the stages would otherwise write a metrics line for every run
+    metrics_format = {"METRICS_FORMAT": os.getenv("METRICS_FORMAT", "off")}
+    with mock.patch.dict(os.environ, metrics_format), _make_executor(parallel) as executor:
+        futures = {executor.submit(detect, detector_input, kind): kind for kind in DETECTORS}
+        for future in as_completed(futures):
+            kind = futures[future]
+            shards[kind], detectors_s[kind] = future.result()
+            # as in the lambdas, the last detector to finish starts the replacer
+            if all(shard_kind in shards for shard_kind in SHARD_KINDS):
+                start = time.perf_counter()
+                enriched = make_post_header_replacements(
+                    judgment.xml,
+                    b"".join(shards[shard_kind] for shard_kind in SHARD_KINDS),
+                )
+                replace_s = time.perf_counter() - start
+
+    if enriched is None:
+        msg = f"Not every shard was written for {judgment.name}"
+        raise RuntimeError(msg)
+    timing = PipelineTiming(
+        extract_s,
+        {kind: detectors_s[kind] for kind in DETECTORS},
+        replace_s,
+        time.perf_counter() - wall_start,
+    )
+    return enriched, timing
+
+
+def pipeline_results(timings: dict[str, PipelineTiming]) -> dict[str, Any]:
+    """
+    Timings of pipeline runs in a form that can be written as JSON
+    """
+    return {
+        name: {
+            **dataclasses.asdict(timing),
+            "critical_path_s": timing.critical_path_s,
+            "sequential_s": timing.sequential_s,
+        }
+        for name, timing in timings.items()
+    }
@@ -0,0 +1,113 @@
+"""
+Time benchmark stages, store the results as JSON and compare two sets of results.
+"""
+
+import contextlib
+import datetime as dt
+import io
+import json
+import os
+import platform
+import statistics
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Any
+from unittest import mock
+
+from benchmarks.stages import STAGES, BenchmarkInput
+
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.2
+
+
+def time_stage(judgment: BenchmarkInput, stage: str, repeat: int = DEFAULT_REPEAT) -> dict[str, Any]:
+    """
+    Run a stage `repeat` times on a judgment and summarise how long it took.
+    An untimed warm-up run first builds the inputs the stage needs, such as the database and earlier stages' output.
+    """
+    runs = []
+    # the pipelines print progress as they go, which would swamp the results
+    with contextlib.redirect_stdout(io.StringIO()):
+        STAGES[stage](judgment)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            STAGES[stage](judgment)
+            runs.append(time.perf_counter() - start)
+    return {
+        "input_bytes": len(judgment.xml.encode("utf-8")),
+        "runs_s": [round(run, 6) for run in runs],
+        "min_s": round(min(runs), 6),
+        "median_s": round(statistics.median(runs), 6),
+        "mean_s": round(statistics.fmean(runs), 6),
+    }
+
+
+def run_benchmarks(
+    judgments: Iterable[BenchmarkInput],
+    stages: Iterable[str] = STAGES,
+    repeat: int = DEFAULT_REPEAT,
+) -> dict[str, Any]:
+    """
+    Time every stage on every judgment
+    :return: results keyed by "judgment/stage", with details of the machine they were run on
+    """
+    stages = list(stages)
+    results = {}
+    # the stages would otherwise write a metrics line for every run
+    with mock.patch.dict(os.environ, {"METRICS_FORMAT": os.getenv("METRICS_FORMAT", "off")}):
+        for judgment in judgments:
+            for stage in stages:
+                results[f"{judgment.name}/{stage}"] = time_stage(judgment, stage, repeat)
+    return {
+        "meta": {
+            "created": dt.datetime.now(tz=dt.UTC).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.platform(),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+@dataclass(frozen=True)
+class Comparison:
+    benchmark: str
+    baseline_s: float
+    current_s: float
+
+    @property
+    def change(self) -> float:
+        return (self.current_s - self.baseline_s) / self.baseline_s if self.baseline_s else 0.0
+
+    def __str__(self) -> str:
+        return f"{self.benchmark}: {self.baseline_s:.4f}s -> {self.current_s:.4f}s ({self.change:+.1%})"
+
+
+def compare_results(
+    baseline: dict[str, Any],
+    current: dict[str, Any],
+    threshold: float = DEFAULT_THRESHOLD,
+) -> tuple[list[Comparison], list[Comparison]]:
+    """
+    Compare the median times of benchmarks present in both sets of results
+    :param threshold: fractional slowdown beyond which a benchmark counts as a regression
+    :return: every comparison, and the ones that regressed
+    """
+    comparisons = [
+        Comparison(name, baseline["results"][name]["median_s"], result["median_s"])
+        for name, result in current["results"].items()
+        if name in baseline["results"]
+    ]
+    regressions = [comparison for comparison in comparisons if comparison.change > threshold]
+    return comparisons, regressions
+
+
+def write_results(results: dict[str, Any], path: str) -> None:
+    with open(path, "w", encoding="utf-8") as results_file:
+        json.dump(results, results_file, indent=2)
+
+
+def read_results(path: str) -> dict[str, Any]:
+    with open(path, encoding="utf-8") as results_file:
+        return json.load(results_file)
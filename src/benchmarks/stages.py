@@ -0,0 +1,174 @@
+"""
+The enrichment stages the benchmarks time, and the inputs they run on.
+
+Each stage is timed the way its lambda calls it, so the NLP stages include building the spaCy Doc. Models are
+blank English pipelines, which keeps the benchmarks runnable offline and makes timings comparable between machines
+that may or may not have the trained model installed.
+"""
+
+import datetime as dt
+import io
+import os
+from collections.abc import Callable
+from dataclasses import dataclass
+from functools import cached_property
+from pathlib import Path
+from typing import Any, cast
+from unittest import mock
+
+from spacy.lang.en import English
+from spacy.language import Language
+from spacy.pipeline import EntityRuler
+
+from abbreviation_extraction.abbreviations_matcher import abb_pipeline
+from benchmarks.fake_db import RULES_DIR, act_titles_in, create_benchmark_database
+from benchmarks.synthetic import distractor_act_titles, generate_judgment
+from caselaw_extraction.caselaw_matcher import case_pipeline
+from database.db_connection import get_legtitles
+from legislation_extraction.text_windows import leg_pipeline_from_text
+from legislation_provisions_extraction.legislation_provisions import provisions_pipeline
+from oblique_references.enrich_oblique_references import enrich_oblique_references
+from replacer.make_replacments import make_post_header_replacements
+from utils.custom_types import DocumentAsXMLString
+from utils.helper import extract_text, parse_file
+from utils.replacements import encode_replacements
+
+FIXTURE_DIR = Path(__file__).parent.parent.resolve() / "tests" / "fixtures"
+NLP_MAX_LENGTH = 2500000
+DISTRACTOR_ACTS = 2000
+
+
+def blank_nlp() -> Language:
+    nlp = English()
+    nlp.max_length = NLP_MAX_LENGTH
+    return nlp
+
+
+@dataclass
+class BenchmarkInput:
+    """
+    A judgment to benchmark. Replacements and the first phase enriched XML are worked out from the judgment
+    by running the earlier stages when the fixture does not provide them.
+    """
+
+    name: str
+    xml: DocumentAsXMLString
+    act_titles: tuple[str, ...] = ()
+    given_replacements: bytes | str | None = None
+    given_enriched: DocumentAsXMLString | None = None
+    distractor_acts: int = DISTRACTOR_ACTS
+
+    @cached_property
+    def text(self) -> str:
+        return parse_file(self.xml)
+
+    @cached_property
+    def judgment_date(self) -> dt.date | None:
+        """Date of the judgment, which the legislation stage is given as it is in the pipeline"""
+        judgment_date = extract_text(self.xml, io.StringIO()).judgment_date
+        return dt.date.fromisoformat(judgment_date[:10]) if judgment_date else None
+
+    @cached_property
+    def db_conn(self) -> Any:
+        titles = [*self.act_titles, *act_titles_in(self.text), *distractor_act_titles(self.distractor_acts)]
+        return create_benchmark_database(titles)
+
+    @cached_property
+    def caselaw_nlp(self) -> Language:
+        nlp = blank_nlp()
+        cast(EntityRuler, nlp.add_pipe("entity_ruler")).from_disk(RULES_DIR / "citation_patterns.jsonl")
+        return nlp
+
+    @cached_property
+    def replacements(self) -> bytes | str:
+        if self.given_replacements is not None:
+            return self.given_replacements
+        found = [*run_caselaw(self), *run_legislation(self), *run_abbreviations(self)]
+        return encode_replacements(found)
+
+    @cached_property
+    def enriched(self) -> DocumentAsXMLString:
+        if self.given_enriched is not None:
+            return self.given_enriched
+        return make_post_header_replacements(self.xml, self.replacements)
+
+
+def fixture_inputs() -> list[BenchmarkInput]:
+    """
+    The judgments in the test fixtures
+    """
+    return [
+        BenchmarkInput("rwanda", DocumentAsXMLString((FIXTURE_DIR / "rwanda.xml").read_text())),
+        BenchmarkInput(
+            "ewhc-ch-2023-257",
+            DocumentAsXMLString((FIXTURE_DIR / "ewhc-ch-2023-257_original.xml").read_text()),
+            given_replacements=(FIXTURE_DIR / "ewhc-ch-2023-257_replacements.txt").read_text(),
+            given_enriched=DocumentAsXMLString((FIXTURE_DIR / "ewhc-ch-2023-257_enriched_stage_1.xml").read_text()),
+        ),
+    ]
+
+
+def synthetic_input(
+    paragraphs: int,
+    density: float,
+    distinct_years: int,
+    distinct_cases: int | None = None,
+) -> BenchmarkInput:
+    judgment = generate_judgment(paragraphs, density, distinct_years, distinct_cases)
+    return BenchmarkInput(judgment.name, judgment.xml, judgment.act_titles)
+
+
+def run_caselaw(judgment: BenchmarkInput) -> list:
+    return case_pipeline(judgment.caselaw_nlp(judgment.text), judgment.db_conn)
+
+
+def run_legislation(judgment: BenchmarkInput) -> list:
+    return detect_legislation(judgment, judgment.judgment_date)
+
+
+def detect_legislation(judgment: BenchmarkInput, judgment_date: dt.date | None) -> list:
+    # the legislation lambda is given the judgment date by the message that starts it
+    nlp = blank_nlp()
+    return leg_pipeline_from_text(
+        get_legtitles(judgment.db_conn),
+        nlp,
+        judgment.text,
+        judgment.db_conn,
+        judgment_date,
+    )
+
+
+def run_abbreviations(judgment: BenchmarkInput) -> list:
+    # abb_pipeline adds its component to the pipeline it is given, so each run needs a fresh one
+    return abb_pipeline(judgment.text, blank_nlp())
+
+
+def run_make_replacements(judgment: BenchmarkInput) -> str:
+    return make_post_header_replacements(judgment.xml, judgment.replacements)
+
+
+def run_oblique_references(judgment: BenchmarkInput) -> str:
+    return enrich_oblique_references(judgment.enriched)
+
+
+def run_provisions(judgment: BenchmarkInput) -> list:
+    return provisions_pipeline(judgment.enriched)
+
+
+def run_timestamp(judgment: BenchmarkInput) -> str:
+    # the lambda reads its destination bucket when it is imported
+    with mock.patch.dict(os.environ, {"DEST_BUCKET": os.getenv("DEST_BUCKET", "benchmark")}):
+        from lambdas.determine_legislation_provisions.index import add_timestamp_and_engine_version
+
+    return add_timestamp_and_engine_version(judgment.enriched)
+
+
+STAGES: dict[str, Callable[[BenchmarkInput], Any]] = {
+    "caselaw": run_caselaw,
+    "legislation": run_legislation,
+    "abbreviations": run_abbreviations,
+    "make_replacements": run_make_replacements,
+    "oblique_references": run_oblique_references,
+    "legislation_provisions": run_provisions,
+    "timestamp": run_timestamp,
+}
@@ -0,0 +1,159 @@
+"""
+Generator for synthetic judgments of a chosen size.
+
+Judgments are built from a fixed seed, so the same parameters always give the same document. Three things can be
+scaled independently:
+
+- the number of paragraphs
+- the citation density, as case law and legislation citations per paragraph
+- the number of distinct years the citations are spread across
+
+The case law citations can also be drawn from a fixed number of cases, so the same citations repeat through the
+judgment as they do in real ones.
+"""
+
+import random
+from dataclasses import dataclass
+from xml.sax.saxutils import escape
+
+from utils.custom_types import DocumentAsXMLString
+
+AKN_NAMESPACE = "http://docs.oasis-open.org/legaldocml/ns/akn/3.0"
+UK_NAMESPACE = "https://caselaw.nationalarchives.gov.uk/akn"
+
+FIRST_YEAR = 1950
+
+FILLER = (
+    "The appellant contends that the judge below erred in law in reaching the conclusion that she did. "
+    "It is common ground that the relevant facts are not in dispute. "
+    "We have considered the written and oral submissions of both parties with care. "
+    "In our judgment the tribunal was entitled to reach the conclusion it did on the evidence before it. "
+    "Nothing in the authorities cited to us suggests that a different approach is required. "
+)
+
+CASE_CITATION_TEMPLATES = [
+    "[{year}] UKSC {number}",
+    "[{year}] EWCA Civ {number}",
+    "[{year}] EWHC {number} (Ch)",
+    "[{year}] 1 WLR {number}",
+    "[{year}] AC {number}",
+    "[{year}] UKUT {number} (TCC)",
+]
+
+ACT_SUBJECTS = [
+    "Adoption",
+    "Children",
+    "Housing",
+    "Insolvency",
+    "Pensions",
+    "Immigration",
+    "Finance",
+    "Employment Rights",
+    "Data Protection",
+    "Human Rights",
+    "Companies",
+    "Family Law",
+    "Arbitration",
+    "Limitation",
+    "Equality",
+    "Land Registration",
+]
+
+ABBREVIATION_TEMPLATE = 'the {title} (the "{initials}")'
+
+
+@dataclass(frozen=True)
+class SyntheticJudgment:
+    """
+    A generated judgment and the acts it cites, which the legislation lookup table needs to hold
+    """
+
+    name: str
+    xml: DocumentAsXMLString
+    act_titles: tuple[str, ...]
+
+
+def act_title(subject: str, year: int) -> str:
+    return f"{subject} Act {year}"
+
+
+def initials(title: str) -> str:
+    return "".join(word[0] for word in title.split() if word[0].isupper())
+
+
+def distractor_act_titles(count: int, seed: int = 0) -> list[str]:
+    """
+    Act titles that no synthetic judgment cites, to give the legislation lookup table a realistic size
+    """
+    rng = random.Random(seed)  # noqa: S311 -- repeatable documents, not security
+    qualifiers = ["Amendment", "Miscellaneous Provisions", "Scotland"]
+    return [
+        act_title(f"{rng.choice(ACT_SUBJECTS)} ({rng.choice(qualifiers)})", year)
+        for year in rng.choices(range(FIRST_YEAR, FIRST_YEAR + 75), k=count)
+    ]
+
+
+def generate_judgment(
+    paragraphs: int,
+    density: float,
+    distinct_years: int,
+    distinct_cases: int | None = None,
+    seed: int = 0,
+) -> SyntheticJudgment:
+    """
+    Generate a judgment in LegalDocML
+    :param paragraphs: number of paragraphs in the judgment body
+    :param density: average number of citations per paragraph
+    :param distinct_years: number of different years the citations are drawn from
+    :param distinct_cases: number of different cases the case law citations are drawn from, or None for a new case
+        each time
+    :param seed: seed for the random choices
+    """
+    rng = random.Random(seed)  # noqa: S311 -- repeatable documents, not security
+    years = [FIRST_YEAR + (year * 73) // max(distinct_years, 1) for year in range(max(distinct_years, 1))]
+    acts = [act_title(ACT_SUBJECTS[i % len(ACT_SUBJECTS)], year) for i, year in enumerate(years)]
+    cases = [
+        rng.choice(CASE_CITATION_TEMPLATES).format(year=rng.choice(years), number=rng.randint(1, 999))
+        for _ in range(distinct_cases or 0)
+    ]
+    abbreviated: set[str] = set()
+
+    body = []
+    for number in range(1, paragraphs + 1):
+        sentences = [FILLER]
+        citations = int(density) + (1 if rng.random() < density - int(density) else 0)
+        for _ in range(citations):
+            if rng.random() < 0.5:
+                if cases:
+                    citation = rng.choice(cases)
+                else:
+                    template = rng.choice(CASE_CITATION_TEMPLATES)
+                    citation = template.format(year=rng.choice(years), number=rng.randint(1, 999))
+                sentences.append(f"That was the approach taken in Smith v Jones {citation}. ")
+            else:
+                title = rng.choice(acts)
+                if title not in abbreviated:
+                    abbreviated.add(title)
+                    cited = ABBREVIATION_TEMPLATE.format(title=title, initials=initials(title))
+                else:
+                    cited = f"the {title}"
+                sentences.append(f"Section {rng.randint(1, 120)} of {cited} applies. ")
+        body.append(
+            f'<paragraph eId="para_{number}"><num>{number}.</num>'
+            f"<content><p>{escape(''.join(sentences).strip())}</p></content></paragraph>",
+        )
+
+    name = f"synthetic-{paragraphs}p-{density:g}d-{distinct_years}y"
+    if distinct_cases:
+        name += f"-{distinct_cases}c"
+    xml = (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        f'<akomaNtoso xmlns="{AKN_NAMESPACE}" xmlns:uk="{UK_NAMESPACE}"><judgment name="judgment"><meta>'
+        '<identification source="#tna"><FRBRWork><FRBRthis value="https://caselaw.nationalarchives.gov.uk/id/ewhc/ch/2099/1"/>'
+        '<FRBRdate date="2099-01-01" name="judgment"/></FRBRWork>'
+        '<FRBRManifestation><FRBRdate date="2099-01-02T00:00:00" name="transform"/></FRBRManifestation></identification>'
+        '<proprietary source="#"><uk:court>EWHC-Chancery</uk:court><uk:year>2099</uk:year></proprietary></meta>'
+        f"<header><p>{escape(name)}</p></header>"
+        f"<judgmentBody><decision>{''.join(body)}</decision></judgmentBody></judgment></akomaNtoso>"
+    )
+    return SyntheticJudgment(name, DocumentAsXMLString(xml), tuple(acts))
@@ -9,7 +9,8 @@ This code builds the Case Law Annotator. The 3 main functionalities are:
 - The input to case_pipeline is a spacy Doc object.
 - The first step is to detect the entities based on the EntityRuler built into the nlp pipeline in a previous step.
 - Once the citation match and its corresponding ID have been detected, the code queries a 'Rules Manifest' in Postgres
-to retrieve associated metadata about the matched citation.
+to retrieve associated metadata about the matched citation. The rules for every citation in the judgment are fetched in
+one query, and each distinct citation is resolved once however many times it is repeated.
 - If the citation is well-formed, the pipeline retrieves additional metadata from the citation match, creates the corresponding URI
 and finally creates a replacement entry as a tuple.
 - If the citation match is malformed, the citation match and parts of the metadata are passed to a correction pipeline before following
@@ -18,13 +19,24 @@ the same path as well-formed citation matches.
 
 """
 
-import re
+import functools
+import logging
 from collections import namedtuple
 
-from caselaw_extraction.correction_strategies import apply_correction_strategy
-from database.db_connection import get_matched_rule
+from caselaw_extraction.correction_strategies import (
+    UnknownCitationTypeError,
+    compiled_canonical_form,
+    compiled_uri_template,
+    get_canonical_strategy,
+    get_strategy,
+)
+from database.db_connection import MatchedRule, get_matched_rules
+from utils.metrics import instrument_stage
 
-case = namedtuple("case", "citation_match corrected_citation year URI is_neutral")
+LOGGER = logging.getLogger()
+
+# span is the (offset, length) of the citation in the judgment text
+case = namedtuple("case", "citation_match corrected_citation year URI is_neutral span", defaults=(None,))
 
 
 def create_URI(uri_template, year, d1, d2):
@@ -36,66 +48,98 @@ def create_URI(uri_template, year, d1, d2):
     :param d2: second (optional) digit detected in citation
     :returns: URI
     """
-    if "d1" in str(uri_template):
-        URI = uri_template.replace("year", year).replace("d1", d1)
-    elif "d2" in str(uri_template):
-        URI = uri_template.replace("year", year).replace("d1", d1).replace("d2", d2)
-    else:
-        URI = uri_template
-    return URI
+    return compiled_uri_template(uri_template).fill(year, d1, d2)
+
+
+class CompiledRule:
+    """
+    A Rules Manifest entry with its correction strategy and templates looked up, ready to resolve citations
+    """
+
+    def __init__(self, rule: MatchedRule):
+        # well-formed citations are kept as they are, while malformed ones are rebuilt from the canonical form
+        self.is_canonical = rule.is_canonical is not False
+        self.strategy = (
+            get_canonical_strategy(rule.citation_type) if self.is_canonical else get_strategy(rule.citation_type)
+        )
+        self.canonical_form = (
+            None if self.is_canonical else compiled_canonical_form(rule.citation_type, rule.canonical_form)
+        )
+        self.uri_template = None if rule.URItemplate is None else compiled_uri_template(rule.URItemplate)
+        self.is_neutral = rule.is_neutral
+
+    def resolve(self, citation_match: str) -> tuple[str, str, str, bool]:
+        """
+        Build the components for the xref attribute of a detected citation.
+        :param citation_match: detected citation
+        :returns: corrected citation, year, URI and whether the citation is neutral
+        """
+        year, d1, d2 = self.strategy.read_components(citation_match, self.is_canonical)
+        corrected_citation = citation_match if self.canonical_form is None else self.canonical_form.fill(year, d1, d2)
+        URI = "#" if self.uri_template is None else self.uri_template.fill(year, d1, d2)
+        return corrected_citation, year, URI, self.is_neutral
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_rule(rule: MatchedRule) -> CompiledRule:
+    return CompiledRule(rule)
+
+
+def compile_rules(rules: dict[str, MatchedRule]) -> dict[str, CompiledRule]:
+    """
+    Compile each rule once. A malformed citation of a type with no correction strategy cannot be corrected, so such a
+    rule is logged and left out, and the citations it matched are not marked up.
+    """
+    compiled = {}
+    for rule_id, rule in rules.items():
+        try:
+            compiled[rule_id] = compile_rule(rule)
+        except UnknownCitationTypeError as error:
+            LOGGER.warning("Skipping citations matched by manifest rule %s %s: %s", rule_id, rule, error)
+    return compiled
+
+
+def resolve_citation(rule: MatchedRule, citation_match: str) -> tuple[str, str, str, bool]:
+    """
+    Build the components for the xref attribute of a detected citation.
+    :param rule: the Rules Manifest entry the citation was matched by
+    :param citation_match: detected citation
+    :returns: corrected citation, year, URI and whether the citation is neutral
+    """
+    return compile_rule(rule).resolve(citation_match)
 
 
+@instrument_stage("caselaw")
 def case_pipeline(doc, db_conn):
     """
     Loop through detected caselaw citations and build components for xref attribute.
     :param doc: judgment as spacy Doc object
     :param db_conn: DB connection parameters to call Rules Manifest
-    :returns: list of tuples containing detected caselaw and associated attributes;
+    :returns: list of tuples containing detected caselaw, associated attributes and where it was found;
         they're referred to as "replacements" in determine_replacements_caselaw
     """
+    citations = [(ent.ent_id_, ent.text, ent.start_char) for ent in doc.ents]
+    # judgments cite the same case many times, so each distinct rule and citation is only looked up and resolved once
+    distinct_citations = dict.fromkeys((rule_id, citation_match) for rule_id, citation_match, _ in citations)
+    rules = get_matched_rules(db_conn, (rule_id for rule_id, _ in distinct_citations))
+    unknown_rules = {rule_id for rule_id, _ in distinct_citations} - rules.keys()
+    if unknown_rules:
+        msg = f"No manifest rule with id {', '.join(sorted(unknown_rules))}"
+        raise LookupError(msg)
+    compiled = compile_rules(rules)
+    resolved = {
+        (rule_id, citation_match): compiled[rule_id].resolve(citation_match)
+        for rule_id, citation_match in distinct_citations
+        if rule_id in compiled
+    }
 
     REPLACEMENTS_CASELAW = []
 
-    for ent in doc.ents:
-        rule_id = ent.ent_id_
-        citation_match = ent.text
-        (
-            family,
-            URItemplate,
-            is_neutral,
-            is_canonical,
-            citation_type,
-            canonical_form,
-        ) = get_matched_rule(db_conn, rule_id)
-        if is_canonical is False:
-            corrected_citation, year, d1, d2 = apply_correction_strategy(citation_type, citation_match, canonical_form)
-            if URItemplate is not None:
-                URI = create_URI(URItemplate, year, d1, d2)
-            else:
-                URI = "#"
-            replacement_entry = case(citation_match, corrected_citation, year, URI, is_neutral)
-        else:
-            components = re.findall(r"\d+", citation_match)
-            if "Year" in citation_type:
-                year = components[0]
-                d1 = components[1]
-                if len(components) > 2:
-                    d2 = components[2]
-                else:
-                    d2 = ""
-            else:
-                year = ""
-                d1 = components[0]
-                if len(components) > 1:
-                    d2 = components[1]
-                else:
-                    d2 = ""
-            if URItemplate is not None:
-                URI = create_URI(URItemplate, year, d1, d2)
-            else:
-                URI = "#"
-            replacement_entry = case(citation_match, citation_match, year, URI, is_neutral)
-
-        REPLACEMENTS_CASELAW.append(replacement_entry)
+    for rule_id, citation_match, start_char in citations:
+        if rule_id not in compiled:
+            continue
+        span = (start_char, len(citation_match))
+        corrected_citation, year, URI, is_neutral = resolved[(rule_id, citation_match)]
+        REPLACEMENTS_CASELAW.append(case(citation_match, corrected_citation, year, URI, is_neutral, span))
 
     return REPLACEMENTS_CASELAW
@@ -2,14 +2,139 @@
 @author: editha.nemsic
 This code corrects malformed citation matches.
 
-- The choice of correction strategy is based on the type of citation match.
+- The choice of correction strategy is based on the type of citation match, looked up in a table of strategies.
 - Based on citation type the function retrieves the year and 1 or more digits from the citation match.
 - The extracted information is used to build the well-formed citation using a canonical template that is being filled with the extracted year and digits.
+- Canonical forms and URI templates are split around their placeholders once, the first time they are used, into a
+format string, so filling them in is a single call rather than a replace for every placeholder.
 
 """
 
+import functools
+import operator
 import re
 
+DIGITS = re.compile(r"\d+")
+
+COMPONENTS = ("year", "d1", "d2")
+"""The numbers a citation can be built from, in the order they are passed to a template"""
+
+URI_PLACEHOLDERS = {"year": "year", "d1": "d1", "d2": "d2"}
+
+# appended to the numbers found in a citation, for the components a citation does not have
+MISSING = ["", "", ""]
+
+
+class UnknownCitationTypeError(ValueError):
+    pass
+
+
+class Template:
+    """
+    A canonical form or URI template, split around its placeholders into a format string
+    """
+
+    def __init__(self, template: str, placeholders: dict[str, str]):
+        """
+        :param template: text containing placeholders
+        :param placeholders: the component filling each placeholder
+        """
+        literals = [template]
+        fields = []
+        if placeholders:
+            pattern = re.compile("|".join(re.escape(placeholder) for placeholder in placeholders))
+            literals = pattern.split(template)
+            fields = [COMPONENTS.index(placeholders[placeholder]) for placeholder in pattern.findall(template)]
+        segments = [literals[0].replace("{", "{{").replace("}", "}}")]
+        for field, literal in zip(fields, literals[1:], strict=True):
+            segments.append(f"{{{field}}}")
+            segments.append(literal.replace("{", "{{").replace("}", "}}"))
+        self.format = "".join(segments)
+
+    def fill(self, year: str, d1: str, d2: str) -> str:
+        return self.format.format(year, d1, d2)
+
+
+class CorrectionStrategy:
+    def __init__(self, components: tuple[str, ...], placeholders: dict[str, str]):
+        """
+        :param components: what each number in a citation of this type is, in order
+        :param placeholders: the component filling each placeholder in the canonical form
+        """
+        self.components = components
+        self.placeholders = placeholders
+        # a well-formed citation can carry a trailing number its type does not use, which is kept as d2
+        canonical_components = COMPONENTS if "year" in components else COMPONENTS[1:]
+        self._reader = self._make_reader(components), len(components)
+        self._canonical_reader = self._make_reader(canonical_components), len(canonical_components) - 1
+
+    @staticmethod
+    def _make_reader(components: tuple[str, ...]) -> operator.itemgetter:
+        # components the type does not have are read from the padding at the end
+        return operator.itemgetter(*(components.index(name) if name in components else -1 for name in COMPONENTS))
+
+    def read_components(self, citation_match: str, is_canonical: bool = False) -> tuple[str, str, str]:
+        """
+        Retrieve the year and digits from a citation
+        :return: year, d1 and d2, each an empty string if the citation type does not have it
+        """
+        reader, required = self._canonical_reader if is_canonical else self._reader
+        numbers = DIGITS.findall(citation_match)
+        if len(numbers) < required:
+            msg = f"Expected {required} numbers in citation {citation_match!r}, found {len(numbers)}"
+            raise ValueError(msg)
+        return reader(numbers + MISSING)
+
+
+# e.g [2022] EWCA Civ 123
+YEAR_NUMBER = CorrectionStrategy(("year", "d1"), {"dddd": "year", "d+": "d1"})
+# e.g. [2022] UKFTT 2020_0341 (GRC)
+YEAR_NUMBER_NUMBER = CorrectionStrategy(("year", "d1", "d2"), {"dddd": "year", "d1": "d1", "d2": "d2"})
+# e.g. Case C-123/12
+NUMBER_NUMBER = CorrectionStrategy(("d1", "d2"), {"d1": "d1", "d2": "d2"})
+
+STRATEGIES = {
+    "NCitYearAbbrNum": YEAR_NUMBER,
+    "NCitYearAbbrNumDiv": YEAR_NUMBER,
+    "PubYearAbbrNum": YEAR_NUMBER,
+    "NCitYearAbbrNumUnderNumDiv": YEAR_NUMBER_NUMBER,
+    "NCitYearAbrrNumStrokeNum": YEAR_NUMBER_NUMBER,
+    "PubYearNumAbbrNum": YEAR_NUMBER_NUMBER,
+    "PubAbbrNumAbbrNum": NUMBER_NUMBER,
+    "PubNumAbbrNum": NUMBER_NUMBER,
+    "EUCCase": NUMBER_NUMBER,
+    "EUTCase": NUMBER_NUMBER,
+}
+"""The correction strategy for each citation type in the Rules Manifest"""
+
+
+def get_strategy(citation_type: str) -> CorrectionStrategy:
+    try:
+        return STRATEGIES[citation_type]
+    except KeyError:
+        msg = f"No correction strategy for citation type {citation_type!r}"
+        raise UnknownCitationTypeError(msg) from None
+
+
+def get_canonical_strategy(citation_type: str) -> CorrectionStrategy:
+    """
+    The strategy for reading a well-formed citation, which is not corrected. A citation type with no correction strategy
+    is read as having a year or not by its name, as well-formed citations always were.
+    """
+    if citation_type in STRATEGIES:
+        return STRATEGIES[citation_type]
+    return YEAR_NUMBER if "Year" in str(citation_type) else NUMBER_NUMBER
+
+
+@functools.lru_cache(maxsize=1024)
+def compiled_canonical_form(citation_type: str, canonical_form: str) -> Template:
+    return Template(canonical_form, get_strategy(citation_type).placeholders)
+
+
+@functools.lru_cache(maxsize=1024)
+def compiled_uri_template(template: str) -> Template:
+    return Template(template, URI_PLACEHOLDERS)
+
 
 def apply_correction_strategy(citation_type, citation_match, canonical_form):
     """
@@ -31,41 +156,6 @@ def apply_correction_strategy(citation_type, citation_match, canonical_form):
     d1/d2 : int/int or empty string
         digits building neutral citation for cited case law
     """
-
-    # e.g [2022] EWCA Civ 123
-    if (
-        (citation_type == "NCitYearAbbrNum")
-        | (citation_type == "NCitYearAbbrNumDiv")
-        | (citation_type == "PubYearAbbrNum")
-    ):
-        components = re.findall(r"\d+", citation_match)
-        year = components[0]
-        d1 = components[1]
-        d2 = ""
-        corrected_citation = canonical_form.replace("dddd", year).replace("d+", d1)
-
-    # e.g. [2022] UKFTT 2020_0341 (GRC)
-    elif (
-        (citation_type == "NCitYearAbbrNumUnderNumDiv")
-        | (citation_type == "NCitYearAbrrNumStrokeNum")
-        | (citation_type == "PubYearNumAbbrNum")
-    ):
-        components = re.findall(r"\d+", citation_match)
-        year = components[0]
-        d1 = components[1]
-        d2 = components[2]
-        corrected_citation = canonical_form.replace("dddd", year).replace("d1", d1).replace("d2", d2)
-
-    elif (
-        (citation_type == "PubAbbrNumAbbrNum")
-        | (citation_type == "PubNumAbbrNum")
-        | (citation_type == "EUCCase")
-        | (citation_type == "EUTCase")
-    ):
-        components = re.findall(r"\d+", citation_match)
-        year = ""
-        d1 = components[0]
-        d2 = components[1]
-        corrected_citation = canonical_form.replace("d1", d1).replace("d2", d2)
-
+    year, d1, d2 = get_strategy(citation_type).read_components(citation_match)
+    corrected_citation = compiled_canonical_form(citation_type, canonical_form).fill(year, d1, d2)
     return corrected_citation, year, d1, d2
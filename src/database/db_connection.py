@@ -1,10 +1,12 @@
 """Handles the database connection"""
 
+from collections.abc import Iterable
 from typing import Any, NamedTuple
 
-import pandas as pd
 import psycopg2
-from sqlalchemy import Connection
+
+# the queries below are run for every judgment, so read rows straight from a cursor rather than through pandas,
+# which is only needed by the lambdas maintaining the tables
 
 
 class MatchedRule(NamedTuple):
@@ -16,6 +18,20 @@ class MatchedRule(NamedTuple):
     canonical_form: Any
 
 
+class LegislationTitle(NamedTuple):
+    candidate_titles: str
+    year: int
+    for_fuzzy: bool
+
+
+class LegislationLink(NamedTuple):
+    href: str
+    canonical: str
+
+
+MANIFEST_COLUMNS = "id, family, uri_template, is_neutral, is_canonical, citation_type, canonical_form"
+
+
 def create_connection(db: str, user: str, password: str, host: str, port: str) -> psycopg2.extensions.connection:
     """
     Connect to the PostgreSQL database server
@@ -37,69 +53,129 @@ def create_connection(db: str, user: str, password: str, host: str, port: str) -
         raise
 
 
-def get_manifest_row(conn: Connection, rule_id: str) -> pd.DataFrame:
+def get_manifest_row(conn: psycopg2.extensions.connection, rule_id: str) -> tuple | None:
     """
-    Select all fields/rows from manifest that match the rule id
+    Select the fields of interest from the manifest row that matches the rule id
     :param conn: database connection created with create_connection()
     :param rule_id: ID of manifest rule to be extracted
-    :return: DataFrame of matched rule
+    :return: row of matched rule, starting with its id, or None if there is no such rule
     """
-    matched_rule = pd.read_sql("SELECT * FROM manifest where id=%(rule_id)s", conn, params={"rule_id": rule_id})
-    return matched_rule
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"SELECT {MANIFEST_COLUMNS} FROM manifest WHERE id = %(rule_id)s", {"rule_id": rule_id})  # noqa: S608
+        return cursor.fetchone()
+    finally:
+        cursor.close()
+
 
+def _matched_rule(row: tuple) -> MatchedRule:
+    _rule_id, family, URItemplate, is_neutral, is_canonical, citation_type, canonical_form = row
+    return MatchedRule(family.lower(), URItemplate, bool(is_neutral), bool(is_canonical), citation_type, canonical_form)
 
-def get_matched_rule(conn: Connection, rule_id: str) -> MatchedRule:
+
+def get_matched_rule(conn: psycopg2.extensions.connection, rule_id: str) -> MatchedRule:
     """
     Uses database connection to select fields/rows of interest from manifest that match the rule id
     :param conn: database connection, required
     :param rule_id: rule_id string, required
     :return: variables family, URItemplate, is_neutral, is_canonical, citation_type, canonical_form
     """
-    matched_rule = get_manifest_row(conn, rule_id)
-    family = matched_rule["family"].iloc[0].lower()
-    URItemplate = matched_rule["uri_template"].iloc[0]
-    is_neutral = bool(matched_rule["is_neutral"].iloc[0])
-    is_canonical = bool(matched_rule["is_canonical"].iloc[0])
-    citation_type = matched_rule["citation_type"].iloc[0]
-    canonical_form = matched_rule["canonical_form"].iloc[0]
-    return MatchedRule(family, URItemplate, is_neutral, is_canonical, citation_type, canonical_form)
+    row = get_manifest_row(conn, rule_id)
+    if row is None:
+        msg = f"No manifest rule with id {rule_id}"
+        raise LookupError(msg)
+    return _matched_rule(row)
+
+
+def get_matched_rules(conn: psycopg2.extensions.connection, rule_ids: Iterable[str]) -> dict[str, MatchedRule]:
+    """
+    Look up several manifest rules in one query
+    :param conn: database connection, required
+    :param rule_ids: ids of the rules, which may repeat
+    :return: each rule found, by its id. Ids with no rule are left out.
+    """
+    rule_ids = list(dict.fromkeys(rule_ids))
+    if not rule_ids:
+        return {}
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            f"SELECT {MANIFEST_COLUMNS} FROM manifest WHERE id = ANY(%(rule_ids)s)",  # noqa: S608
+            {"rule_ids": rule_ids},
+        )
+        return {row[0]: _matched_rule(row) for row in cursor.fetchall()}
+    finally:
+        cursor.close()
 
 
-def get_legtitles(conn: Connection) -> pd.DataFrame:
+def get_legtitles(conn: psycopg2.extensions.connection) -> list[LegislationTitle]:
     """
     Retrieves legislation titles from legislation lookup table
     :param conn: database connection, required
-    :return: DataFrame of legislation titles
+    :return: list of legislation titles with their year and whether they are fuzzy matched
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT candidate_titles, year, for_fuzzy FROM ukpga_lookup")
+        return [LegislationTitle(title, year, bool(for_fuzzy)) for title, year, for_fuzzy in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def get_legislation_links(conn: psycopg2.extensions.connection, titles: Iterable[str]) -> dict[str, LegislationLink]:
+    """
+    Look up the link and canonical form of several legislation titles in one query
+    :param conn: database connection, required
+    :param titles: legislation titles, which may repeat
+    :return: link and canonical form of each title found, by title. Where a title has more than one row, the first
+        is used.
     """
-    leg_titles = pd.read_sql("SELECT candidate_titles, year, for_fuzzy FROM ukpga_lookup", conn)
-    return leg_titles
+    titles = list(dict.fromkeys(titles))
+    if not titles:
+        return {}
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT candidate_titles, ref, citation FROM ukpga_lookup WHERE candidate_titles = ANY(%(titles)s)",
+            {"titles": titles},
+        )
+        links: dict[str, LegislationLink] = {}
+        for title, href, canonical in cursor.fetchall():
+            links.setdefault(title, LegislationLink(href, canonical))
+        return links
+    finally:
+        cursor.close()
+
+
+def _get_legislation_link(conn: psycopg2.extensions.connection, title: str) -> LegislationLink:
+    try:
+        return get_legislation_links(conn, [title])[title]
+    except KeyError:
+        msg = f"No legislation with title {title}"
+        raise LookupError(msg) from None
 
 
-def get_hrefs(conn: Connection, title: str):
+def get_hrefs(conn: psycopg2.extensions.connection, title: str) -> str:
     """
     Retrieves link to legislation title
     :param conn: database connection, required
     :param title: legislation title, required
     :return: link to legislation title
     """
-    href_query = """SELECT ref FROM ukpga_lookup WHERE candidate_titles= %(title)s"""
-    test = pd.read_sql_query(href_query, conn, params={"title": f"{title}"})
-    return test.ref.values[0]
+    return _get_legislation_link(conn, title).href
 
 
-def get_canonical_leg(conn, title: str):
+def get_canonical_leg(conn: psycopg2.extensions.connection, title: str) -> str:
     """
     Retrieves canonical form of legislation title
     :param conn: database connection, required
     :param title: legislation title, required
     :return: canoncial form of legislation title
     """
-    canonical_query = """SELECT citation FROM ukpga_lookup WHERE candidate_titles= %(title)s"""
-    canonical_leg = pd.read_sql(canonical_query, conn, params={"title": f"{title}"})
-    return canonical_leg.citation.values[0]
+    return _get_legislation_link(conn, title).canonical
 
 
-def close_connection(conn: Connection) -> None:
+def close_connection(conn: psycopg2.extensions.connection) -> None:
     """
     Closes the Database connection
     :param conn: database connection to be closed
@@ -14,6 +14,8 @@ from legislation_provisions_extraction.legislation_provisions import (
 from replacer.second_stage_replacer import replace_references_by_paragraph
 from utils.custom_types import DocumentAsXMLString
 from utils.environment_helpers import validate_env_variable
+from utils.metrics import summarise
+from utils.profiling import profile_record
 
 LOGGER = logging.getLogger()
 LOGGER.setLevel(logging.INFO)
@@ -66,6 +68,7 @@ def add_timestamp_and_engine_version(
     return DocumentAsXMLString(str(soup))
 
 
+@profile_record("determine_legislation_provisions")
 def process_event(sqs_rec: S3EventRecord) -> None:
     """
     Function to fetch the XML, call the legislation provisions extraction pipeline and upload the enriched XML to the
@@ -82,7 +85,7 @@ def process_event(sqs_rec: S3EventRecord) -> None:
     )
 
     resolved_refs = provisions_pipeline(file_content)
-    print(resolved_refs)
+    print(summarise(resolved_refs))
 
     if resolved_refs:
         soup = BeautifulSoup(file_content, "xml")
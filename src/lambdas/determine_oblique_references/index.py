@@ -11,6 +11,7 @@ from oblique_references.enrich_oblique_references import (
 )
 from utils.custom_types import DocumentAsXMLString
 from utils.environment_helpers import validate_env_variable
+from utils.profiling import profile_record
 
 LOGGER = logging.getLogger()
 LOGGER.setLevel(logging.INFO)
@@ -28,6 +29,7 @@ def upload_contents(source_key: str, output_file_content: DocumentAsXMLString) -
     s3_obj.put(Body=output_file_content)
 
 
+@profile_record("determine_oblique_references")
 def process_event(sqs_rec: S3EventRecord) -> None:
     """
     Function to fetch the XML, call the oblique references pipeline and upload the enriched XML to the
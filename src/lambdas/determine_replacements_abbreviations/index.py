@@ -3,23 +3,29 @@ import logging
 from typing import TYPE_CHECKING
 
 import boto3
-import spacy
 from aws_lambda_powertools.utilities.data_classes import SQSEvent, event_source
 from aws_lambda_powertools.utilities.data_classes.sqs_event import SQSRecord
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
-from abbreviation_extraction.abbreviations_matcher import abb, abb_pipeline
-from utils.custom_types import DocumentAsXMLString, Replacement
+from utils.batch_processing import BatchResponse, process_batch
+from utils.custom_types import DocumentAsXMLString
 from utils.environment_helpers import validate_env_variable
+from utils.metrics import summarise
+from utils.profiling import profile_record
+from utils.replacement_shards import mark_shards_done, missing_shards, upload_shard
+from utils.replacements import encode_replacements
 
 if TYPE_CHECKING:
     from mypy_boto3_sqs.type_defs import MessageAttributeValueTypeDef
 
+    from abbreviation_extraction.abbreviations_matcher import abb
+
 LOGGER = logging.getLogger()
 LOGGER.setLevel(logging.INFO)
 
 
 # isolating processing from event unpacking for portability and testing
+@profile_record("determine_replacements_abbreviations")
 def process_event(sqs_rec: SQSRecord) -> None:
     """
     Function to fetch the XML, call the replacements abbreviations pipeline and upload the enriched XML to the
@@ -29,7 +35,6 @@ def process_event(sqs_rec: SQSRecord) -> None:
     message = json.loads(sqs_rec["body"])
     LOGGER.info("EVENT: %s", message)
     msg_attributes = sqs_rec["messageAttributes"]
-    replacements = message["replacements"]
     source_key = msg_attributes["source_key"]["stringValue"]
 
     source_bucket = msg_attributes["source_bucket"]["stringValue"]
@@ -45,43 +50,25 @@ def process_event(sqs_rec: SQSRecord) -> None:
     )
 
     replacements = determine_replacements(file_content)
-    print(replacements)
-    replacements_encoded = write_replacements_file(replacements)
-
-    # open and read existing file from s3 bucket
-    replacements_content = (
-        s3_client.get_object(Bucket=REPLACEMENTS_BUCKET, Key=source_key)["Body"].read().decode("utf-8")
-    )
-    replacements_encoded = replacements_content + replacements_encoded
+    LOGGER.info("Replacements: %s", summarise(replacements))
+    replacements_encoded = encode_replacements(replacements)
 
-    upload_replacements(REPLACEMENTS_BUCKET, source_key, replacements_encoded)
+    upload_shard(REPLACEMENTS_BUCKET, source_key, "abb", replacements_encoded)
     LOGGER.info("Uploaded replacements to %s", REPLACEMENTS_BUCKET)
+
+    # the caselaw and legislation stages run alongside this one, and the last to finish starts the replacer
+    missing = missing_shards(REPLACEMENTS_BUCKET, source_key)
+    if missing:
+        LOGGER.info("Waiting for %s replacements", ", ".join(missing))
+        return
+    if not mark_shards_done(REPLACEMENTS_BUCKET, source_key):
+        LOGGER.info("Another stage has started the replacer")
+        return
     push_contents(REPLACEMENTS_BUCKET, source_key)
     LOGGER.info("Message sent on queue to start make-replacements lambda")
 
 
-def write_replacements_file(replacement_list: list[Replacement]) -> str:
-    """
-    Writes tuples of abbreviations and long forms from a list of replacements
-    """
-    tuple_file = ""
-    for i in replacement_list:
-        replacement_object = {f"{type(i).__name__}": list(i)}
-        tuple_file += json.dumps(replacement_object)
-        tuple_file += "\n"
-    return tuple_file
-
-
-def upload_replacements(replacements_bucket: str, replacements_key: str, replacements: str) -> None:
-    """
-    Uploads replacements to S3 bucket
-    """
-    s3 = boto3.resource("s3")
-    s3_obj = s3.Object(replacements_bucket, replacements_key)
-    s3_obj.put(Body=replacements)
-
-
-def determine_replacements(file_content: str) -> list[abb]:
+def determine_replacements(file_content: str) -> list["abb"]:
     """
     Calls abbreviation function to return abbreviation and long form
     """
@@ -90,10 +77,11 @@ def determine_replacements(file_content: str) -> list[abb]:
     return replacements
 
 
-def get_abbreviation_replacements(file_content: str) -> list[abb]:
+def get_abbreviation_replacements(file_content: str) -> list["abb"]:
     """
     Calls abbreviation pipeline to return abbreviation and long form
     """
+    from abbreviation_extraction.abbreviations_matcher import abb_pipeline
 
     nlp = init_NLP()
     replacements = abb_pipeline(file_content, nlp)
@@ -105,6 +93,8 @@ def init_NLP():
     """
     Load spacy model
     """
+    import spacy
+
     nlp = spacy.load("en_core_web_sm", exclude=["tok2vec", "attribute_ruler", "lemmatizer", "ner"])
     nlp.max_length = 2500000
     return nlp
@@ -132,7 +122,7 @@ REPLACEMENTS_BUCKET = validate_env_variable("REPLACEMENTS_BUCKET")
 
 
 @event_source(data_class=SQSEvent)
-def handler(event: SQSEvent, context: LambdaContext) -> None:
+def handler(event: SQSEvent, context: LambdaContext) -> BatchResponse:
     """
     Function called by the lambda to run the process event
     """
@@ -141,11 +131,7 @@ def handler(event: SQSEvent, context: LambdaContext) -> None:
     try:
         LOGGER.info("SQS EVENT: %s", event)
 
-        for sqs_rec in event.records:
-            # stop the test notification event from breaking the parsing logic
-            if "Event" in sqs_rec.keys() and sqs_rec["Event"] == "s3:TestEvent":
-                break
-            process_event(sqs_rec)
+        return process_batch(event.records, process_event, use_processes=True)
 
     except Exception as exception:
         LOGGER.error("Exception: %s", exception)
@@ -1,17 +1,20 @@
 import json
 import logging
-import urllib.parse
 from typing import TYPE_CHECKING
 
 import boto3
-import spacy
-from aws_lambda_powertools.utilities.data_classes import S3Event, event_source
-from aws_lambda_powertools.utilities.data_classes.s3_event import S3EventRecord
+from aws_lambda_powertools.utilities.data_classes import SQSEvent, event_source
+from aws_lambda_powertools.utilities.data_classes.sqs_event import SQSRecord
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
+from utils.batch_processing import BatchResponse, process_batch
 from utils.custom_types import DocumentAsXMLString
 from utils.environment_helpers import validate_env_variable
 from utils.initialise_db import init_db_connection
+from utils.metrics import summarise
+from utils.profiling import profile_record
+from utils.replacement_shards import mark_shards_done, missing_shards, upload_shard
+from utils.replacements import encode_replacements
 
 if TYPE_CHECKING:
     from mypy_boto3_sqs.type_defs import MessageAttributeValueTypeDef
@@ -29,14 +32,19 @@ LOGGER.setLevel(logging.INFO)
 
 
 # isolating processing from event unpacking for portability and testing
-def process_event(sqs_rec: S3EventRecord) -> None:
+@profile_record("determine_replacements_caselaw")
+def process_event(sqs_rec: SQSRecord) -> None:
     """
     Function to fetch the XML, call the determine_replacements_caselaw pipeline and upload the enriched XML to the
     destination bucket
     """
     s3_client = boto3.client("s3")
-    source_bucket = sqs_rec.s3.bucket.name
-    source_key = urllib.parse.unquote_plus(sqs_rec.s3.get_object.key, encoding="utf-8")
+
+    message = json.loads(sqs_rec.body)
+    LOGGER.info("EVENT: %s", message)
+    msg_attributes = sqs_rec["messageAttributes"]
+    source_key = msg_attributes["source_key"]["stringValue"]
+    source_bucket = msg_attributes["source_bucket"]["stringValue"]
     LOGGER.info("Input bucket name:%s", source_bucket)
     LOGGER.info("Input S3 key:%s", source_key)
 
@@ -50,43 +58,30 @@ def process_event(sqs_rec: S3EventRecord) -> None:
 
     replacements = determine_replacements(file_content, rules_content)
     LOGGER.info("Detected citations and built replacements")
-    print(replacements)
-    replacements_encoded = write_replacements_file(replacements)
+    LOGGER.info("Replacements: %s", summarise(replacements))
+    replacements_encoded = encode_replacements(replacements)
     LOGGER.info("Wrote replacements to file")
-    uploaded_key = upload_replacements(REPLACEMENTS_BUCKET, source_key, replacements_encoded)
+    uploaded_key = upload_shard(REPLACEMENTS_BUCKET, source_key, "case", replacements_encoded)
     LOGGER.info("Uploaded replacements to %s", uploaded_key)
 
+    # the legislation and abbreviation stages run alongside this one, and the last to finish starts the replacer
+    missing = missing_shards(REPLACEMENTS_BUCKET, source_key)
+    if missing:
+        LOGGER.info("Waiting for %s replacements", ", ".join(missing))
+        return
+    if not mark_shards_done(REPLACEMENTS_BUCKET, source_key):
+        LOGGER.info("Another stage has started the replacer")
+        return
     push_contents(source_bucket, source_key)
-    LOGGER.info("Message sent on queue to start determine-replacements-legislation lambda")
-
-
-def write_replacements_file(replacement_list):
-    """
-    Writes tuples of abbreviations and long forms from a list of replacements
-    """
-    tuple_file = ""
-    for i in replacement_list:
-        replacement_object = {f"{type(i).__name__}": list(i)}
-        tuple_file += json.dumps(replacement_object)
-        tuple_file += "\n"
-    return tuple_file
-
-
-def upload_replacements(replacements_bucket: str, replacements_key: str, replacements: str) -> str:
-    """
-    Uploads replacements to S3 bucket
-    """
-    LOGGER.info("Uploading text content to %s/%s", replacements_bucket, replacements_key)
-    s3 = boto3.resource("s3")
-    s3_obj = s3.Object(replacements_bucket, replacements_key)
-    s3_obj.put(Body=replacements)
-    return s3_obj.key
+    LOGGER.info("Message sent on queue to start make-replacements lambda")
 
 
 def init_NLP(rules_content):
     """
     Load spacy model and add rules from pre-defined patterns list
     """
+    import spacy
+
     nlp = spacy.load("en_core_web_sm", exclude=["tok2vec", "attribute_ruler", "lemmatizer", "ner"])
     nlp.max_length = 5000000
     LOGGER.info("Loading citation patterns jsonl")
@@ -182,8 +177,8 @@ RULES_FILE_KEY = validate_env_variable("RULES_FILE_KEY")
 REPLACEMENTS_BUCKET = validate_env_variable("REPLACEMENTS_BUCKET")
 
 
-@event_source(data_class=S3Event)
-def handler(event: S3Event, context: LambdaContext) -> None:
+@event_source(data_class=SQSEvent)
+def handler(event: SQSEvent, context: LambdaContext) -> BatchResponse:
     """
     Function called by the lambda to run the process event
     """
@@ -192,11 +187,7 @@ def handler(event: S3Event, context: LambdaContext) -> None:
     try:
         LOGGER.info("SQS EVENT: %s", event)
 
-        for sqs_rec in event.records:
-            # stop the test notification event from breaking the parsing logic
-            if "Event" in sqs_rec.keys() and sqs_rec["Event"] == "s3:TestEvent":
-                break
-            process_event(sqs_rec)
+        return process_batch(event.records, process_event, use_processes=True)
 
     except Exception as exception:
         LOGGER.error("Exception: %s", exception)
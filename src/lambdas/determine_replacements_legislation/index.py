@@ -1,17 +1,23 @@
+import datetime as dt
 import json
 import logging
+import os
 from typing import TYPE_CHECKING
 
 import boto3
-import spacy
 from aws_lambda_powertools.utilities.data_classes import SQSEvent, event_source
 from aws_lambda_powertools.utilities.data_classes.sqs_event import SQSRecord
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
 from database import db_connection
+from utils.batch_processing import BatchResponse, process_batch
 from utils.custom_types import DocumentAsXMLString
 from utils.environment_helpers import validate_env_variable
 from utils.initialise_db import init_db_connection
+from utils.metrics import summarise
+from utils.profiling import profile_record
+from utils.replacement_shards import mark_shards_done, missing_shards, upload_shard
+from utils.replacements import encode_replacements
 
 if TYPE_CHECKING:
     from mypy_boto3_sqs.type_defs import MessageAttributeValueTypeDef
@@ -21,6 +27,7 @@ LOGGER.setLevel(logging.INFO)
 
 
 # isolating processing from event unpacking for portability and testing
+@profile_record("determine_replacements_legislation")
 def process_event(sqs_rec: SQSRecord) -> None:
     """
     Function to fetch the XML, call the legislation replacements pipeline and upload the enriched XML to the
@@ -31,8 +38,8 @@ def process_event(sqs_rec: SQSRecord) -> None:
     message = json.loads(sqs_rec.body)
     LOGGER.info("EVENT: %s", message)
     msg_attributes = sqs_rec["messageAttributes"]
-    replacements = message["replacements"]
     source_key = msg_attributes["source_key"]["stringValue"]
+    judgment_date = msg_attributes.get("judgment_date", {}).get("stringValue")
 
     source_bucket = msg_attributes["source_bucket"]["stringValue"]
     LOGGER.info("Replacement bucket from message")
@@ -47,23 +54,26 @@ def process_event(sqs_rec: SQSRecord) -> None:
     )
 
     # determine legislation replacements
-    replacements = determine_replacements(file_content)
+    replacements = determine_replacements(file_content, parse_judgment_date(judgment_date))
     LOGGER.info("Detected citations and built replacements")
-    replacements_encoded = write_replacements_file(replacements)
+    replacements_encoded = encode_replacements(replacements)
     LOGGER.info("Wrote replacements to file")
-    LOGGER.info(replacements_encoded)
+    LOGGER.info("Encoded %s replacements in %s bytes", len(replacements), len(replacements_encoded))
 
-    # open and read existing file from s3 bucket
-    replacements_content = (
-        s3_client.get_object(Bucket=REPLACEMENTS_BUCKET, Key=source_key)["Body"].read().decode("utf-8")
-    )
-    replacements_encoded = replacements_content + replacements_encoded
-
-    uploaded_key = upload_replacements(REPLACEMENTS_BUCKET, source_key, replacements_encoded)
+    uploaded_key = upload_shard(REPLACEMENTS_BUCKET, source_key, "leg", replacements_encoded)
     LOGGER.info("Uploaded replacements to %s", uploaded_key)
+
+    # the caselaw and abbreviation stages run alongside this one, and the last to finish starts the replacer
+    missing = missing_shards(REPLACEMENTS_BUCKET, source_key)
+    if missing:
+        LOGGER.info("Waiting for %s replacements", ", ".join(missing))
+        return
+    if not mark_shards_done(REPLACEMENTS_BUCKET, source_key):
+        LOGGER.info("Another stage has started the replacer")
+        return
     push_contents(source_bucket, source_key)
     # enrichment_tracking(ENRICHMENT_BUCKET, "enrichment_tracking.csv")
-    LOGGER.info("Message sent on queue to start determine-replacements-abbreviations lambda")
+    LOGGER.info("Message sent on queue to start make-replacements lambda")
 
 
 def enrichment_tracking(bucket, key):
@@ -87,36 +97,47 @@ def enrichment_tracking(bucket, key):
     # print(line[0], line[1])
 
 
-def write_replacements_file(replacement_list):
+def init_NLP():
     """
-    Writes tuples of abbreviations and long forms from a list of replacements
+    Load spacy model
     """
-    tuple_file = ""
-    for i in replacement_list:
-        replacement_object = {f"{type(i).__name__}": list(i)}
-        tuple_file += json.dumps(replacement_object)
-        tuple_file += "\n"
-    return tuple_file
+    import spacy
+
+    nlp = spacy.load("en_core_web_sm", exclude=["tok2vec", "attribute_ruler", "lemmatizer", "ner"])
+    nlp.max_length = 2500000
+    return nlp
 
 
-def upload_replacements(replacements_bucket: str, replacements_key: str, replacements: str) -> str:
+def parse_judgment_date(judgment_date: str | None) -> dt.date | None:
     """
-    Uploads replacements to S3 bucket
+    Read the date of the judgment passed on from its FRBRWork/FRBRdate, if there is a valid one
     """
-    LOGGER.info("Uploading text content to %s/%s", replacements_bucket, replacements_key)
-    s3 = boto3.resource("s3")
-    s3_obj = s3.Object(replacements_bucket, replacements_key)
-    s3_obj.put(Body=replacements)
-    return s3_obj.key
+    if not judgment_date:
+        return None
+    try:
+        return dt.date.fromisoformat(judgment_date[:10])
+    except ValueError:
+        LOGGER.warning("Ignoring judgment date %s", judgment_date)
+        return None
 
 
-def init_NLP():
+def years_after_act() -> int | None:
     """
-    Load spacy model
+    How many tokens after an Act a year has to be for legislation from that year to be searched for, from
+    LEGISLATION_YEARS_AFTER_ACT. Leaving it unset or setting it to 0 searches for legislation from any year in the
+    text.
     """
-    nlp = spacy.load("en_core_web_sm", exclude=["tok2vec", "attribute_ruler", "lemmatizer", "ner"])
-    nlp.max_length = 2500000
-    return nlp
+    within = int(os.environ.get("LEGISLATION_YEARS_AFTER_ACT") or 0)
+    return within or None
+
+
+def match_workers() -> int | None:
+    """
+    How many worker processes to split fuzzy matching legislation between, from LEGISLATION_MATCH_WORKERS. Leaving it
+    unset or setting it to 0 or 1 matches in this process, which AWS Lambda needs as it cannot start a process pool.
+    """
+    workers = int(os.environ.get("LEGISLATION_MATCH_WORKERS") or 0)
+    return workers if workers > 1 else None
 
 
 def close_connection(db_conn) -> None:
@@ -126,9 +147,10 @@ def close_connection(db_conn) -> None:
     db_connection.close_connection(db_conn)
 
 
-def determine_replacements(file_content):
+def determine_replacements(file_content, judgment_date=None):
     """
     Fetch legislation replacements from database
+    :param judgment_date: date of the judgment, so legislation enacted after it is not searched for
     """
     # connect to the database
     db_conn = init_db_connection()
@@ -138,11 +160,9 @@ def determine_replacements(file_content):
     nlp = init_NLP()
     LOGGER.info("Loaded NLP model")
 
-    doc = nlp(file_content)
-
     leg_titles = db_connection.get_legtitles(db_conn)
 
-    replacements = get_legislation_replacements(leg_titles, nlp, doc, db_conn)
+    replacements = get_legislation_replacements(leg_titles, nlp, file_content, db_conn, judgment_date)
     LOGGER.info("Replacements identified")
     LOGGER.info(len(replacements))
     close_connection(db_conn)
@@ -150,14 +170,22 @@ def determine_replacements(file_content):
     return replacements
 
 
-def get_legislation_replacements(leg_titles, nlp, doc, db_conn):
+def get_legislation_replacements(leg_titles, nlp, text, db_conn, judgment_date=None):
     """
-    Runs the legislation pipeline on the XML and returns the replacements
+    Runs the legislation pipeline on the windows of the text that may hold legislation and returns the replacements
     """
-    from legislation_extraction.legislation_matcher_hybrid import leg_pipeline
+    from legislation_extraction.text_windows import leg_pipeline_from_text
 
-    replacements = leg_pipeline(leg_titles, nlp, doc, db_conn)
-    print(replacements)
+    replacements = leg_pipeline_from_text(
+        leg_titles,
+        nlp,
+        text,
+        db_conn,
+        judgment_date,
+        years_after_act(),
+        match_workers(),
+    )
+    LOGGER.info("Replacements: %s", summarise(replacements))
     return replacements
 
 
@@ -184,7 +212,7 @@ ENRICHMENT_BUCKET = validate_env_variable("ENRICHMENT_BUCKET")
 
 
 @event_source(data_class=SQSEvent)
-def handler(event: SQSEvent, context: LambdaContext) -> None:
+def handler(event: SQSEvent, context: LambdaContext) -> BatchResponse:
     """
     Function called by the lambda to run the process event
     """
@@ -193,11 +221,7 @@ def handler(event: SQSEvent, context: LambdaContext) -> None:
     try:
         LOGGER.info("SQS EVENT: %s", event)
 
-        for sqs_rec in event.records:
-            # stop the test notification event from breaking the parsing logic
-            if "Event" in sqs_rec.keys() and sqs_rec["Event"] == "s3:TestEvent":
-                break
-            process_event(sqs_rec)
+        return process_batch(event.records, process_event, use_processes=True)
 
     except Exception as exception:
         LOGGER.error("Exception: %s", exception)
@@ -1,6 +1,10 @@
+import codecs
+import json
 import logging
 import os
+import tempfile
 import urllib.parse
+from typing import IO, TYPE_CHECKING
 
 import boto3
 from aws_lambda_powertools.utilities.data_classes import S3Event, event_source
@@ -9,12 +13,18 @@ from aws_lambda_powertools.utilities.typing import LambdaContext
 
 from utils.custom_types import DocumentAsXMLString
 from utils.environment_helpers import validate_env_variable
-from utils.helper import parse_file
+from utils.helper import extract_text, parse_file
+from utils.profiling import profile_record
+from utils.replacement_shards import clear_shards
+
+if TYPE_CHECKING:
+    from mypy_boto3_sqs.type_defs import MessageAttributeValueTypeDef
 
 LOGGER = logging.getLogger()
 LOGGER.setLevel(logging.INFO)
 
 
+@profile_record("extract_judgement_contents")
 def process_event(sqs_rec: S3EventRecord):
     """
     Isolating processing from event unpacking for portability and testing
@@ -25,13 +35,18 @@ def process_event(sqs_rec: S3EventRecord):
     print("Input bucket name:", source_bucket)
     print("Input S3 key:", source_key)
 
-    file_content = DocumentAsXMLString(
-        s3_client.get_object(Bucket=source_bucket, Key=source_key)["Body"].read().decode("utf-8"),
-    )
+    file_body = s3_client.get_object(Bucket=source_bucket, Key=source_key)["Body"]
+
+    # extract the judgement contents, streaming the XML in and the text out without holding either in memory
+    with tempfile.TemporaryFile() as text_file:
+        offset_map = extract_text(file_body, codecs.getwriter("utf-8")(text_file))
+        LOGGER.info("Extracted %s text segments from %s", len(offset_map), source_key)
+        text_file.seek(0)
+        text_key = upload_contents(source_key, text_file)
 
-    # extract the judgement contents
-    text_content = extract_text_content(file_content)
-    upload_contents(source_key, text_content)
+    clear_shards(REPLACEMENTS_BUCKET, text_key)
+    push_contents(DEST_BUCKET, text_key, offset_map.judgment_date)
+    LOGGER.info("Messages sent on queues to start the replacement detection lambdas")
 
 
 def extract_text_content(file_content: DocumentAsXMLString) -> str:
@@ -41,7 +56,7 @@ def extract_text_content(file_content: DocumentAsXMLString) -> str:
     return parse_file(file_content)
 
 
-def upload_contents(source_key: str, text_content: DocumentAsXMLString | str):
+def upload_contents(source_key: str, text_content: DocumentAsXMLString | str | IO[bytes]) -> str:
     """
     Uploads text to S3 bucket
     """
@@ -50,9 +65,29 @@ def upload_contents(source_key: str, text_content: DocumentAsXMLString | str):
     s3 = boto3.resource("s3")
     s3_obj = s3.Object(DEST_BUCKET, filename)
     s3_obj.put(Body=text_content)
+    return filename
+
+
+def push_contents(uploaded_bucket: str, uploaded_key: str, judgment_date: str | None = None) -> None:
+    """
+    Starts each replacement detection lambda on the text, so they run at the same time
+    """
+    sqs = boto3.resource("sqs")
+
+    message = {"replacements": uploaded_key}
+    msg_attributes: dict[str, MessageAttributeValueTypeDef] = {
+        "source_key": {"DataType": "String", "StringValue": uploaded_key},
+        "source_bucket": {"DataType": "String", "StringValue": uploaded_bucket},
+    }
+    if judgment_date:
+        msg_attributes["judgment_date"] = {"DataType": "String", "StringValue": judgment_date}
+    for queue_url in DETECTION_QUEUES:
+        sqs.Queue(queue_url).send_message(MessageBody=json.dumps(message), MessageAttributes=msg_attributes)
 
 
 DEST_BUCKET = validate_env_variable("DEST_BUCKET_NAME")
+REPLACEMENTS_BUCKET = validate_env_variable("REPLACEMENTS_BUCKET")
+DETECTION_QUEUES = validate_env_variable("DETECTION_QUEUE_NAMES").split(",")
 
 
 @event_source(data_class=S3Event)
@@ -1,15 +1,20 @@
+import functools
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import Any
 
 import boto3
-import urllib3
 from aws_lambda_powertools.utilities.data_classes import SQSEvent, event_source
 from aws_lambda_powertools.utilities.data_classes.sqs_event import SQSRecord
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
+from utils.api_client import api_headers, get_api_pool
+from utils.batch_processing import BatchResponse, process_batch
 from utils.custom_types import APIEndpointBaseURL, DocumentAsXMLString
 from utils.environment_helpers import validate_env_variable
+from utils.metrics import measure_stage, summarise
+from utils.profiling import profile_record
 
 LOGGER = logging.getLogger()
 LOGGER.setLevel(logging.INFO)
@@ -24,12 +29,13 @@ def fetch_judgment_urllib(api_endpoint: APIEndpointBaseURL, query: str, username
     """
     Fetch the judgment from the National Archives
     """
-    http = urllib3.PoolManager()
+    http = get_api_pool(api_endpoint)
     url = f"{api_endpoint}judgment/{query}"
-    headers = urllib3.make_headers(basic_auth=username + ":" + pw)
-    r = http.request("GET", url, headers=headers)
+    with measure_stage("fetch_judgment", judgment=query) as metrics:
+        r = http.request("GET", url, headers=api_headers(username, pw))
+        metrics.input_bytes = len(r.data)
     print("Fetch judgment status:", r.status)
-    print("Fetch judgment data:", r.data)
+    print("Fetch judgment data:", summarise(r.data))
     return DocumentAsXMLString(r.data.decode())
 
 
@@ -37,30 +43,38 @@ def lock_judgment_urllib(api_endpoint: APIEndpointBaseURL, query: str, username:
     """
     Lock the judgment for editing
     """
-    http = urllib3.PoolManager()
+    http = get_api_pool(api_endpoint)
     # currently unlock only looks for a truthy/falsy value
     # but we might upgrade that to be a time in seconds
     url = f"{api_endpoint}lock/{query}?unlock=3600"
-    headers = urllib3.make_headers(basic_auth=username + ":" + pw)
     r = http.request(
         "PUT",
         url,
-        headers=headers,
+        headers=api_headers(username, pw),
     )
     print("Lock judgment API status:", r.status)
     # return r.data.decode()
 
 
+def unlock_judgment_urllib(api_endpoint: APIEndpointBaseURL, query: str, username: str, pw: str) -> None:
+    """
+    Release the lock on the judgment
+    """
+    http = get_api_pool(api_endpoint)
+    url = f"{api_endpoint}lock/{query}"
+    r = http.request("DELETE", url, headers=api_headers(username, pw))
+    print("Unlock judgment API status:", r.status)
+
+
 def check_lock_judgment_urllib(api_endpoint: APIEndpointBaseURL, query: str, username: str, pw: str) -> None:
     """
     Check whether the judgment is locked
     """
-    http = urllib3.PoolManager()
+    http = get_api_pool(api_endpoint)
     url = f"{api_endpoint}lock/{query}"
-    headers = urllib3.make_headers(basic_auth=username + ":" + pw)
-    r = http.request("GET", url, headers=headers)
+    r = http.request("GET", url, headers=api_headers(username, pw))
     print("Check lock status:", r.status)
-    print("Check lock data:", r.data.decode())
+    print("Check lock data:", summarise(r.data))
     # return r.data.decode()
 
 
@@ -95,6 +109,7 @@ def upload_contents(source_key: str, xml_content: DocumentAsXMLString) -> None:
     s3_obj.put(Body=xml_content)
 
 
+@profile_record("fetch_xml")
 def process_event(sqs_rec: SQSRecord, api_endpoint: APIEndpointBaseURL) -> None:
     """
     Function to check the status of the judgment, fetch the judgment if it is published, lock the judgment for editing
@@ -108,11 +123,21 @@ def process_event(sqs_rec: SQSRecord, api_endpoint: APIEndpointBaseURL) -> None:
     source_key = query.replace("/", "-")
     print("Source key:", source_key)
 
-    # fetch the xml content
-    xml_content = fetch_judgment_urllib(api_endpoint, query, API_USERNAME, API_PASSWORD)
-    # print(xml_content)
+    # fetching and locking are independent, so run them side by side over the shared connection pool
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        fetch = executor.submit(fetch_judgment_urllib, api_endpoint, query, API_USERNAME, API_PASSWORD)
+        lock = executor.submit(lock_judgment_urllib, api_endpoint, query, API_USERNAME, API_PASSWORD)
+        try:
+            xml_content = fetch.result()
+        except Exception:
+            # the lock was requested alongside the fetch, so release it rather than leave the judgment locked
+            # with nothing enriching it
+            wait([lock])
+            unlock_judgment_urllib(api_endpoint, query, API_USERNAME, API_PASSWORD)
+            raise
+        # only start the rest of the pipeline once the judgment is locked
+        lock.result()
     upload_contents(source_key, xml_content)
-    lock_judgment_urllib(api_endpoint, query, API_USERNAME, API_PASSWORD)
     check_lock_judgment_urllib(api_endpoint, query, API_USERNAME, API_PASSWORD)
 
 
@@ -127,7 +152,7 @@ ENVIRONMENT = validate_env_variable("ENVIRONMENT")
 
 
 @event_source(data_class=SQSEvent)
-def handler(event: SQSEvent, context: LambdaContext) -> None:
+def handler(event: SQSEvent, context: LambdaContext) -> BatchResponse:
     """
     Function called by the lambda to run the process event
     """
@@ -143,10 +168,7 @@ def handler(event: SQSEvent, context: LambdaContext) -> None:
 
     try:
         LOGGER.info("SQS EVENT: %s", event)
-        for sqs_rec in event.records:
-            if "Event" in sqs_rec.keys() and sqs_rec["Event"] == "s3:TestEvent":
-                break
-            process_event(sqs_rec, api_endpoint)
+        return process_batch(event.records, functools.partial(process_event, api_endpoint=api_endpoint))
 
     except Exception as exception:
         LOGGER.error("Exception: %s", exception)
@@ -1,6 +1,7 @@
 import json
 import logging
 import os
+from typing import IO
 
 import boto3
 from aws_lambda_powertools.utilities.data_classes import SQSEvent, event_source
@@ -8,8 +9,11 @@ from aws_lambda_powertools.utilities.data_classes.sqs_event import SQSRecord
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
 from replacer.make_replacments import make_post_header_replacements
+from utils.batch_processing import BatchResponse, process_batch
 from utils.custom_types import DocumentAsXMLString
 from utils.environment_helpers import validate_env_variable
+from utils.profiling import profile_record
+from utils.replacement_shards import SHARD_KINDS, missing_shards, read_shards
 
 LOGGER = logging.getLogger()
 LOGGER.setLevel(logging.DEBUG)
@@ -27,6 +31,7 @@ def upload_contents(source_key: str, text_content: DocumentAsXMLString) -> None:
     s3_obj.put(Body=text_content)
 
 
+@profile_record("make_replacements")
 def process_event(sqs_rec: SQSRecord) -> None:
     """
     Isolating processing from event unpacking for portability and testing
@@ -37,7 +42,6 @@ def process_event(sqs_rec: SQSRecord) -> None:
     LOGGER.info("EVENT: %s", message)
 
     msg_attributes = sqs_rec["messageAttributes"]
-    message["replacements"]
     source_key = msg_attributes["source_key"]["stringValue"]
 
     replacement_bucket = msg_attributes["source_bucket"]["stringValue"]
@@ -59,15 +63,29 @@ def process_event(sqs_rec: SQSRecord) -> None:
     )
     LOGGER.info("Got original XML file content")
 
-    replacement_file_content = (
-        s3_client.get_object(Bucket=REPLACEMENTS_BUCKET, Key=source_key)["Body"].read().decode("utf-8")
-    )
+    replacements = fetch_replacements(s3_client, source_key)
     LOGGER.info("Got replacement file content")
 
-    full_replaced_text_content = make_post_header_replacements(file_content, replacement_file_content)
+    full_replaced_text_content = make_post_header_replacements(file_content, replacements)
     upload_contents(filename, full_replaced_text_content)
 
 
+def fetch_replacements(s3_client, source_key: str) -> bytes | IO[bytes]:
+    """
+    Fetch the shards written by each detection stage in parallel.
+    Judgments whose replacements were written to a single file before the stages were sharded are streamed from it.
+    """
+    missing = missing_shards(REPLACEMENTS_BUCKET, source_key, s3_client=s3_client)
+    if len(missing) == len(SHARD_KINDS):
+        LOGGER.info("No replacement shards for %s, reading the replacements file", source_key)
+        # the replacements are read as they are streamed in
+        return s3_client.get_object(Bucket=REPLACEMENTS_BUCKET, Key=source_key)["Body"]
+    if missing:
+        LOGGER.warning("Making replacements without %s replacements", ", ".join(missing))
+    written = [kind for kind in SHARD_KINDS if kind not in missing]
+    return read_shards(REPLACEMENTS_BUCKET, source_key, written, s3_client=s3_client)
+
+
 DEST_BUCKET = validate_env_variable("DEST_BUCKET_NAME")
 SOURCE_BUCKET = validate_env_variable("SOURCE_BUCKET_NAME")
 REPLACEMENTS_BUCKET = validate_env_variable("REPLACEMENTS_BUCKET")
@@ -75,7 +93,7 @@ REPLACEMENTS_BUCKET = validate_env_variable("REPLACEMENTS_BUCKET")
 
 # make replacements
 @event_source(data_class=SQSEvent)
-def handler(event: SQSEvent, context: LambdaContext) -> None:
+def handler(event: SQSEvent, context: LambdaContext) -> BatchResponse:
     """
     Function called by the lambda to run the process event
     """
@@ -85,11 +103,7 @@ def handler(event: SQSEvent, context: LambdaContext) -> None:
     try:
         LOGGER.info("SQS EVENT: %s", event)
 
-        for sqs_rec in event.records:
-            # stop the test notification event from breaking the parsing logic
-            if "Event" in sqs_rec.keys() and sqs_rec["Event"] == "s3:TestEvent":
-                break
-            process_event(sqs_rec)
+        return process_batch(event.records, process_event)
 
     except Exception as exception:
         LOGGER.error("Exception: %s", exception)
@@ -3,14 +3,17 @@ import logging
 
 import boto3
 import requests
-import urllib3
 from aws_lambda_powertools.utilities.data_classes import SQSEvent, event_source
 from aws_lambda_powertools.utilities.data_classes.sqs_event import SQSRecord
 from aws_lambda_powertools.utilities.typing import LambdaContext
 from requests.auth import HTTPBasicAuth
 
+from utils.api_client import api_headers, get_api_pool
+from utils.batch_processing import BatchResponse, process_batch
 from utils.custom_types import APIEndpointBaseURL, DocumentAsXMLString
 from utils.environment_helpers import validate_env_variable
+from utils.metrics import measure_stage, summarise
+from utils.profiling import profile_record
 
 LOGGER = logging.getLogger()
 LOGGER.setLevel(logging.INFO)
@@ -25,12 +28,11 @@ def fetch_judgment_urllib(api_endpoint: APIEndpointBaseURL, query: str, username
     """
     Fetch the judgment from the National Archives
     """
-    http = urllib3.PoolManager()
+    http = get_api_pool(api_endpoint)
     url = f"{api_endpoint}judgment/{query}"
-    headers = urllib3.make_headers(basic_auth=username + ":" + pw)
-    r = http.request("GET", url, headers=headers)
+    r = http.request("GET", url, headers=api_headers(username, pw))
     print(r.status)
-    print(r.data)
+    print(summarise(r.data))
     return DocumentAsXMLString(r.data.decode())
 
 
@@ -38,25 +40,27 @@ def release_lock(api_endpoint: APIEndpointBaseURL, query: str, username: str, pw
     """
     Unlock the judgment after editing
     """
-    http = urllib3.PoolManager()
+    http = get_api_pool(api_endpoint)
     url = f"{api_endpoint}lock/{query}"
-    headers = urllib3.make_headers(basic_auth=username + ":" + pw)
-    r = http.request("DELETE", url, headers=headers)
+    r = http.request("DELETE", url, headers=api_headers(username, pw))
     print(r.status)
-    print(r.data)
+    print(summarise(r.data))
 
 
 def patch_judgment_request(api_endpoint: APIEndpointBaseURL, query: str, data: str, username: str, pw: str) -> None:
     """
     Apply enrichments to the judgment
     """
-    response = requests.patch(
-        f"{api_endpoint}judgment/{query}",
-        auth=HTTPBasicAuth(username, pw),
-        data=data.encode(),
-        params={"unlock": True},
-        timeout=10,
-    )
+    body = data.encode()
+    with measure_stage("patch_judgment", judgment=query) as metrics:
+        metrics.input_bytes = len(body)
+        response = requests.patch(
+            f"{api_endpoint}judgment/{query}",
+            auth=HTTPBasicAuth(username, pw),
+            data=body,
+            params={"unlock": True},
+            timeout=10,
+        )
     print(response)
     response.raise_for_status()
 
@@ -64,6 +68,7 @@ def patch_judgment_request(api_endpoint: APIEndpointBaseURL, query: str, data: s
 ############################################
 
 
+@profile_record("push_enriched_xml")
 def process_event(sqs_rec: SQSRecord) -> None:
     """
     Function to apply enrichments to the judgment
@@ -113,7 +118,7 @@ ENVIRONMENT = validate_env_variable("ENVIRONMENT")
 
 
 @event_source(data_class=SQSEvent)
-def handler(event: SQSEvent, context: LambdaContext) -> None:
+def handler(event: SQSEvent, context: LambdaContext) -> BatchResponse:
     """
     Function called by the lambda to run the process event
     """
@@ -123,10 +128,7 @@ def handler(event: SQSEvent, context: LambdaContext) -> None:
     LOGGER.info(ENVIRONMENT)
     try:
         LOGGER.info("SQS EVENT: %s", event)
-        for sqs_rec in event.records:
-            if "Event" in sqs_rec.keys() and sqs_rec["Event"] == "s3:TestEvent":
-                break
-            process_event(sqs_rec)
+        return process_batch(event.records, process_event)
 
     except Exception as exception:
         LOGGER.error("Exception: %s", exception)
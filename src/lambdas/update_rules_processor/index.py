@@ -2,15 +2,17 @@ import json
 import logging
 import urllib.parse
 from io import StringIO
+from typing import TYPE_CHECKING
 
 import boto3
-import pandas as pd
-import spacy
 from aws_lambda_powertools.utilities.data_classes import S3Event, event_source
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
 from utils.initialise_db import init_db_engine
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 LOGGER = logging.getLogger()
 LOGGER.setLevel(logging.INFO)
 
@@ -40,7 +42,7 @@ def upload_replacements(pattern_bucket: str, pattern_key: str, patterns_file: st
     return s3_obj.key
 
 
-def create_test_jsonl(source_bucket: str, df: pd.DataFrame) -> None:
+def create_test_jsonl(source_bucket: str, df: "pd.DataFrame") -> None:
     """
     Create test jsonl of patterns pulled from a csv
     """
@@ -49,10 +51,12 @@ def create_test_jsonl(source_bucket: str, df: pd.DataFrame) -> None:
     upload_replacements(source_bucket, "test_citation_patterns.jsonl", patterns_file)
 
 
-def test_manifest(df: pd.DataFrame, patterns: list[str]) -> None:
+def test_manifest(df: "pd.DataFrame", patterns: list[str]) -> None:
     """
     Test for the rules manifest.
     """
+    import spacy
+
     nlp = spacy.load("en_core_web_sm", exclude=["tok2vec", "attribute_ruler", "lemmatizer", "ner"])
     nlp.max_length = 2500000
 
@@ -89,6 +93,8 @@ def lambda_handler(event: S3Event, context: LambdaContext) -> None:
     print(source_bucket)
     print(source_key)
     if source_key.endswith(".csv"):
+        import pandas as pd
+
         response = s3.get_object(Bucket=source_bucket, Key=source_key)
         csv_file = response["Body"].read().decode("utf-8")
         df = pd.read_csv(StringIO(csv_file))
@@ -3,15 +3,16 @@ import os
 import urllib.parse
 
 import boto3
-from distutils.util import strtobool
 
 from utils.custom_types import DocumentAsXMLBytes
 from utils.environment_helpers import validate_env_variable
+from utils.profiling import profile_record
 
 LOGGER = logging.getLogger()
 LOGGER.setLevel(logging.DEBUG)
 
 
+@profile_record("vlex_upload")
 def process_event(sqs_rec):
     """
     Isolating processing from event unpacking for portability and testing
@@ -47,7 +48,15 @@ def upload_contents(source_key: str, text_content: DocumentAsXMLBytes):
 
 
 DEST_BUCKET = validate_env_variable("DEST_BUCKET_NAME")
-FORWARD_TO_VLEX_ENABLED = strtobool(validate_env_variable("FORWARD_TO_VLEX_ENABLED"))
+# the values distutils' strtobool read as true, without importing setuptools on every cold start
+FORWARD_TO_VLEX_ENABLED = validate_env_variable("FORWARD_TO_VLEX_ENABLED").lower() in {
+    "y",
+    "yes",
+    "t",
+    "true",
+    "on",
+    "1",
+}
 
 
 def handler(event, context) -> None:
@@ -1,8 +1,10 @@
 import json
 import logging
+import os
+import time
 import urllib.parse
 from io import BytesIO
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, NamedTuple
 
 import boto3
 from aws_lambda_powertools.utilities.data_classes import S3Event, event_source
@@ -12,6 +14,7 @@ from lxml import etree
 
 from utils.custom_types import DocumentAsXMLBytes
 from utils.environment_helpers import validate_env_variable
+from utils.profiling import profile_record
 
 if TYPE_CHECKING:
     from mypy_boto3_sqs.type_defs import MessageAttributeValueTypeDef
@@ -22,7 +25,21 @@ LOGGER.setLevel(logging.INFO)
 
 client = boto3.client("ssm")
 
+# How long a compiled schema is trusted before its ETag is checked against S3 again
+DEFAULT_SCHEMA_CACHE_TTL_SECONDS = 300
 
+
+class CachedSchema(NamedTuple):
+    schema: etree.XMLSchema
+    etag: str | None
+    checked_at: float
+
+
+# Compiled schemas survive between invocations of a warm lambda, keyed by (bucket, key)
+_SCHEMA_CACHE: dict[tuple[str, str], CachedSchema] = {}
+
+
+@profile_record("xml_validate")
 def process_event(sqs_rec: S3EventRecord) -> tuple[bool, str, DocumentAsXMLBytes, str]:
     """
     Isolating processing from event unpacking for portability and testing
@@ -54,6 +71,14 @@ def find_schema(schema_bucket: str, schema_key: str) -> bytes:
     return schema_content
 
 
+def find_schema_etag(schema_bucket: str, schema_key: str) -> str:
+    """
+    Fetch the ETag of the schema in the schema S3 bucket without downloading it
+    """
+    s3_client = boto3.client("s3")
+    return s3_client.head_object(Bucket=schema_bucket, Key=schema_key)["ETag"]
+
+
 def load_schema(schema_content: bytes) -> etree.XMLSchema:
     """
     Parse the schema to XML schema to describe structure of XML document
@@ -65,6 +90,33 @@ def load_schema(schema_content: bytes) -> etree.XMLSchema:
     return xmlschema
 
 
+def _schema_cache_ttl() -> float:
+    return float(os.environ.get("SCHEMA_CACHE_TTL_SECONDS", DEFAULT_SCHEMA_CACHE_TTL_SECONDS))
+
+
+def get_schema(schema_bucket: str, schema_key: str) -> etree.XMLSchema:
+    """
+    Return the compiled schema, only compiling it again when it has changed.
+    The compiled schema is kept at module scope and its ETag is checked with a HEAD
+    request at most once every SCHEMA_CACHE_TTL_SECONDS.
+    """
+    cache_key = (schema_bucket, schema_key)
+    cached = _SCHEMA_CACHE.get(cache_key)
+    now = time.monotonic()
+    if cached and now - cached.checked_at < _schema_cache_ttl():
+        return cached.schema
+
+    etag = find_schema_etag(schema_bucket, schema_key)
+    if cached and cached.etag == etag:
+        _SCHEMA_CACHE[cache_key] = cached._replace(checked_at=now)
+        return cached.schema
+
+    LOGGER.info("Compiling schema %s/%s with ETag %s", schema_bucket, schema_key, etag)
+    schema = load_schema(find_schema(schema_bucket, schema_key))
+    _SCHEMA_CACHE[cache_key] = CachedSchema(schema, etag, now)
+    return schema
+
+
 def validate_content(file_content: DocumentAsXMLBytes) -> bool:
     """
     Function to validate schema
@@ -79,8 +131,7 @@ def validate_content(file_content: DocumentAsXMLBytes) -> bool:
         schema_bucket = validate_env_variable("SCHEMA_BUCKET_NAME")
         schema_key = validate_env_variable("SCHEMA_BUCKET_KEY")
 
-        schema_content = find_schema(schema_bucket, schema_key)
-        schema = load_schema(schema_content)
+        schema = get_schema(schema_bucket, schema_key)
         result = schema.validate(xmldoc)
 
     return result
@@ -18,21 +18,37 @@ The hybrid matcher goes through three stages:
 
 """
 
-from collections import namedtuple
-from typing import Any
+import bisect
+import heapq
+import logging
+import math
+import time
+from collections import Counter, defaultdict, namedtuple
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, NamedTuple
 
 import numpy as np
 import pandas as pd
-from spacy.matcher import Matcher, PhraseMatcher
+from spacy.attrs import ORTH, SHAPE
+from spacy.matcher import PhraseMatcher
+from spacy.tokens import Doc
 from spaczz.matcher import FuzzyMatcher
 
-from database.db_connection import get_canonical_leg, get_hrefs
+from database.db_connection import get_legislation_links
+from legislation_extraction.window_cache import WINDOW_CACHE
+from utils.metrics import instrument_stage
+
+LOGGER = logging.getLogger()
 
 CUTOFF = 90
 PAD = 5
+GRAM_SIZE = 2
 
 keys = ["detected_ref", "start", "end", "confidence", "ref", "canonical"]
-leg = namedtuple("leg", "detected_ref href canonical")
+# span is the (offset, length) of the reference in the judgment text
+leg = namedtuple("leg", "detected_ref href canonical span", defaults=(None,))
 
 
 def mergedict(x, b):
@@ -176,7 +192,7 @@ def search_for_act_fuzzy(title, docobj, nlp, cutoff, candidates=None):
     return matched_text
 
 
-def fuzzy_matcher(title, docobj, nlp, cutoff, candidates=None):
+def fuzzy_matcher(title, docobj, nlp, cutoff, candidates=None, cache=WINDOW_CACHE):
     """
     Detects legislation in body of judgement by searching the candidate segments for similar matches of the title by running a fuzzy matcher.
     Parameters
@@ -192,6 +208,8 @@ def fuzzy_matcher(title, docobj, nlp, cutoff, candidates=None):
         Eg. a match between two string with a ratio of 90 and cutoff 95 would not be returned by the matcher.
     candidates : list(tuple)
         List of tuples in the form [(start_pos, end_pos)] indicating the position of the candidate segments in the text.
+    cache : WindowCache
+        Cache of the matches found in each segment, shared between judgements.
     Returns
     -------
     matched_text : list(tuple)
@@ -203,18 +221,93 @@ def fuzzy_matcher(title, docobj, nlp, cutoff, candidates=None):
     act_span = len(nlp(title)) + PAD
     all_matches = []
     for _, end in candidates:
-        # get segment in judgment that contains candidate reference
-        segment = nlp(docobj[end - act_span : end - 1].text)
         dyear = docobj[end - 1 : end].text
-        # fuzzy match act with segment
-        matches = search_for_act_fuzzy(act, segment, nlp, cutoff=cutoff)
-        if (len(matches) > 0) & (dyear == year):
-            all_matches.extend(
-                [(docobj[end - 1 - e + s : end].text, end - 1 - e + s, end, ratio) for text, s, e, ratio in matches],
-            )
+        if dyear != year:
+            continue
+        # get segment in judgment that contains candidate reference
+        window = docobj[end - act_span : end - 1].text
+        key = (nlp.lang, title, window, cutoff)
+        matches = cache.get(key)
+        if matches is None:
+            # fuzzy match act with segment
+            segment = nlp(window)
+            matches = [(s, e, ratio) for _, s, e, ratio in search_for_act_fuzzy(act, segment, nlp, cutoff=cutoff)]
+            cache.put(key, matches)
+        all_matches.extend(
+            [(docobj[end - 1 - e + s : end].text, end - 1 - e + s, end, ratio) for s, e, ratio in matches],
+        )
     return all_matches
 
 
+class LexicalScan(NamedTuple):
+    """
+    The years and [Act YYYY] references in a judgment, found in one pass over its tokens
+    """
+
+    year_positions: dict[int, list[int]]
+    """Token positions of each four digit year"""
+    candidates: list[tuple[int, int]]
+    """Start and end positions of each [Act YYYY] in the text"""
+    candidates_by_year: dict[str, list[tuple[int, int]]]
+    """The [Act YYYY] candidates, by the text of their year"""
+    act_positions: list[int]
+    """Token positions of each Act"""
+
+    @property
+    def years(self) -> set[int]:
+        return set(self.year_positions)
+
+    def years_after_act(self, within: int) -> set[int]:
+        """
+        The years found no more than `within` tokens after an Act
+        """
+        years = set()
+        for year, positions in self.year_positions.items():
+            for position in positions:
+                # the last Act before the year
+                act = bisect.bisect_left(self.act_positions, position) - 1
+                if act >= 0 and position - self.act_positions[act] <= within:
+                    years.add(year)
+                    break
+        return years
+
+
+def scan_judgment(docobj: Doc) -> LexicalScan:
+    """
+    Find the year -like tokens and the [Act YYYY] candidates in the judgement body from the token arrays,
+    rather than running a matcher for each.
+    Parameters
+    ----------
+    docobj : spacy.Doc
+        The body of the judgement.
+    Returns
+    -------
+    output : LexicalScan
+        The positions of the years and of the candidate segments in the text.
+    """
+    strings = docobj.vocab.strings
+    orths, shapes = docobj.to_array([ORTH, SHAPE]).reshape(-1, 2).T
+    year_shaped = shapes == strings["dddd"]
+
+    year_positions: dict[int, list[int]] = defaultdict(list)
+    year_shaped_positions = np.flatnonzero(year_shaped)
+    for position, orth in zip(year_shaped_positions.tolist(), orths[year_shaped_positions].tolist(), strict=True):
+        # longer numbers share the shape of four digits
+        text = strings[orth]
+        if len(text) == 4 and text.isdigit():
+            year_positions[int(text)].append(position)
+
+    candidates = []
+    candidates_by_year: dict[str, list[tuple[int, int]]] = defaultdict(list)
+    acts = orths == strings["Act"]
+    act_starts = np.flatnonzero(acts[:-1] & year_shaped[1:])
+    for start, year_orth in zip(act_starts.tolist(), orths[act_starts + 1].tolist(), strict=True):
+        candidates.append((start, start + 2))
+        candidates_by_year[strings[year_orth]].append((start, start + 2))
+
+    return LexicalScan(dict(year_positions), candidates, dict(candidates_by_year), np.flatnonzero(acts).tolist())
+
+
 def detect_candidates(nlp, docobj):
     """
     Detect possible legislation references with pattern [Act YYYY].
@@ -229,15 +322,180 @@ def detect_candidates(nlp, docobj):
     output : list(tuple)
         List of tuples indicating the position of the candidate segments in the text.
     """
-    #
-    pattern = [{"ORTH": "Act"}, {"SHAPE": "dddd"}]
-    matcher = Matcher(nlp.vocab)
-    matcher.add("Act Matcher", [pattern])
-    matches = matcher(docobj)
-    return [(start, end) for _, start, end in matches]
+    return scan_judgment(docobj).candidates
 
 
-def lookup_pipe(titles, docobj, nlp, method, conn, cutoff):
+def word_grams(text):
+    """
+    The character bigrams within each word of a text, lowercased as the fuzzy matcher compares them.
+    Bigrams do not cross the spaces between words, so they are the same whatever order the words are sorted in.
+    """
+    return {word[i : i + GRAM_SIZE] for word in text.lower().split() for i in range(len(word) - GRAM_SIZE + 1)}
+
+
+def max_edits(act, cutoff):
+    """
+    The most characters that can be inserted into or deleted from an act title while the fuzzy matcher still gives a
+    match a ratio of at least the cutoff, once rounded.
+    """
+    length = len(" ".join(act.lower().split()))
+    lowest_ratio = cutoff - 0.5
+    return math.floor((100 - lowest_ratio) * 2 * length / lowest_ratio)
+
+
+class TitleIndex:
+    """
+    Inverted index from the bigrams of the fuzzy matched legislation titles to the titles containing them, by year.
+
+    Each edit the fuzzy matcher allows removes at most GRAM_SIZE of a title's bigrams, so a window of the judgment can
+    only match a title if it shares at least the title's bigrams less that many for each edit. A window is only scored
+    against the titles it shares enough bigrams with, and titles too short to be blocked are scored against every
+    window with their year.
+    """
+
+    def __init__(self, titles: Iterable[str], nlp, cutoff: int = CUTOFF):
+        self.postings: dict[str, dict[str, list[str]]] = defaultdict(lambda: defaultdict(list))
+        self.required: dict[str, int] = {}
+        self.unblocked: dict[str, list[str]] = defaultdict(list)
+        self.widths: dict[str, int] = defaultdict(int)
+        for title in dict.fromkeys(titles):
+            act, year = title[:-4], title[-4:]
+            grams = word_grams(act)
+            required = len(grams) - GRAM_SIZE * max_edits(act, cutoff)
+            if required > 0:
+                self.required[title] = required
+                for gram in grams:
+                    self.postings[year][gram].append(title)
+            else:
+                self.unblocked[year].append(title)
+            # the window searched for a title, as in fuzzy_matcher
+            self.widths[year] = max(self.widths[year], len(nlp.tokenizer(title)) + PAD)
+
+    def block(
+        self,
+        docobj: Doc,
+        candidates_by_year: dict[str, list[tuple[int, int]]],
+    ) -> dict[str, list[tuple[int, int]]]:
+        """
+        The [Act YYYY] candidates each title could match
+        Parameters
+        ----------
+        docobj : spacy.Doc
+            The body of the judgement.
+        candidates_by_year : dict(string, list(tuple))
+            The [Act YYYY] candidates, by the text of their year.
+        Returns
+        -------
+        output : dict(string, list(tuple))
+            The candidates to score each title against, in the order they appear in the text.
+        """
+        blocked: dict[str, list[tuple[int, int]]] = defaultdict(list)
+        for year, candidates in candidates_by_year.items():
+            postings = self.postings.get(year, {})
+            width = self.widths.get(year, 0)
+            for candidate in candidates:
+                end = candidate[1]
+                for title in self.unblocked.get(year, []):
+                    blocked[title].append(candidate)
+                if end - width < 0:
+                    # the window for each title cannot be bounded, so every title is scored against it
+                    titles = {title for posting in postings.values() for title in posting}
+                else:
+                    # the widest window for any of the year's titles holds the window for each of them
+                    shared = Counter(
+                        title
+                        for gram in word_grams(docobj[end - width : end - 1].text)
+                        for title in postings.get(gram, [])
+                    )
+                    titles = {title for title, count in shared.items() if count >= self.required[title]}
+                for title in titles:
+                    blocked[title].append(candidate)
+        return blocked
+
+
+def shard_by_year(searches, shards):
+    """
+    Splits the searches for fuzzy matched titles between shards, keeping the titles of each year together.
+    Parameters
+    ----------
+    searches : list(tuple)
+        List of tuples of the form ('title', [(start_pos, end_pos)]), each title with the candidates to search.
+    shards : int
+        Number of shards to split the searches between.
+    Returns
+    -------
+    shards : list(list(int))
+        The positions in `searches` of the searches in each shard, in order. The years with the most candidates to
+        search are given out first, each to the shard with the least to search so far.
+    """
+    by_year = defaultdict(list)
+    for position, (title, _) in enumerate(searches):
+        by_year[title[-4:]].append(position)
+    work = {year: sum(len(searches[position][1]) for position in positions) for year, positions in by_year.items()}
+    loads = [(0, shard) for shard in range(shards)]
+    split: list[list[int]] = [[] for _ in range(shards)]
+    for year in sorted(by_year, key=lambda year: (-work[year], year)):
+        load, shard = heapq.heappop(loads)
+        split[shard].extend(by_year[year])
+        heapq.heappush(loads, (load + work[year], shard))
+    return [sorted(shard) for shard in split if shard]
+
+
+# the judgement and searches each worker process is started with
+_worker: dict[str, Any] = {}
+
+
+def _start_worker(searches, docobj, nlp, cutoff):
+    _worker.update(searches=searches, docobj=docobj, nlp=nlp, cutoff=cutoff)
+
+
+def _match_shard(shard):
+    docobj, nlp, cutoff = _worker["docobj"], _worker["nlp"], _worker["cutoff"]
+    searches = [_worker["searches"][position] for position in shard]
+    found = [fuzzy_matcher(title, docobj, nlp, cutoff, candidates) for title, candidates in searches]
+    WINDOW_CACHE.flush()
+    return found
+
+
+def match_in_workers(searches, docobj, nlp, cutoff, workers):
+    """
+    Fuzzy matches titles against their candidates in a pool of worker processes, split between them by year.
+    Parameters
+    ----------
+    searches : list(tuple)
+        List of tuples of the form ('title', [(start_pos, end_pos)]), each title with the candidates to search.
+    docobj : spacy.Doc
+        The body of the judgement.
+    nlp : spacy.English
+        English NLP module.
+    cutoff : int
+        Value to determine the level of similarity of matches to be returned by the fuzzy matcher.
+    workers : int
+        Number of worker processes, each started with the judgement and the searches.
+    Returns
+    -------
+    found : list(list(tuple))
+        The matches of each search, in the order of `searches`, as `fuzzy_matcher` gives them.
+        If the worker processes cannot be started, as in AWS Lambda, the titles are matched in this process.
+    """
+    shards = shard_by_year(searches, workers)
+    found: list[Any] = [None] * len(searches)
+    try:
+        with ProcessPoolExecutor(
+            len(shards),
+            initializer=_start_worker,
+            initargs=(searches, docobj, nlp, cutoff),
+        ) as executor:
+            for shard, matches in zip(shards, executor.map(_match_shard, shards), strict=True):
+                for position, match in zip(shard, matches, strict=True):
+                    found[position] = match
+    except (OSError, BrokenProcessPool) as error:
+        LOGGER.warning("Matching legislation in this process, as %s workers could not be used: %s", workers, error)
+        return [fuzzy_matcher(title, docobj, nlp, cutoff, candidates) for title, candidates in searches]
+    return found
+
+
+def lookup_pipe(titles, docobj, nlp, method, conn, cutoff, scan=None, index=None, workers=None):
     """
     Executes the 'method' matcher againt the judgement body to detect legislations.
     Parameters
@@ -255,6 +513,12 @@ def lookup_pipe(titles, docobj, nlp, method, conn, cutoff):
     cutoff : int
         Value to determine the level of similarity of matches to be returned by the fuzzy matcher.
         Eg. a match between two string with a ratio of 90 and cutoff 95 would not be returned by the matcher.
+    scan : LexicalScan, optional
+        The years and [Act YYYY] candidates in the judgement body, if they have already been found.
+    index : TitleIndex, optional
+        Index of the titles, used to score each title against only the candidates it could match.
+    workers : int, optional
+        If more than one, the fuzzy matching is split by year between this many worker processes.
     Returns
     -------
     results : list(dict)
@@ -267,25 +531,38 @@ def lookup_pipe(titles, docobj, nlp, method, conn, cutoff):
             'confidence'(int): 'matching similarity between detected_ref and ref'}
     """
     results: dict[str, list[Any]] = {}
+    fuzzy = method.__name__ == "fuzzy_matcher"
     # get candidate segments matching the pattern [Act YYYY]
-    candidates = detect_candidates(nlp, docobj) if method.__name__ == "fuzzy_matcher" else None
+    if fuzzy and scan is None:
+        scan = scan_judgment(docobj)
+    candidates_by_title = index.block(docobj, scan.candidates_by_year) if fuzzy and index is not None else None
     # for every legislation title in the table
+    searches = []
     for title in nlp.pipe(titles, batch_size=100):
-        # detect legislation in the judgement body
-        matches = method(title.text, docobj, nlp, cutoff, candidates)
+        candidates = None
+        if fuzzy:
+            # only the candidates with the title's year can match it
+            if candidates_by_title is None:
+                candidates = scan.candidates_by_year.get(title.text[-4:])
+            else:
+                candidates = candidates_by_title.get(title.text)
+            if not candidates:
+                continue
+        searches.append((title.text, candidates))
+    # detect legislation in the judgement body
+    if fuzzy and workers and workers > 1:
+        found = match_in_workers(searches, docobj, nlp, cutoff, workers)
+    else:
+        found = [method(title, docobj, nlp, cutoff, candidates) for title, candidates in searches]
+    for (title, _), matches in zip(searches, found, strict=True):
         if matches:
-            # pull relevant information from database and append to detected reference
-            href = get_hrefs(conn, title.text)
-            canonical = get_canonical_leg(conn, title.text)
-            matches_with_refs = []
-            for match in matches:
-                match_list = list(match)
-                match_list.append(href)
-                match_list.append(canonical)
-                match = tuple(match_list)
-                matches_with_refs.append(match)
-            results[title.text] = results.get(title.text, []) + matches_with_refs
-    return results
+            results[title] = results.get(title, []) + matches
+    # pull relevant information for every matched title from database in one query and append to detected reference
+    links = get_legislation_links(conn, results)
+    return {
+        title: [(*match, links[title].href, links[title].canonical) for match in matches]
+        for title, matches in results.items()
+    }
 
 
 def detect_year_span(docobj, nlp):
@@ -299,16 +576,36 @@ def detect_year_span(docobj, nlp):
         English NLP module.
     Returns
     -------
-    dates : list[string]
-        List of year -like strings.
+    dates : set[int]
+        Set of years.
+    """
+    return scan_judgment(docobj).years
+
+
+def prune_titles(titles, scan, judgment_date=None, years_after_act=None):
+    """
+    Drops the legislation titles that cannot be cited in the judgement.
+    Parameters
+    ----------
+    titles : list(LegislationTitle)
+        Legislation titles with a year found in the judgement.
+    scan : LexicalScan
+        The years and [Act YYYY] candidates in the judgement body.
+    judgment_date : datetime.date, optional
+        Date the judgement was given. Titles enacted in a later year are dropped.
+    years_after_act : int, optional
+        If given, only titles with a year found within this many tokens after an Act are kept.
+    Returns
+    -------
+    titles : list(LegislationTitle)
+        The titles that may be cited in the judgement.
     """
-    pattern = [{"SHAPE": "dddd"}]
-    dmatcher = Matcher(nlp.vocab)
-    dmatcher.add("date matcher", [pattern])
-    dm = dmatcher(docobj)
-    string_dates = [docobj[start:end].text for _, start, end in dm]
-    dates = {int(d) for d in string_dates if (len(d) == 4) & (d.isdigit())}
-    return dates
+    if judgment_date is not None:
+        titles = [title for title in titles if title.year <= judgment_date.year]
+    if years_after_act is not None:
+        years = scan.years_after_act(years_after_act)
+        titles = [title for title in titles if title.year in years]
+    return titles
 
 
 ######
@@ -317,36 +614,74 @@ def detect_year_span(docobj, nlp):
 methods = {"exact": exact_matcher, "fuzzy": fuzzy_matcher}
 
 
-def leg_pipeline(leg_titles, nlp, docobj, conn):
+@instrument_stage("legislation")
+def leg_pipeline(leg_titles, nlp, docobj, conn, index=None, judgment_date=None, years_after_act=None, workers=None):
     """
     Merges dictionary results of fuzzy and exact matching functions
     Parameters
     ----------
-    leg_titles: list(string)
-        List of legislation titles.
+    leg_titles: list(LegislationTitle)
+        Legislation titles from the look-up table, with their year and whether they are fuzzy matched.
     nlp : spacy.English
     English NLP module.
     docobj : spacy.Doc
         The body of the judgement.
     conn : database connection
         Database connection to the legislation look-up table.
+    index : TitleIndex, optional
+        Index of the fuzzy matched titles in the look-up table. If it is not given, the titles with a year found in
+        the judgement are indexed.
+    judgment_date : datetime.date, optional
+        Date the judgement was given, so legislation enacted after it is not searched for.
+    years_after_act : int, optional
+        If given, only legislation with a year found within this many tokens after an Act is searched for.
+    workers : int, optional
+        If more than one, the fuzzy matching is split by year between this many worker processes.
     Returns
     -------
-    List[Tuple[Str, Str, Str]], of merged results of both matchers to list of tupled references
+    List[Tuple[Str, Str, Str, Tuple[Int, Int]]], of merged results of both matchers to list of tupled references
         'detected_ref'(string): 'detected reference in the judgement body',
         'ref'(string): 'matched legislation title',
-        'canonical'(string): 'canonical form of legislation act'
+        'canonical'(string): 'canonical form of legislation act',
+        'span'(tuple): 'offset and length of the detected reference in the judgement body'
     """
     result_list = []
-    dates = detect_year_span(docobj, nlp)
+    # find the years and [Act YYYY] candidates in the judgment in one pass
+    scan = scan_judgment(docobj)
+    dates = scan.years
     # filter the legislation list down to the years detected above
-    titles = leg_titles[leg_titles.year.isin(dates)]
-
+    titles = [title for title in leg_titles if title.year in dates]
+    found = len(titles)
+    titles = prune_titles(titles, scan, judgment_date, years_after_act)
+    if index is None:
+        index = TitleIndex((title.candidate_titles for title in titles if title.for_fuzzy), nlp)
+
+    cached = WINDOW_CACHE.stats
+    start = time.perf_counter()
     for fuzzy, method in zip([True, False], ("fuzzy", "exact"), strict=False):
         # select the titles relevant to the approach to be run using the 'for_fuzzy' flag already built into the look-up table
-        relevant_titles = titles[titles.for_fuzzy == fuzzy].candidate_titles.drop_duplicates().tolist()
-        res = lookup_pipe(relevant_titles, docobj, nlp, methods[method], conn, CUTOFF)
+        relevant_titles = list(dict.fromkeys(title.candidate_titles for title in titles if title.for_fuzzy == fuzzy))
+        res = lookup_pipe(relevant_titles, docobj, nlp, methods[method], conn, CUTOFF, scan, index, workers)
         result_list.append(res)
+    duration = time.perf_counter() - start
+    # titles take about as long to search for as each other, so the time saved is estimated from those searched for
+    saved = duration / len(titles) * (found - len(titles)) if titles else 0.0
+    LOGGER.info(
+        "Searched for %s of %s legislation titles in %.3fs, saving about %.3fs",
+        len(titles),
+        found,
+        duration,
+        saved,
+    )
+    WINDOW_CACHE.flush()
+    windows = WINDOW_CACHE.stats - cached
+    LOGGER.info(
+        "Fuzzy matched windows: %s cached, %s from disk, %s searched (%.0f%% hit rate)",
+        windows.hits,
+        windows.disk_hits,
+        windows.misses,
+        100 * windows.hit_rate,
+    )
 
     # merges the results of both matchers to return a single list of detected references
     results = mergedict(result_list[0], result_list[1])
@@ -362,7 +697,8 @@ def leg_pipeline(leg_titles, nlp, docobj, conn):
         detected_ref = ref["detected_ref"]
         href = ref["ref"]
         canonical_form = ref["canonical"]
-        replacement = leg(detected_ref, href, canonical_form)
+        start_char = docobj[int(ref["start"]) : int(ref["end"])].start_char
+        replacement = leg(detected_ref, href, canonical_form, (start_char, len(detected_ref)))
         replacements.append(replacement)
     print(f"Found {len(replacements)} legislation replacements")
 
@@ -0,0 +1,173 @@
+"""
+Find legislation in a judgment without tokenising the whole of it.
+
+The legislation matchers only look at the four digit years in a judgment, the words before each [Act YYYY] and the
+places the titles matched exactly appear. These are found in the raw text with regular expressions, and only the
+words around each are tokenised, joined by blank lines. spaCy splits the text on whitespace before anything else, so a
+window starting and ending on whole words is tokenised just as it is in the whole judgment. The offsets of the
+references found in the windows are then mapped back to the judgment.
+"""
+
+import bisect
+import re
+from collections.abc import Iterable
+from typing import NamedTuple
+
+from legislation_extraction.legislation_matcher_hybrid import PAD, TitleIndex, leg_pipeline
+
+SEPARATOR = "\n\n"
+
+# every token that is a year or an [Act YYYY] starts with these, though not everything they find is one
+YEAR = re.compile(r"\d{4}")
+ACT_YEAR = re.compile(r"Act ?\d{4}")
+WORD = re.compile(r"\S+")
+WORD_END = re.compile(r"\S*")
+
+
+class TextWindows(NamedTuple):
+    text: str
+    """The windows of the judgment, separated by blank lines"""
+    starts: list[int]
+    """Offset of each window in `text`"""
+    offsets: list[int]
+    """Offset of each window in the judgment"""
+
+    def judgment_offset(self, offset: int) -> int:
+        """
+        The offset in the judgment of an offset in the windows
+        """
+        window = bisect.bisect_right(self.starts, offset) - 1
+        return self.offsets[window] + offset - self.starts[window]
+
+
+def word_start(text: str, position: int, words_before: int = 0) -> int:
+    """
+    The start of the word at a position in the text, or of the word that many words before it.
+    If there are not that many words before it, the start of the text, so any leading whitespace is kept.
+    """
+    reach = 64 * (words_before + 1)
+    while True:
+        start = max(position - reach, 0)
+        starts = [match.start() for match in WORD.finditer(text, start, position + 1)]
+        # the first word found may have been cut short by the start of the search
+        if start > 0 and not text[start - 1].isspace():
+            starts = starts[1:]
+        if len(starts) > words_before:
+            return starts[-1 - words_before]
+        if start == 0:
+            return 0
+        reach *= 2
+
+
+def word_end(text: str, position: int) -> int:
+    """
+    The end of the word at a position in the text
+    """
+    match = WORD_END.match(text, min(position, len(text)))
+    # \S* matches the empty string, so there is always a match
+    assert match is not None  # noqa: S101
+    return match.end()
+
+
+def join_windows(text: str, windows: Iterable[tuple[int, int]]) -> TextWindows:
+    """
+    Join the windows of a text, merging those that overlap
+    """
+    merged: list[list[int]] = []
+    for start, end in sorted(windows):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    parts, starts, offsets = [], [], []
+    length = 0
+    for start, end in merged:
+        starts.append(length)
+        offsets.append(start)
+        parts.append(text[start:end])
+        length += end - start + len(SEPARATOR)
+    return TextWindows(SEPARATOR.join(parts), starts, offsets)
+
+
+def legislation_windows(text: str, leg_titles, nlp, years_after_act=None) -> tuple[TextWindows, TitleIndex]:
+    """
+    Find the windows of a judgment that hold every year, [Act YYYY] candidate and exactly matched title in it
+    Parameters
+    ----------
+    text : string
+        The body of the judgement.
+    leg_titles: list(LegislationTitle)
+        Legislation titles from the look-up table, with their year and whether they are fuzzy matched.
+    nlp : spacy.English
+        English NLP module.
+    years_after_act : int, optional
+        If given, each year is windowed with the words before it, so it can be seen whether it is this many tokens
+        after an Act.
+    Returns
+    -------
+    output : tuple(TextWindows, TitleIndex)
+        The windows, and an index of the fuzzy matched titles with a year that may be in the judgement. The windows
+        hold enough words before each [Act YYYY] for the widest window searched for any of those titles.
+    """
+    years = {int(match.group()) for match in YEAR.finditer(text)}
+    titles = [title for title in leg_titles if title.year in years]
+    index = TitleIndex((title.candidate_titles for title in titles if title.for_fuzzy), nlp)
+    # each word is at least one token, so this many words hold the widest window
+    words_before = max(index.widths.values(), default=PAD)
+
+    windows = [
+        (word_start(text, match.start(), years_after_act or 0), word_end(text, match.end()))
+        for match in YEAR.finditer(text)
+    ]
+    windows.extend(
+        (word_start(text, match.start(), words_before), word_end(text, match.end()))
+        for match in ACT_YEAR.finditer(text)
+    )
+
+    exact_titles = [nlp.tokenizer(title.candidate_titles) for title in titles if not title.for_fuzzy]
+    exact_titles = [title for title in exact_titles if len(title)]
+    if exact_titles:
+        # the tokens of a title are at most a space apart in the text
+        longest = max(sum(len(token) + 1 for token in title) for title in exact_titles)
+        first_tokens = sorted({title[0].text for title in exact_titles}, key=len, reverse=True)
+        trigger = re.compile("|".join(map(re.escape, first_tokens)))
+        # a title starting inside a match ends within the longest title of the end of the match
+        windows.extend(
+            (word_start(text, match.start()), word_end(text, match.end() + longest)) for match in trigger.finditer(text)
+        )
+
+    return join_windows(text, windows), index
+
+
+def leg_pipeline_from_text(leg_titles, nlp, text, conn, judgment_date=None, years_after_act=None, workers=None):
+    """
+    Detects legislation in the windows of a judgment that may hold it, tokenising only those windows
+    Parameters
+    ----------
+    leg_titles: list(LegislationTitle)
+        Legislation titles from the look-up table, with their year and whether they are fuzzy matched.
+    nlp : spacy.English
+        English NLP module.
+    text : string
+        The body of the judgement.
+    conn : database connection
+        Database connection to the legislation look-up table.
+    judgment_date : datetime.date, optional
+        Date the judgement was given, so legislation enacted after it is not searched for.
+    years_after_act : int, optional
+        If given, only legislation with a year found within this many tokens after an Act is searched for.
+    workers : int, optional
+        If more than one, the fuzzy matching is split by year between this many worker processes.
+    Returns
+    -------
+    List[Tuple[Str, Str, Str, Tuple[Int, Int]]], the references found by leg_pipeline, with their span in the
+    judgement body
+    """
+    windows, index = legislation_windows(text, leg_titles, nlp, years_after_act)
+    docobj = nlp.make_doc(windows.text)
+    replacements = leg_pipeline(leg_titles, nlp, docobj, conn, index, judgment_date, years_after_act, workers)
+    return [
+        replacement._replace(span=(windows.judgment_offset(replacement.span[0]), replacement.span[1]))
+        for replacement in replacements
+    ]
@@ -0,0 +1,121 @@
+"""
+Cache of the fuzzy matches found in the windows before each [Act YYYY] in a judgment.
+
+The same references, such as "the Human Rights Act 1998", appear many times in a judgment and in thousands of
+judgments, and fuzzy matching a title against the window before each of them is the slowest part of finding
+legislation. The matches found in a window only depend on the title, the text of the window and the cutoff, so they
+are kept in a bounded least recently used cache held by the process, which stays warm between invocations of a lambda.
+
+For batch runs the cache can also be kept in an SQLite file, set with LEGISLATION_WINDOW_CACHE_PATH, so it is shared
+between processes and runs. LEGISLATION_WINDOW_CACHE_SIZE sets how many windows are held in memory.
+"""
+
+import json
+import os
+import sqlite3
+from collections import OrderedDict
+from typing import NamedTuple
+
+DEFAULT_CACHE_SIZE = 50000
+
+WindowKey = tuple[str, str, str, int]
+"""The language of the tokenizer, the title, the text of the window and the cutoff"""
+WindowMatches = list[tuple[int, int, int]]
+"""The start, end and ratio of each match in the window's tokens"""
+
+
+class CacheStats(NamedTuple):
+    hits: int
+    disk_hits: int
+    misses: int
+
+    def __sub__(self, other: "CacheStats") -> "CacheStats":
+        return CacheStats(self.hits - other.hits, self.disk_hits - other.disk_hits, self.misses - other.misses)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.disk_hits + self.misses
+        return (self.hits + self.disk_hits) / lookups if lookups else 0.0
+
+
+class WindowCache:
+    """
+    Least recently used cache of the fuzzy matches in each window, optionally backed by an SQLite file
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE, path: str | None = None):
+        self.maxsize = maxsize
+        self.path = path
+        self._windows: OrderedDict[WindowKey, WindowMatches] = OrderedDict()
+        self._disk: sqlite3.Connection | None = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @property
+    def stats(self) -> CacheStats:
+        return CacheStats(self.hits, self.disk_hits, self.misses)
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+    def _connect(self) -> sqlite3.Connection | None:
+        if self.path and self._disk is None:
+            self._disk = sqlite3.connect(self.path, timeout=30)
+            self._disk.execute("CREATE TABLE IF NOT EXISTS windows (window TEXT PRIMARY KEY, matches TEXT NOT NULL)")
+        return self._disk
+
+    def get(self, key: WindowKey) -> WindowMatches | None:
+        """
+        The matches found in a window before, if they are still cached
+        """
+        if key in self._windows:
+            self._windows.move_to_end(key)
+            self.hits += 1
+            return self._windows[key]
+        disk = self._connect()
+        if disk is not None:
+            row = disk.execute("SELECT matches FROM windows WHERE window = ?", (json.dumps(key),)).fetchone()
+            if row is not None:
+                self.disk_hits += 1
+                matches = [tuple(match) for match in json.loads(row[0])]
+                self._remember(key, matches)
+                return matches
+        self.misses += 1
+        return None
+
+    def put(self, key: WindowKey, matches: WindowMatches) -> None:
+        self._remember(key, matches)
+        disk = self._connect()
+        if disk is not None:
+            disk.execute("INSERT OR REPLACE INTO windows VALUES (?, ?)", (json.dumps(key), json.dumps(matches)))
+
+    def _remember(self, key: WindowKey, matches: WindowMatches) -> None:
+        self._windows[key] = matches
+        self._windows.move_to_end(key)
+        while len(self._windows) > self.maxsize:
+            self._windows.popitem(last=False)
+
+    def flush(self) -> None:
+        """
+        Write the windows cached since the last flush to disk, if the cache is kept there
+        """
+        if self._disk is not None:
+            self._disk.commit()
+
+    def _after_fork(self) -> None:
+        # an SQLite connection cannot be shared with a forked process, so each opens its own
+        self._disk = None
+
+    def clear(self) -> None:
+        self._windows.clear()
+        self.hits = self.disk_hits = self.misses = 0
+
+
+WINDOW_CACHE = WindowCache(
+    int(os.getenv("LEGISLATION_WINDOW_CACHE_SIZE") or DEFAULT_CACHE_SIZE),
+    os.getenv("LEGISLATION_WINDOW_CACHE_PATH") or None,
+)
+"""The cache used by `fuzzy_matcher`, shared by every judgment the process handles"""
+
+os.register_at_fork(after_in_child=WINDOW_CACHE._after_fork)
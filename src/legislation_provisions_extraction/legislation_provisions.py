@@ -17,10 +17,10 @@ import os
 import re
 from typing import Any
 
-import numpy as np
 from bs4 import BeautifulSoup, Tag
 
 from utils.custom_types import DocumentAsXMLString
+from utils.metrics import instrument_stage
 from utils.proper_xml import create_tag_string
 
 SectionDict = dict[str, list[Any]]  # this is a guess
@@ -52,6 +52,8 @@ def find_closest_legislation(legislations, sections, thr=30):
     :param sections: list of section references found in the paragraph, and their location
     :returns sections_to_leg: (section, legislation, sect_starting_position)
     """
+    import numpy as np
+
     # gets positions of refs
     sec_pos = np.asarray([x[0] for x in sections])
     leg_pos = np.asarray([x[0] for x in legislations])
@@ -181,6 +183,8 @@ def get_correct_section_def(section_matches, cur_para_number, cur_pos):
     :param section_matches: list of dictionaries that include where that section has been redefined
     :param para_number: the number of the paragraph in the judgment
     """
+    import numpy as np
+
     pos_refs = np.asarray([(match["para_number"], match["section_position"]) for match in section_matches])
     para_numbers = pos_refs[:, 0]
 
@@ -279,6 +283,7 @@ def main(enriched_judgment_file_path, filename):
     return resolved_refs
 
 
+@instrument_stage("legislation_provisions")
 def provisions_pipeline(file_data: DocumentAsXMLString) -> list:
     """
     Matches all sections in the judgment to the correct legislation and provides necessary information for the replacements.
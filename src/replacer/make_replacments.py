@@ -1,11 +1,11 @@
-import json
 import logging
 import re
-from typing import Literal
+from typing import IO, Literal
 
 import lxml.etree
 from bs4 import BeautifulSoup
 
+from replacer.offset_replacer import replace_at_offsets
 from replacer.replacer_pipeline import replacer_pipeline
 from utils.custom_types import (
     DocumentAsXMLString,
@@ -13,6 +13,7 @@ from utils.custom_types import (
     Replacement,
     XMLFragmentAsString,
 )
+from utils.replacements import ReplacementLine, read_replacements_file
 
 LOGGER = logging.getLogger()
 LOGGER.setLevel(logging.DEBUG)
@@ -48,27 +49,37 @@ xmlns:uk="https://caselaw.nationalarchives.gov.uk/akn">
 
 def make_post_header_replacements(
     original_content: DocumentAsXMLString,
-    replacement_patterns: str,
+    replacement_patterns: bytes | str | IO[bytes],
 ) -> DocumentAsXMLString:
     """
     Replaces the content following a closing header tag in a legal document with new content.
     If there is no closing header tag, then we replace the full content.
 
+    Detections with spans are marked up where they were found; the rest are found by searching for their strings.
+
     Note:
     - This function assumes a specific structure of the legal document with closing header tags.
 
     Args:
         original_content (str): The original content of the legal document
-        replacement_patterns (str): The line separated replacement patterns
+        replacement_patterns (bytes | str | IO[bytes]): The replacements container or JSON lines file, or a stream of it
 
     Returns:
         str: The modified legal document content with the replacement applied.
     """
     cleaned_file_content = sanitize_judgment(original_content)
+    replacement_lines = read_replacements_file(replacement_patterns)
+
+    if any(line.span for line in replacement_lines):
+        root = lxml.etree.fromstring(cleaned_file_content.encode("utf-8"))
+        replacement_lines = replace_at_offsets(root, replacement_lines)
+        cleaned_file_content = DocumentAsXMLString(
+            lxml.etree.tostring(root, xml_declaration=True, encoding="utf-8").decode("utf-8"),
+        )
 
     pre_header, end_header_tag, post_header = split_text_by_closing_header_tag(cleaned_file_content)
 
-    replaced_post_header_content = apply_replacements(post_header, replacement_patterns)
+    replaced_post_header_content = apply_replacement_lines(post_header, replacement_lines)
     LOGGER.info("Got post-header replacement text content")
 
     full_replaced_text_content = pre_header + end_header_tag + replaced_post_header_content
@@ -79,21 +90,30 @@ def make_post_header_replacements(
     return DocumentAsXMLString(full_replaced_text_content)
 
 
-def apply_replacements(content: XMLFragmentAsString, replacement_patterns: str) -> XMLFragmentAsString:
+def apply_replacements(
+    content: XMLFragmentAsString,
+    replacement_patterns: bytes | str | IO[bytes],
+) -> XMLFragmentAsString:
     """
     Run the replacer pipeline to make replacements on caselaw, legislation and abbreviations
     """
+    return apply_replacement_lines(content, read_replacements_file(replacement_patterns))
+
+
+def apply_replacement_lines(
+    content: XMLFragmentAsString,
+    replacement_lines: list[ReplacementLine],
+) -> XMLFragmentAsString:
+    """
+    Run the replacer pipeline on lines read from a replacements file
+    """
 
     case_replacement_patterns: list[Replacement] = []
     leg_replacement_patterns: list[Replacement] = []
     abb_replacement_patterns: list[Replacement] = []
 
-    for replacement_pattern_json in replacement_patterns.splitlines():
-        LOGGER.debug(replacement_pattern_json)
-        replacement_pattern_dict = json.loads(replacement_pattern_json)
-
-        replacement_type, replacement_pattern_list = list(replacement_pattern_dict.items())[0]
-        replacement_pattern = Replacement(tuple(replacement_pattern_list))
+    for replacement_type, replacement_pattern, _span in replacement_lines:
+        LOGGER.debug("%s: %s", replacement_type, replacement_pattern)
 
         if replacement_type == "case":
             case_replacement_patterns.append(replacement_pattern)
@@ -0,0 +1,153 @@
+"""
+Replacer logic that marks up detections where they were found, rather than searching the XML for them.
+
+Detections carry the offset and length at which they were found in the text extracted from the judgment. The
+replacer extracts the text of the judgment it is enriching in the same way, with a map from positions in it back to
+XML text nodes, and splits those text nodes around each detection in one pass over the document.
+"""
+
+import logging
+from collections import defaultdict
+from typing import NamedTuple
+
+import lxml.etree
+
+from replacer.replacer_pipeline import REPLACEMENT_TAGS
+from utils.custom_types import Replacement
+from utils.helper import element_at, map_tree_text
+from utils.metrics import measure_stage
+from utils.proper_xml import create_tag, namespaces
+from utils.replacements import ReplacementLine
+
+LOGGER = logging.getLogger()
+
+ALIGNMENT_WINDOW = 200
+"""How far past its expected position to look for a detection whose span no longer lines up with the text"""
+
+
+class AnchoredReplacement(NamedTuple):
+    line: ReplacementLine
+    start: int
+    """Position of the detection in the text extracted by the replacer"""
+
+
+class _Edit(NamedTuple):
+    offset: int
+    length: int
+    line: ReplacementLine
+
+
+def align_spans(text: str, lines: list[ReplacementLine]) -> tuple[list[AnchoredReplacement], list[ReplacementLine]]:
+    """
+    Find each detection with a span in the replacer's text.
+    Sanitising the judgment can remove whitespace between elements after its text was first extracted, so a span
+    which does not line up is moved to the nearest occurrence of the detected string, allowing for the drift so far.
+    :returns: the anchored detections in text order, and the ones that could not be found
+    """
+    anchored = []
+    unanchored = []
+    drift = 0
+    cursor = 0
+    for line in sorted((line for line in lines if line.span), key=lambda line: line.span or (0, 0)):
+        string = line.replacement[0]
+        offset, length = line.span or (0, 0)
+        if length != len(string):
+            unanchored.append(line)
+            continue
+
+        expected = offset + drift
+        if expected >= cursor and text.startswith(string, expected):
+            found = expected
+        else:
+            found = text.rfind(string, cursor, max(cursor, expected + length))
+            if found == -1:
+                found = text.find(string, max(cursor, expected), expected + length + ALIGNMENT_WINDOW)
+        if found == -1:
+            unanchored.append(line)
+            continue
+
+        anchored.append(AnchoredReplacement(line, found))
+        drift = found - offset
+        cursor = found + length
+    return anchored, unanchored
+
+
+def _create_element(line: ReplacementLine, text: str) -> lxml.etree._Element:
+    tag, attributes = REPLACEMENT_TAGS[line.replacement_type]
+    element = create_tag(f"{{{namespaces[None]}}}{tag}", attrs=attributes(line.replacement))
+    element.text = text
+    return element
+
+
+def _split_text_node(element: lxml.etree._Element, part: str, edits: list[_Edit]) -> None:
+    """
+    Split the text or tail of an element around the edits, which are in order and do not overlap
+    """
+    node_text = (element.text if part == "text" else element.tail) or ""
+    new_elements = []
+    for index, edit in enumerate(edits):
+        new_element = _create_element(edit.line, node_text[edit.offset : edit.offset + edit.length])
+        following = edits[index + 1].offset if index + 1 < len(edits) else len(node_text)
+        new_element.tail = node_text[edit.offset + edit.length : following]
+        new_elements.append(new_element)
+
+    if part == "text":
+        element.text = node_text[: edits[0].offset]
+        for index, new_element in enumerate(new_elements):
+            element.insert(index, new_element)
+    else:
+        element.tail = node_text[: edits[0].offset]
+        parent = element.getparent()
+        position = parent.index(element) + 1
+        for index, new_element in enumerate(new_elements):
+            parent.insert(position + index, new_element)
+
+
+def replace_at_offsets(root: lxml.etree._Element, lines: list[ReplacementLine]) -> list[ReplacementLine]:
+    """
+    Mark up the detections that have spans in place, leaving the header alone
+    :param root: parsed judgment, which is edited in place
+    :param lines: every line of the replacements file
+    :return: lines still to be replaced by searching for their strings. These are the ones without spans, and those
+        that could not be placed unless another occurrence of the same replacement was
+    """
+    with measure_stage("offset_replacer") as metrics:
+        remaining, metrics.replacements = _replace_at_offsets(root, lines)
+    return remaining
+
+
+def _replace_at_offsets(root: lxml.etree._Element, lines: list[ReplacementLine]) -> tuple[list[ReplacementLine], int]:
+    text, offset_map = map_tree_text(root)
+    anchored, unplaced = align_spans(text, lines)
+
+    edits: defaultdict[tuple[str, str], list[_Edit]] = defaultdict(list)
+    for anchor in anchored:
+        located = offset_map.locate(anchor.start)
+        length = len(anchor.line.replacement[0])
+        if located is None or "/header[" in located[0].path or anchor.start + length > located[0].end:
+            unplaced.append(anchor.line)
+            continue
+        segment, node_offset = located
+        node_edits = edits[(segment.path, segment.part)]
+        if node_edits and node_offset < node_edits[-1].offset + node_edits[-1].length:
+            unplaced.append(anchor.line)
+            continue
+        node_edits.append(_Edit(node_offset, length, anchor.line))
+
+    # find every element before editing any, as new elements change the paths of their siblings
+    elements = {path: element_at(root, path) for path, _ in edits}
+
+    placed: set[Replacement] = set()
+    placed_count = 0
+    for (path, part), node_edits in edits.items():
+        element = elements[path]
+        if element is None:
+            unplaced.extend(edit.line for edit in node_edits)
+            continue
+        _split_text_node(element, part, node_edits)
+        placed.update(edit.line.replacement for edit in node_edits)
+        placed_count += len(node_edits)
+
+    LOGGER.info("Replaced %s detections at their offsets, %s could not be placed", placed_count, len(unplaced))
+    still_to_replace = {line for line in unplaced if line.replacement not in placed}
+    return [line for line in lines if not line.span or line in still_to_replace], placed_count
@@ -7,6 +7,7 @@ import html
 import re
 
 from utils.custom_types import Replacement, XMLFragmentAsString
+from utils.metrics import instrument_stage
 from utils.proper_xml import create_tag_string, replace_string_with_tag
 
 JUNK_REGEX = r"</judgment>\s*</akomaNtoso>\s*$"
@@ -46,14 +47,10 @@ def fixed_year(year: str) -> str | None:
         return None
 
 
-def replacer_caselaw(file_data: XMLFragmentAsString, replacement: Replacement) -> XMLFragmentAsString:
+def caselaw_attributes(replacement: Replacement) -> dict[str, str]:
     """
-    String replacement in the XML
-    :param file_data: XML file
-    :param replacement: tuple of citation match and corrected citation
-    :return: enriched XML file data
+    Attributes of the ref tag for a case law citation
     """
-
     year = fixed_year(replacement[2])
     attribs = {
         "uk:type": "case",
@@ -64,8 +61,44 @@ def replacer_caselaw(file_data: XMLFragmentAsString, replacement: Replacement) -
     if year:
         attribs["uk:year"] = year
     attribs["uk:origin"] = "TNA"
+    return attribs
+
+
+def legislation_attributes(replacement: Replacement) -> dict[str, str]:
+    """
+    Attributes of the ref tag for a legislation reference
+    """
+    return {
+        "uk:type": "legislation",
+        "href": replacement[1],
+        "uk:canonical": replacement[2],
+        "uk:origin": "TNA",
+    }
+
+
+def abbreviation_attributes(replacement: Replacement) -> dict[str, str]:
+    """
+    Attributes of the abbr tag for an abbreviation
+    """
+    return {"title": replacement[1], "uk:origin": "TNA"}
+
+
+REPLACEMENT_TAGS = {
+    "case": ("ref", caselaw_attributes),
+    "leg": ("ref", legislation_attributes),
+    "abb": ("abbr", abbreviation_attributes),
+}
+
+
+def replacer_caselaw(file_data: XMLFragmentAsString, replacement: Replacement) -> XMLFragmentAsString:
+    """
+    String replacement in the XML
+    :param file_data: XML file
+    :param replacement: tuple of citation match and corrected citation
+    :return: enriched XML file data
+    """
 
-    replacement_tag = create_tag_string("ref", html.escape(replacement[0]), attribs)
+    replacement_tag = create_tag_string("ref", html.escape(replacement[0]), caselaw_attributes(replacement))
     output = _replace_string_with_tag_handling_junk(file_data, replacement[0], replacement_tag)
 
     assert_not_bad(file_data)
@@ -79,13 +112,7 @@ def replacer_leg(file_data: XMLFragmentAsString, replacement: Replacement) -> XM
     :param replacement: tuple of citation match and corrected citation
     :return: enriched XML file data
     """
-    attribs = {
-        "uk:type": "legislation",
-        "href": replacement[1],
-        "uk:canonical": replacement[2],
-        "uk:origin": "TNA",
-    }
-    replacement_tag = create_tag_string("ref", html.escape(replacement[0]), attribs)
+    replacement_tag = create_tag_string("ref", html.escape(replacement[0]), legislation_attributes(replacement))
     output = _replace_string_with_tag_handling_junk(file_data, replacement[0], replacement_tag)
     assert_not_bad(file_data)
     return output
@@ -105,6 +132,7 @@ def replacer_abbr(file_data: XMLFragmentAsString, replacement: Replacement) -> X
     return output
 
 
+@instrument_stage("replacer")
 def replacer_pipeline(
     file_data: XMLFragmentAsString,
     REPLACEMENTS_CASELAW: list[Replacement],
@@ -7,15 +7,27 @@ also test for. If this is updated, this will need to be reflected in the tests.
 """
 
 import unittest
+from pathlib import Path
+from unittest.mock import patch
 
 import spacy
 from spacy.language import Language
+from spacy.matcher import Matcher
+from spacy.tokens import Doc
 
 from abbreviation_extraction.abbreviations import (
     AbbreviationDetector,
+    bracket_groups,
+    contains,
     filter_matches,
     find_abbreviation,
+    long_form_start,
+    verify_match_format,
 )
+from utils.helper import parse_file
+
+FIXTURE_DIR = Path(__file__).parent.parent / "fixtures"
+QUOTES = ['"', "'", "‘", "’", "“", "”"]
 
 
 @Language.factory("abbreviation_detector")
@@ -83,6 +95,26 @@ class TestFindAbbreviation(unittest.TestCase):
         assert long_form.text == "Value Added Tax Act"
 
 
+class TestFindAbbreviationCache(unittest.TestCase):
+    def test_repeated_definition_is_searched_once(self):
+        """
+        Given the same definition in two documents
+        When find_abbreviation is called on each
+        Then the search should be made once, with the spans returned from each document
+        """
+        nlp = spacy.blank("en")
+        long_form_start.cache_clear()
+        found = []
+        for text in ['The Employment Rights Act ("ERA") applies.', 'Under the Employment Rights Act ("ERA"), the']:
+            doc = nlp(text)
+            start = [token.text for token in doc].index("(")
+            found.append(find_abbreviation(doc[start - 3 : start], doc[start + 2 : start + 3]))
+
+        assert all(long.doc is short.doc for short, long in found)
+        assert [long.text for _, long in found] == ["Employment Rights Act", "Employment Rights Act"]
+        assert long_form_start.cache_info().hits == 1
+
+
 class TestFilterMatches(unittest.TestCase):
     def setUp(self):
         self.nlp = spacy.load(
@@ -258,5 +290,147 @@ class TestFilterMatches(unittest.TestCase):
         assert len(filtered) == 0
 
 
+class TestBracketGroups(unittest.TestCase):
+    def setUp(self):
+        self.nlp = spacy.blank("en")
+        self.nlp.max_length = 2500000
+
+    def test_innermost_groups_within_limit(self):
+        """
+        Given text with nested, unbalanced and long bracketed groups
+        When the brackets are paired
+        Then only the innermost balanced groups of up to 8 tokens should be found
+        """
+        doc = self.nlp('the Act ("the 1971 (amended) Act") ) and ("UT") (a b c d e f g h) ("CA 2006"')
+
+        groups = [doc[start:end].text for start, end in bracket_groups(doc)]
+
+        assert groups == ["(amended)", '("UT")']
+
+    def test_same_definitions_as_parenthesis_matcher(self):
+        """
+        Given a judgment
+        When its brackets are paired
+        Then the groups in the form of a definition should be the ones the parenthesis Matcher found
+        """
+        doc = self.nlp(parse_file((FIXTURE_DIR / "rwanda.xml").read_text()))
+        matcher = Matcher(self.nlp.vocab)
+        matcher.add("parenthesis", [[{"ORTH": "("}, {"OP": "+"}, {"ORTH": ")"}]])
+
+        def is_definition(start: int, end: int) -> bool:
+            return (
+                end - start <= 9
+                and contains(doc[start + 1].text, QUOTES)
+                and contains(doc[end - 2].text, QUOTES)
+                and contains(doc[start].text, "()")
+                and contains(doc[end - 1].text, "()")
+            )
+
+        matched = {(start, end) for _, start, end in matcher(doc) if is_definition(start, end)}
+        paired = {(start, end) for start, end in bracket_groups(doc) if is_definition(start, end)}
+
+        assert len(paired) == 32
+        assert paired == matched
+
+
+class TestFindMatchesFor(unittest.TestCase):
+    def setUp(self):
+        self.nlp = spacy.blank("en")
+        self.detector = AbbreviationDetector(self.nlp)
+
+    def test_every_occurrence_is_found(self):
+        """
+        Given a document defining abbreviations and using them later
+        When the occurrences of the abbreviations are found
+        Then each long form should have its definition and every later use
+        """
+        doc = self.nlp(
+            'The Data Protection Act ("DPA") and Human Rights Act ("HRA") apply. The DPA and the HRA did. DPA DPA',
+        )
+        filtered = filter_matches([(0, 5, 8), (0, 14, 17)], doc)
+
+        occurrences = {
+            long.text: sorted(short.start for short in shorts)
+            for long, shorts in self.detector.find_matches_for(filtered, doc)
+        }
+
+        assert occurrences == {"Data Protection Act": [6, 21, 27, 28], "Human Rights Act": [15, 24]}
+
+    def test_documents_do_not_share_abbreviations(self):
+        """
+        Given two documents defining the same abbreviation with different long forms
+        When the occurrences are found in each with one detector
+        Then each document should only have its own long form
+        """
+        first = self.nlp('The Human Rights Act ("HRA") applies. The HRA says so.')
+        second = self.nlp('The Housing Reform Act ("HRA") applies. The HRA does.')
+
+        for doc, expected in [(first, "Human Rights Act"), (second, "Housing Reform Act")]:
+            occurrences = self.detector.find_matches_for(filter_matches([(0, 5, 8)], doc), doc)
+            assert [(long.text, len(shorts)) for long, shorts in occurrences] == [(expected, 2)]
+
+
+class TestVerifyMatchFormat(unittest.TestCase):
+    def setUp(self):
+        self.nlp = spacy.blank("en")
+        self.nlp.max_length = 2500000
+
+    def parentheticals(self, count: int) -> tuple[list[tuple[int, int, int]], Doc]:
+        doc = self.nlp(" ".join(f'the Act ("ACT{index}") and (not a definition)' for index in range(count)))
+        return [(0, start, end) for start, end in bracket_groups(doc)], doc
+
+    def test_matches_in_form_are_returned(self):
+        """
+        Given bracketed groups with and without quotes
+        When their format is verified
+        Then the groups wrapped in quotes should be returned in order, leaving the groups given unchanged
+        """
+        doc = self.nlp('the Act ("CA") (see above) ("the 2006 Act") (‘UT’)')
+        matches = [(0, start, end) for start, end in bracket_groups(doc)]
+
+        verified = verify_match_format(matches, doc)
+
+        assert [doc[start:end].text for _, start, end in verified] == ['("CA")', '("the 2006 Act")', "(‘UT’)"]
+        assert len(matches) == 4
+
+    def test_thousands_of_parentheticals(self):
+        """
+        Given a long document with thousands of parentheticals, half of them definitions
+        When their format is verified
+        Then every definition should be kept, checking each parenthetical a fixed number of times
+        and without removing anything from the matches given
+        """
+        matches, doc = self.parentheticals(16000)
+
+        with patch("abbreviation_extraction.abbreviations.contains", wraps=contains) as checks:
+            verified = verify_match_format(tuple(matches), doc)
+
+        assert len(verified) == 16000
+        assert checks.call_count <= 4 * len(matches)
+
+
+class TestAbbreviationDetector(unittest.TestCase):
+    def setUp(self):
+        self.nlp = spacy.blank("en")
+        self.detector = AbbreviationDetector(self.nlp)
+
+    def test_abbreviations_are_set_on_each_doc(self):
+        """
+        Given documents defining abbreviations in brackets and quotes
+        When the detector is run on each of them
+        Then each should have only its own abbreviations, with their long forms
+        """
+        first = self.detector(self.nlp('The Human Rights Act ("HRA") applies. The HRA says so.'))
+        second = self.detector(self.nlp('The Data Protection Act ("DPA") applies.'))
+
+        assert [(short.text, short._.long_form.text) for short in first._.abbreviations] == [
+            ("HRA", "Human Rights Act"),
+            ("HRA", "Human Rights Act"),
+        ]
+        assert [(short.text, short._.long_form.text) for short in second._.abbreviations] == [
+            ("DPA", "Data Protection Act"),
+        ]
+
+
 if __name__ == "__main__":
     unittest.main()
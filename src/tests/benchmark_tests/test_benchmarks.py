@@ -0,0 +1,309 @@
+"""
+Tests for the benchmark suite's building blocks: the SQLite stand-in for the database,
+the synthetic judgment generator, the comparison of results, the audit of lambda cold starts, the
+measurements of the abbreviation detector, and the scaling of legislation matching between worker processes.
+"""
+
+import unittest
+
+import lxml.etree
+
+from abbreviation_extraction.abbreviations import bracket_groups, find_abbreviation
+from benchmarks.abbreviations import character_scan_abbreviation, measure_find_abbreviation, measure_occurrences
+from benchmarks.brackets import measure_brackets
+from benchmarks.cold_start import ColdStart, check_budget, measure_cold_start, package_times, parse_importtime
+from benchmarks.corrections import manifest_citations, time_corrections
+from benchmarks.fake_db import create_benchmark_database, to_sqlite
+from benchmarks.legislation_workers import time_workers
+from benchmarks.orchestration import PipelineTiming, run_pipeline
+from benchmarks.runner import compare_results, run_benchmarks
+from benchmarks.stages import blank_nlp, fixture_inputs, synthetic_input
+from benchmarks.synthetic import generate_judgment
+from database.db_connection import (
+    LegislationLink,
+    get_canonical_leg,
+    get_hrefs,
+    get_legislation_links,
+    get_legtitles,
+    get_matched_rule,
+    get_matched_rules,
+)
+
+
+class TestBenchmarkDatabase(unittest.TestCase):
+    def setUp(self):
+        self.db_conn = create_benchmark_database(["Adoption and Children Act 2002", "Children Act 1989"])
+
+    def test_placeholders_are_translated(self):
+        """
+        Given a query using psycopg2 placeholders
+        When it is translated for SQLite
+        Then named and positional placeholders should be rewritten
+        """
+        assert to_sqlite("SELECT * FROM t WHERE a=%(a)s AND b=%s") == "SELECT * FROM t WHERE a=:a AND b=?"
+
+    def test_database_functions_run_against_sqlite(self):
+        """
+        Given the benchmark database
+        When the real database functions query it
+        Then they should return the rules and legislation it holds
+        """
+        assert get_matched_rule(self.db_conn, "wlr").canonical_form == "[dddd] d1 WLR d2"
+        assert sorted(title.year for title in get_legtitles(self.db_conn)) == [1989, 2002]
+        assert get_hrefs(self.db_conn, "Children Act 1989").startswith("http://www.legislation.gov.uk/ukpga/1989/")
+        assert get_canonical_leg(self.db_conn, "Adoption and Children Act 2002") == "Adoption and Children Act 2002"
+
+    def test_batched_lookups(self):
+        """
+        Given rule ids and legislation titles, some repeated and some unknown
+        When they are looked up together, with the array placeholders rewritten for SQLite
+        Then each known one should be returned once, keyed by what was looked up, as from Postgres
+        """
+        rules = get_matched_rules(self.db_conn, ["wlr", "uksc", "wlr", "no-such-rule"])
+        links = get_legislation_links(self.db_conn, ["Children Act 1989", "Children Act 1989", "Theft Act 1968"])
+
+        assert set(rules) == {"wlr", "uksc"}
+        assert rules["wlr"] == get_matched_rule(self.db_conn, "wlr")
+        assert list(links) == ["Children Act 1989"]
+        assert links["Children Act 1989"] == LegislationLink(
+            get_hrefs(self.db_conn, "Children Act 1989"),
+            "Children Act 1989",
+        )
+        assert get_matched_rules(self.db_conn, []) == {}
+
+
+class TestCorrections(unittest.TestCase):
+    def test_every_manifest_citation_resolves(self):
+        """
+        Given a sample of citations from the manifest's examples
+        When their throughput is measured
+        Then every citation should resolve and the rate be reported
+        """
+        rules, citations = manifest_citations(200)
+
+        result = time_corrections(rules, citations, repeat=1)
+
+        assert len(citations) == result["citations"] == 200
+        assert result["citations_per_s"] > 0
+
+
+class TestBrackets(unittest.TestCase):
+    def test_pairing_uses_less_memory_than_matcher(self):
+        """
+        Given a synthetic judgment
+        When the bracketed groups are found by pairing brackets and by the parenthesis Matcher
+        Then pairing should find fewer groups and allocate less memory
+        """
+        measurements = measure_brackets(synthetic_input(200, 2, 20))
+
+        assert measurements["pairing"]["groups"] < measurements["matcher"]["groups"]
+        assert measurements["pairing"]["peak_bytes"] < measurements["matcher"]["peak_bytes"]
+
+
+class TestAbbreviations(unittest.TestCase):
+    def test_phrase_matcher_finds_the_same_occurrences(self):
+        """
+        Given a fixture judgment
+        When the occurrences of its abbreviations are found with a phrase matcher and a Matcher
+        Then both should find the same number of abbreviations and occurrences
+        """
+        timings = measure_occurrences(fixture_inputs()[0], repeat=1)
+
+        assert timings["phrase_matcher"]["abbreviations"] == timings["matcher"]["abbreviations"] > 0
+        assert timings["phrase_matcher"]["occurrences"] == timings["matcher"]["occurrences"]
+
+    def test_cached_search_finds_the_same_long_forms(self):
+        """
+        Given the words before and inside every bracketed group in the fixtures, and some awkward definitions
+        When the long form is searched for with the cached search and with the character scan it replaced
+        Then both should give the same spans
+        """
+        nlp = blank_nlp()
+        candidates = []
+        for judgment in fixture_inputs():
+            doc = nlp(judgment.text)
+            candidates.extend(
+                (doc[max(start - 10, 0) : start], doc[start + 1 : end - 1]) for start, end in bracket_groups(doc)
+            )
+        for text in ["İstanbul Convention (IC)", "Companies Act 2006 (CA 2006)", "the Act 1998 (A98)", " (X)"]:
+            doc = nlp(text)
+            candidates.append((doc[: len(doc) - 3], doc[len(doc) - 2 : len(doc) - 1]))
+
+        for long_candidate, short_candidate in candidates:
+            short, long = find_abbreviation(long_candidate, short_candidate)
+            expected_short, expected_long = character_scan_abbreviation(long_candidate, short_candidate)
+            assert short == expected_short
+            assert long == expected_long
+        assert any(long for _, long in (find_abbreviation(*candidate) for candidate in candidates))
+
+    def test_find_abbreviation_timings(self):
+        """
+        Given the fixture judgments
+        When find_abbreviation is timed on their definitions
+        Then each search should be timed on the same candidates
+        """
+        timings = measure_find_abbreviation(fixture_inputs(), repeat=2)
+
+        assert set(timings) == {"character_scan", "cached_cold", "cached_warm"}
+        assert len({timing["candidates"] for timing in timings.values()}) == 1
+
+
+class TestLegislationWorkers(unittest.TestCase):
+    def test_each_number_of_workers_finds_the_same_references(self):
+        """
+        Given a fixture judgment
+        When its legislation is found with one and with two worker processes
+        Then both should find the same references
+        """
+        timings = time_workers(fixture_inputs()[0], [1, 2], repeat=1)
+
+        assert list(timings) == ["1_workers", "2_workers"]
+        assert timings["1_workers"]["references"] > 0
+        assert all(timing["same_references"] for timing in timings.values())
+
+
+class TestSyntheticJudgment(unittest.TestCase):
+    def test_generated_judgment_is_valid_and_repeatable(self):
+        """
+        Given the same size parameters
+        When a synthetic judgment is generated twice
+        Then both should be the same well-formed XML document
+        """
+        judgment = generate_judgment(10, 1.5, 4)
+        assert judgment == generate_judgment(10, 1.5, 4)
+        root = lxml.etree.fromstring(judgment.xml.encode("utf-8"))
+        paragraphs = root.findall(".//{http://docs.oasis-open.org/legaldocml/ns/akn/3.0}paragraph")
+        assert len(paragraphs) == 10
+        assert len(judgment.act_titles) == 4
+
+    def test_citation_density_scales(self):
+        """
+        Given a higher citation density
+        When a synthetic judgment is generated
+        Then it should contain more citations
+        """
+        sparse = generate_judgment(20, 0.5, 4).xml
+        dense = generate_judgment(20, 3, 4).xml
+        assert dense.count("Act ") + dense.count("Smith v Jones") > sparse.count("Act ") + sparse.count("Smith v Jones")
+
+
+class TestBenchmarkRunner(unittest.TestCase):
+    def test_runs_stages_on_synthetic_judgment(self):
+        """
+        Given a small synthetic judgment
+        When the caselaw, replacement and timestamp stages are benchmarked
+        Then each should report its timings
+        """
+        judgment = synthetic_input(5, 2, 2)
+        judgment.distractor_acts = 10
+        # skip working out replacements, which needs the slower NLP stages
+        judgment.given_replacements = ""
+        results = run_benchmarks([judgment], ["caselaw", "make_replacements", "timestamp"], repeat=2)
+        assert set(results["results"]) == {
+            f"{judgment.name}/caselaw",
+            f"{judgment.name}/make_replacements",
+            f"{judgment.name}/timestamp",
+        }
+        for result in results["results"].values():
+            assert len(result["runs_s"]) == 2
+            assert result["min_s"] <= result["median_s"]
+
+    def test_compare_flags_regressions_beyond_threshold(self):
+        """
+        Given a baseline and current set of results
+        When they are compared with a 20% threshold
+        Then only benchmarks that slowed down by more than 20% should be flagged
+        """
+        baseline = {"results": {"a/caselaw": {"median_s": 1.0}, "a/timestamp": {"median_s": 1.0}}}
+        current = {
+            "results": {
+                "a/caselaw": {"median_s": 1.1},
+                "a/timestamp": {"median_s": 1.5},
+                "b/caselaw": {"median_s": 9.0},
+            },
+        }
+        comparisons, regressions = compare_results(baseline, current, threshold=0.2)
+        assert [comparison.benchmark for comparison in comparisons] == ["a/caselaw", "a/timestamp"]
+        assert [regression.benchmark for regression in regressions] == ["a/timestamp"]
+
+
+class TestPipeline(unittest.TestCase):
+    def test_detectors_run_in_parallel_and_shards_are_replaced(self):
+        """
+        Given a small synthetic judgment
+        When it is enriched with the detectors run in parallel
+        Then the case law and legislation each detector found should be marked up, and each detector timed
+        """
+        judgment = synthetic_input(5, 2, 2)
+        judgment.distractor_acts = 10
+
+        enriched, timing = run_pipeline(judgment)
+
+        root = lxml.etree.fromstring(enriched.encode("utf-8"))
+        ref_types = {ref.get("{https://caselaw.nationalarchives.gov.uk/akn}type") for ref in root.iter("{*}ref")}
+        assert {"case", "legislation"} <= ref_types
+        assert set(timing.detectors_s) == {"case", "leg", "abb"}
+
+    def test_critical_path_is_slowest_detector(self):
+        """
+        Given the time taken by each stage
+        When the critical path is worked out
+        Then only the slowest detector should count towards it
+        """
+        timing = PipelineTiming(0.5, {"case": 2.0, "leg": 3.0, "abb": 1.0}, 0.25, 4.0)
+
+        assert timing.critical_path_s == 3.75
+        assert timing.sequential_s == 6.75
+
+
+class TestColdStart(unittest.TestCase):
+    def test_import_times_are_totalled_by_package(self):
+        """
+        Given the output of `python -X importtime`
+        When it is parsed
+        Then each package's time should include its submodules but not the modules it imports
+        """
+        output = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |     pandas._libs\n"
+            "import time:       300 |        300 |     numpy\n"
+            "import time:        80 |        500 |   pandas\n"
+            "import time:        50 |        550 | index\n"
+            "Traceback (most recent call last):\n"
+        )
+
+        timings = parse_importtime(output)
+
+        assert [timing.module for timing in timings] == ["pandas._libs", "numpy", "pandas", "index"]
+        assert timings[-1].cumulative_us == 550
+        assert package_times(timings) == {"pandas": 200, "numpy": 300, "index": 50}
+
+    def test_budget_is_merged_with_the_default(self):
+        """
+        Given a default budget and a handler allowed a package the default forbids
+        When cold starts are checked
+        Then only the handlers over their own budget should be reported
+        """
+        budgets = {
+            "default": {"total_ms": 300, "forbidden": ["pandas", "spacy"]},
+            "handlers": {"update_legislation_table": {"total_ms": 1000, "forbidden": ["spacy"]}},
+        }
+        table = ColdStart("update_legislation_table", 800.0, {"pandas": 230.0, "botocore": 40.0})
+        detector = ColdStart("determine_replacements_caselaw", 1500.0, {"spacy": 230.0, "botocore": 40.0})
+
+        assert check_budget(table, budgets) == []
+        assert check_budget(detector, budgets) == [
+            "imports take 1500.0ms, over its budget of 300ms",
+            "imports spacy, which it should only load when needed",
+        ]
+
+    def test_detector_does_not_import_its_models_on_cold_start(self):
+        """
+        Given the case law detection lambda
+        When its handler is imported in a fresh interpreter
+        Then spaCy, pandas and SQLAlchemy should be left until a judgment needs them
+        """
+        cold_start = measure_cold_start("determine_replacements_caselaw", repeat=1)
+
+        assert cold_start.total_ms > 0
+        assert not {"spacy", "pandas", "sqlalchemy"} & set(cold_start.packages_ms)
@@ -12,8 +12,10 @@ import testing.postgresql
 from spacy.lang.en import English
 from sqlalchemy import create_engine
 
-from caselaw_extraction.correction_strategies import apply_correction_strategy
-from database.db_connection import get_matched_rule
+from benchmarks.stages import synthetic_input
+from caselaw_extraction.caselaw_matcher import case_pipeline, compile_rules, create_URI, resolve_citation
+from caselaw_extraction.correction_strategies import UnknownCitationTypeError, apply_correction_strategy
+from database.db_connection import MatchedRule, get_matched_rule, get_matched_rules
 
 CORRECT_CITATIONS = [
     "random text goes here random text goes here **[2022] UKUT 177 (TCC)",
@@ -222,6 +224,19 @@ class TestCitationProcessor(unittest.TestCase):
             ) = mock_return_citation(self.nlp, text, self.db_conn)
             assert is_canonical is not True and is_canonical is not False
 
+    def test_batched_rule_lookup(self):
+        """
+        Given rule ids, some repeated and some unknown
+        When they are looked up together
+        Then each known rule should be returned once, as it would be looked up alone
+        """
+        rules = get_matched_rules(self.db_conn, ["wlr", "uksc", "wlr", "no-such-rule"])
+
+        assert set(rules) == {"wlr", "uksc"}
+        assert rules["wlr"] == get_matched_rule(self.db_conn, "wlr")
+        assert rules["uksc"] == get_matched_rule(self.db_conn, "uksc")
+        assert get_matched_rules(self.db_conn, []) == {}
+
 
 class TestCorrectionStrategy(unittest.TestCase):
     def test_correct_forms(self):
@@ -301,6 +316,92 @@ class TestCorrectionStrategy(unittest.TestCase):
         assert corrected_citation == "[2019] QB 456"
         assert year == "2019"
 
+    def test_unknown_citation_type(self):
+        """
+        Given a citation type with no correction strategy
+        When a citation of that type is corrected
+        Then an error naming the type should be raised
+        """
+        with self.assertRaisesRegex(UnknownCitationTypeError, "NCitUnknown"):
+            apply_correction_strategy("NCitUnknown", "[2022] UKXX 123", "[dddd] UKXX d+")
+
+    def test_unknown_citation_type_in_manifest(self):
+        """
+        Given manifest rules of a citation type with no correction strategy
+        When they are compiled
+        Then well-formed citations should be kept as they are, and a rule for malformed citations logged and skipped
+        """
+        canonical = MatchedRule("ukxx", "https://example.com/year/d1", True, True, "NCitYearUnknown", "[dddd] UKXX d+")
+        malformed = canonical._replace(is_canonical=False)
+
+        assert resolve_citation(canonical, "[2022] UKXX 123") == (
+            "[2022] UKXX 123",
+            "2022",
+            "https://example.com/2022/123",
+            True,
+        )
+        with self.assertLogs(level="WARNING") as logs:
+            assert list(compile_rules({"canonical": canonical, "malformed": malformed})) == ["canonical"]
+        assert "malformed" in logs.output[0]
+        assert "NCitYearUnknown" in logs.output[0]
+
+    def test_citations_of_an_unknown_type_are_skipped(self):
+        """
+        Given a judgment citing a case whose manifest rule has a malformed citation type with no correction strategy
+        When its case law is detected
+        Then that rule's citations should be skipped and the rest still marked up
+        """
+        judgment = synthetic_input(30, 4, 3, 4)
+        doc = judgment.caselaw_nlp(judgment.text)
+        unknown = doc.ents[0].ent_id_
+        judgment.db_conn.execute(
+            "UPDATE manifest SET citation_type = 'Unknown', is_canonical = 0 WHERE id = ?",
+            (unknown,),
+        )
+
+        with self.assertLogs(level="WARNING"):
+            replacements = case_pipeline(doc, judgment.db_conn)
+
+        assert [replacement.span for replacement in replacements] == [
+            (ent.start_char, len(ent.text)) for ent in doc.ents if ent.ent_id_ != unknown
+        ]
+        assert replacements
+
+    def test_uri_template_is_filled_once(self):
+        """
+        Given URI templates using the year and one or both digits
+        When URIs are created
+        Then every placeholder should be filled
+        """
+        assert create_URI("https://caselaw.nationalarchives.gov.uk/ukftt/grc/year/d1_d2", "2022", "2020", "0341") == (
+            "https://caselaw.nationalarchives.gov.uk/ukftt/grc/2022/2020_0341"
+        )
+        assert create_URI("https://caselaw.nationalarchives.gov.uk/uksc/year/d1", "2022", "3", "") == (
+            "https://caselaw.nationalarchives.gov.uk/uksc/2022/3"
+        )
+
+
+class TestCaselawPipeline(unittest.TestCase):
+    def test_repeated_citations_are_resolved_once(self):
+        """
+        Given a judgment citing a few cases many times
+        When its case law is detected
+        Then every citation should be marked up, with the rules for all of them fetched in one query
+        """
+        judgment = synthetic_input(30, 4, 3, 4)
+        doc = judgment.caselaw_nlp(judgment.text)
+        queries = []
+        judgment.db_conn.set_trace_callback(queries.append)
+
+        replacements = case_pipeline(doc, judgment.db_conn)
+
+        assert len(replacements) == len(doc.ents) > 4
+        assert len({replacement.citation_match for replacement in replacements}) <= 4
+        assert len([query for query in queries if "FROM manifest" in query]) == 1
+        assert [replacement.span for replacement in replacements] == [
+            (ent.start_char, len(ent.text)) for ent in doc.ents
+        ]
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,49 @@
+import json
+import os
+import time
+from unittest.mock import patch
+
+import pytest
+
+with patch.dict(os.environ, {"DEST_BUCKET_NAME": "DEST_BUCKET_NAME"}):
+    from lambdas.fetch_xml import index
+
+
+class FakeSQSRecord(dict):
+    def __init__(self):
+        self.body = json.dumps({"Message": json.dumps({"status": "published", "uri_reference": "uksc/2024/1"})})
+
+
+@patch.object(index, "check_lock_judgment_urllib")
+@patch.object(index, "upload_contents")
+@patch.object(index, "unlock_judgment_urllib")
+@patch.object(index, "lock_judgment_urllib")
+@patch.object(index, "fetch_judgment_urllib")
+def test_judgment_is_uploaded_once_locked(fetch, lock, unlock, upload, check_lock):
+    events = []
+    fetch.return_value = "<judgment/>"
+    lock.side_effect = lambda *args: time.sleep(0.05) or events.append("locked")
+    upload.side_effect = lambda *args: events.append("uploaded")
+
+    index.process_event(FakeSQSRecord(), "https://api.example/")
+
+    assert events == ["locked", "uploaded"]
+    upload.assert_called_once_with("uksc-2024-1", "<judgment/>")
+    unlock.assert_not_called()
+
+
+@patch.object(index, "check_lock_judgment_urllib")
+@patch.object(index, "upload_contents")
+@patch.object(index, "unlock_judgment_urllib")
+@patch.object(index, "lock_judgment_urllib")
+@patch.object(index, "fetch_judgment_urllib")
+def test_lock_is_released_when_the_fetch_fails(fetch, lock, unlock, upload, check_lock):
+    fetch.side_effect = ConnectionError("API unavailable")
+
+    with pytest.raises(ConnectionError):
+        index.process_event(FakeSQSRecord(), "https://api.example/")
+
+    lock.assert_called_once()
+    unlock.assert_called_once_with("https://api.example/", "uksc/2024/1", index.API_USERNAME, index.API_PASSWORD)
+    upload.assert_not_called()
+    check_lock.assert_not_called()
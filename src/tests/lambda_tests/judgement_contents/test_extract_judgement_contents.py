@@ -10,6 +10,12 @@ from moto import mock_aws
 
 test_xml_content = """<?xml version="1.0" encoding="UTF-8"?>
 <akomaNtoso>
+        <meta>
+          <identification source="#tna">
+            <FRBRWork><FRBRdate date="2023-02-13" name="judgment"/></FRBRWork>
+            <FRBRManifestation><FRBRdate date="2023-02-14T09:00:00" name="transform"/></FRBRManifestation>
+          </identification>
+        </meta>
         <level>
           <content>
             <p style="margin-right:0.00in;text-indent:0.00in">the properties of golf clubs, the ISP is not, as the CMA decided and the CAT held, objectively justified. </p>
@@ -42,9 +48,22 @@ test_s3_event = {
 #     }]}
 
 test_bucket_destination_name = "test_bucket_destination_name"
-
-
-@mock.patch.dict(os.environ, {"DEST_BUCKET_NAME": test_bucket_destination_name}, clear=True)
+test_replacements_bucket_name = "test_replacements_bucket"
+test_detection_queue_names = ["detect-caselaw", "detect-legislation", "detect-abbreviations"]
+
+
+@mock.patch.dict(
+    os.environ,
+    {
+        "DEST_BUCKET_NAME": test_bucket_destination_name,
+        "REPLACEMENTS_BUCKET": test_replacements_bucket_name,
+        "DETECTION_QUEUE_NAMES": ",".join(
+            f"https://sqs.us-east-1.amazonaws.com/123456789012/{name}" for name in test_detection_queue_names
+        ),
+        "AWS_DEFAULT_REGION": "us-east-1",
+    },
+    clear=True,
+)
 class TestExtractJudgement(unittest.TestCase):
     # def setUp(self):
     #     print("setUp")
@@ -70,6 +89,11 @@ class TestExtractJudgement(unittest.TestCase):
 
         conn.create_bucket(Bucket=test_bucket_name)
         conn.create_bucket(Bucket=test_bucket_destination_name)
+        conn.create_bucket(Bucket=test_replacements_bucket_name)
+        conn.put_object(Bucket=test_replacements_bucket_name, Key="example/s3/path/key/test_data.txt/case", Body=b"")
+        sqs = boto3.client("sqs", region_name="us-east-1")
+        for name in test_detection_queue_names:
+            sqs.create_queue(QueueName=name)
 
         conn.put_object(
             Bucket=test_bucket_name,
@@ -91,6 +115,18 @@ class TestExtractJudgement(unittest.TestCase):
         cleaned_content = cleaned_content.replace("\\n\\t", "")
         cleaned_content = cleaned_content.strip()
         self.assertEqual(cleaned_content, test_extracted_xml_content)
+
+        # replacements from an earlier enrichment are cleared, and each detection lambda is started on the text
+        stale = conn.list_objects_v2(Bucket=test_replacements_bucket_name).get("Contents", [])
+        self.assertEqual(stale, [])
+        for name in test_detection_queue_names:
+            queue_url = sqs.get_queue_url(QueueName=name)["QueueUrl"]
+            messages = sqs.receive_message(QueueUrl=queue_url, MessageAttributeNames=["All"])["Messages"]
+            self.assertEqual(
+                messages[0]["MessageAttributes"]["source_key"]["StringValue"],
+                "example/s3/path/key/test_data.txt",
+            )
+            self.assertEqual(messages[0]["MessageAttributes"]["judgment_date"]["StringValue"], "2023-02-13")
         # except Exception as e:
         #     print(e)
 
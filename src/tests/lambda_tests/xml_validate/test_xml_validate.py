@@ -15,6 +15,27 @@ test_xml_content = """<?xml version="1.0" encoding="UTF-8"?>
         </level>
 </akomaNtoso>"""
 
+test_schema_content = """<?xml version="1.0" encoding="UTF-8"?>
+<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema"
+    targetNamespace="http://docs.oasis-open.org/legaldocml/ns/akn/3.0" elementFormDefault="qualified">
+    <xs:element name="akomaNtoso" type="xs:anyType"/>
+</xs:schema>"""
+
+schema_env = {
+    "DEST_BUCKET_NAME": "DEST_BUCKET_NAME",
+    "VCITE_BUCKET": "VCITE_BUCKET",
+    "VCITE_ENRICHED_BUCKET": "VCITE_ENRICHED_BUCKET",
+    "DEST_ERROR_TOPIC_NAME": "DEST_ERROR_TOPIC_NAME",
+    "DEST_TOPIC_NAME": "DEST_TOPIC_NAME",
+    "VALIDATE_USING_SCHEMA": "1",
+    "DEST_QUEUE": "DEST_QUEUE",
+    "AWS_DEFAULT_REGION": "eu-west-2",
+    "AWS_ACCESS_KEY_ID": "testing",
+    "AWS_SECRET_ACCESS_KEY": "testing",
+    "SCHEMA_BUCKET_NAME": "schema_bucket",
+    "SCHEMA_BUCKET_KEY": "caselaw.xsd",
+}
+
 test_s3_event_record = S3EventRecord({"s3": {"bucket": {"name": "test_bucket"}, "object": {"key": "test_data.xml"}}})
 
 
@@ -80,5 +101,58 @@ class TestXMLValidate(unittest.TestCase):
         process_event(test_s3_event_record)
 
 
+class TestSchemaCache(unittest.TestCase):
+    def setUp(self):
+        env_patcher = mock.patch.dict(os.environ, schema_env, clear=True)
+        env_patcher.start()
+        self.addCleanup(env_patcher.stop)
+
+        from lambdas.xml_validate import index
+
+        self.index = index
+        self.index._SCHEMA_CACHE.clear()
+        self.addCleanup(self.index._SCHEMA_CACHE.clear)
+        schema_patcher = mock.patch.object(self.index, "VALIDATE_USING_SCHEMA", True)
+        schema_patcher.start()
+        self.addCleanup(schema_patcher.stop)
+
+    @mock_aws
+    def test_schema_compiled_once_while_etag_unchanged(self):
+        """
+        Given a schema in S3
+        When several documents are validated
+        Then the schema is downloaded and compiled only once
+        """
+        conn = boto3.client("s3", region_name="eu-west-2")
+        conn.create_bucket(Bucket="schema_bucket", CreateBucketConfiguration={"LocationConstraint": "eu-west-2"})
+        conn.put_object(Bucket="schema_bucket", Key="caselaw.xsd", Body=test_schema_content)
+
+        with mock.patch.object(self.index, "load_schema", wraps=self.index.load_schema) as load_schema:
+            assert self.index.validate_content(test_xml_content.encode("utf-8"))
+            assert self.index.validate_content(test_xml_content.encode("utf-8"))
+            assert load_schema.call_count == 1
+
+    @mock_aws
+    @mock.patch.dict(os.environ, {"SCHEMA_CACHE_TTL_SECONDS": "0"})
+    def test_schema_recompiled_when_etag_changes(self):
+        """
+        Given a compiled schema whose cache entry has expired
+        When the schema in S3 is unchanged, it is not compiled again
+        And when the schema in S3 changes, it is compiled again
+        """
+        conn = boto3.client("s3", region_name="eu-west-2")
+        conn.create_bucket(Bucket="schema_bucket", CreateBucketConfiguration={"LocationConstraint": "eu-west-2"})
+        conn.put_object(Bucket="schema_bucket", Key="caselaw.xsd", Body=test_schema_content)
+
+        with mock.patch.object(self.index, "load_schema", wraps=self.index.load_schema) as load_schema:
+            self.index.get_schema("schema_bucket", "caselaw.xsd")
+            self.index.get_schema("schema_bucket", "caselaw.xsd")
+            assert load_schema.call_count == 1
+
+            conn.put_object(Bucket="schema_bucket", Key="caselaw.xsd", Body=test_schema_content + "\n")
+            self.index.get_schema("schema_bucket", "caselaw.xsd")
+            assert load_schema.call_count == 2
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,15 +1,26 @@
+import datetime as dt
 import unittest
+from pathlib import Path
 
 import psycopg2
 import testing.postgresql
 from spacy.lang.en import English
+from spacy.matcher import Matcher
 
+from benchmarks.fake_db import act_titles_in
+from database.db_connection import LegislationLink, LegislationTitle, get_legislation_links
 from legislation_extraction.legislation_matcher_hybrid import (
+    CUTOFF,
+    TitleIndex,
     detect_candidates,
     detect_year_span,
     lookup_pipe,
+    match_in_workers,
+    prune_titles,
     resolve_overlap,
+    scan_judgment,
     search_for_act_fuzzy,
+    shard_by_year,
 )
 from legislation_extraction.legislation_matcher_hybrid import (
     exact_matcher as search_for_act,
@@ -17,6 +28,10 @@ from legislation_extraction.legislation_matcher_hybrid import (
 from legislation_extraction.legislation_matcher_hybrid import (
     fuzzy_matcher as hybrid,
 )
+from legislation_extraction.window_cache import WINDOW_CACHE
+from utils.helper import parse_file
+
+FIXTURE_DIR = Path(__file__).parent.parent / "fixtures"
 
 """
     Testing the matching of legislation based on the data found in the lookup table.
@@ -52,6 +67,26 @@ class TestLegislationProcessor(unittest.TestCase):
     def tearDown(self):
         self.postgresql.stop()
 
+    def test_batched_legislation_lookup(self):
+        """
+        Given legislation titles, some repeated and some unknown
+        When they are looked up together
+        Then the link and canonical form of each known title should be returned once
+        """
+        links = get_legislation_links(
+            self.db_conn,
+            ["Adoption and Children Act 2002", "def", "Adoption and Children Act 2002", "Theft Act 1968"],
+        )
+
+        assert links == {
+            "Adoption and Children Act 2002": LegislationLink(
+                "http://www.legislation.gov.uk/ukpga/2002/38",
+                "citation_abc",
+            ),
+            "def": LegislationLink("ref_def", "citation_def"),
+        }
+        assert get_legislation_links(self.db_conn, []) == {}
+
     def test_resolve_overlap_without_overlap(self):
         results = {
             "Adoption and Children Act 2002": [
@@ -328,6 +363,147 @@ class TestLegislationProcessorHelpers(unittest.TestCase):
         candidates = detect_candidates(self.nlp, doc)
         assert candidates == []
 
+    def test_scan_judgment(self):
+        text = "the Made-up Act 1987, [2022] UKSC 12345 and the second Act 2013 in 1987"
+        doc = self.nlp(text)
+        scan = scan_judgment(doc)
+        assert scan.year_positions == {1987: [5, 18], 2022: [8], 2013: [16]}
+        assert scan.years == {1987, 2013, 2022}
+        assert scan.candidates == [(4, 6), (15, 17)]
+        assert scan.candidates_by_year == {"1987": [(4, 6)], "2013": [(15, 17)]}
+        assert scan.act_positions == [4, 15]
+
+        scan = scan_judgment(self.nlp(""))
+        assert scan.years == set()
+        assert scan.candidates == []
+
+    def test_scan_judgment_finds_what_the_matchers_found(self):
+        doc = self.nlp(parse_file((FIXTURE_DIR / "rwanda.xml").read_text()))
+        candidate_matcher = Matcher(self.nlp.vocab)
+        candidate_matcher.add("Act Matcher", [[{"ORTH": "Act"}, {"SHAPE": "dddd"}]])
+        year_matcher = Matcher(self.nlp.vocab)
+        year_matcher.add("date matcher", [[{"SHAPE": "dddd"}]])
+
+        scan = scan_judgment(doc)
+
+        assert scan.candidates == [(start, end) for _, start, end in candidate_matcher(doc)]
+        years = [(doc[start].text, start) for _, start, _ in year_matcher(doc)]
+        assert scan.year_positions == {
+            year: [start for text, start in years if text == str(year)]
+            for year in {int(text) for text, _ in years if len(text) == 4 and text.isdigit()}
+        }
+
+    def test_years_after_act(self):
+        text = "the Made-up Act of 1987, [2022] UKSC 12345 and the second Act 2013 in 1987"
+        scan = scan_judgment(self.nlp(text))
+
+        assert scan.years_after_act(1) == {2013}
+        assert scan.years_after_act(2) == {1987, 2013}
+        assert scan.years_after_act(5) == {1987, 2013, 2022}
+        assert scan_judgment(self.nlp("2013 before the Act")).years_after_act(5) == set()
+
+    def test_prune_titles(self):
+        text = "the Made-up Act of 1987, [2022] UKSC 12345 and the second Act 2013 in 1987"
+        scan = scan_judgment(self.nlp(text))
+        titles = [
+            LegislationTitle("Made-up Act 1987", 1987, True),
+            LegislationTitle("Second Act 2013", 2013, True),
+            LegislationTitle("Later Act 2022", 2022, True),
+            LegislationTitle("SAA", 2022, False),
+        ]
+
+        assert prune_titles(titles, scan) == titles
+        assert prune_titles(titles, scan, dt.date(2021, 12, 31)) == titles[:2]
+        assert prune_titles(titles, scan, dt.date(2022, 1, 1)) == titles
+        assert prune_titles(titles, scan, years_after_act=1) == [titles[1]]
+        assert prune_titles(titles, scan, dt.date(2021, 1, 1), 2) == titles[:2]
+
+    def test_shard_by_year(self):
+        searches = [
+            ("A Act 2002", [(0, 2), (4, 6), (8, 10)]),
+            ("B Act 1998", [(12, 14)]),
+            ("C Act 2002", [(0, 2)]),
+            ("D Act 1989", [(16, 18), (20, 22)]),
+        ]
+
+        assert shard_by_year(searches, 1) == [[0, 1, 2, 3]]
+        assert shard_by_year(searches, 2) == [[0, 2], [1, 3]]
+        assert shard_by_year(searches, 8) == [[0, 2], [3], [1]]
+
+    def test_matching_in_workers_gives_the_same_matches(self):
+        doc = self.nlp(parse_file((FIXTURE_DIR / "rwanda.xml").read_text()))
+        scan = scan_judgment(doc)
+        searches = [
+            (title, scan.candidates_by_year[title[-4:]])
+            for title in sorted(act_titles_in(doc.text))
+            if title[-4:] in scan.candidates_by_year
+        ]
+
+        WINDOW_CACHE.clear()
+        found = match_in_workers(searches, doc, self.nlp, CUTOFF, 2)
+        # the windows were matched in the workers
+        assert len(WINDOW_CACHE) == 0
+
+        expected = [hybrid(title, doc, self.nlp, CUTOFF, candidates) for title, candidates in searches]
+        assert any(expected)
+        assert found == expected
+
+    def test_title_index_blocks_windows_without_enough_shared_bigrams(self):
+        text = (
+            "the welfare checklist in s.1(4) of the Adoption Children Act 2002 requires the court, inter alia, "
+            "to consider the Data Protection Act 2002"
+        )
+        doc = self.nlp(text)
+        titles = [
+            "Adoption and Children Act 2002",
+            "Data Protection Act 2002",
+            "Tax Act 2002",
+            "Data Protection Act 1998",
+        ]
+        index = TitleIndex(titles, self.nlp)
+
+        blocked = index.block(doc, scan_judgment(doc).candidates_by_year)
+
+        assert blocked == {
+            "Adoption and Children Act 2002": [(10, 12)],
+            # the first window shares the bigrams of "Act" and the end of "Adoption" with the title, too many to rule it out
+            "Data Protection Act 2002": [(10, 12), (24, 26)],
+            # too short to block, so scored against every candidate with its year
+            "Tax Act 2002": [(10, 12), (24, 26)],
+        }
+
+    def test_title_index_loses_no_fuzzy_matches(self):
+        # the acts mentioned in the fixtures, misspelt versions of them, and each of them with the year of the others
+        def misspell(title):
+            words = title.split()
+            longest = max(range(len(words) - 2), key=lambda i: len(words[i]), default=0)
+            word = words[longest]
+            words[longest] = word[0] + word[2] + word[1] + word[3:] if len(word) > 3 else word
+            return " ".join(words)
+
+        for fixture in ["rwanda.xml", "ewhc-ch-2023-257_original.xml"]:
+            doc = self.nlp(parse_file((FIXTURE_DIR / fixture).read_text()))
+            acts = sorted(act_titles_in(doc.text))
+            years = sorted({act[-4:] for act in acts})
+            titles = list(
+                dict.fromkeys(
+                    [*acts, *map(misspell, acts), *[f"{act[:-4]}{year}" for act in acts for year in years]],
+                ),
+            )
+            scan = scan_judgment(doc)
+
+            blocked = TitleIndex(titles, self.nlp).block(doc, scan.candidates_by_year)
+
+            expected = {
+                title: hybrid(title, doc, self.nlp, CUTOFF, scan.candidates_by_year.get(title[-4:], []))
+                for title in titles
+            }
+            assert any(ratio < 100 for matches in expected.values() for *_, ratio in matches)
+            assert sum(map(len, blocked.values())) < sum(
+                len(scan.candidates_by_year.get(title[-4:], [])) for title in titles
+            )
+            assert {title: hybrid(title, doc, self.nlp, CUTOFF, blocked.get(title, [])) for title in titles} == expected
+
     def test_search_for_act(self):
         text = "In their skeleton argument in support of the first ground, Mr Goodwin and Mr Redmond remind the court that the welfare checklist in s.1(4) of the Adoption and Children Act 2002 requires the court, inter alia"
         doc = self.nlp(text)
@@ -0,0 +1,114 @@
+import contextlib
+import datetime as dt
+import io
+import re
+import unittest
+from pathlib import Path
+
+from spacy.lang.en import English
+
+from benchmarks.fake_db import act_titles_in, create_benchmark_database
+from database.db_connection import LegislationTitle, get_legtitles
+from legislation_extraction.legislation_matcher_hybrid import leg_pipeline, scan_judgment
+from legislation_extraction.text_windows import (
+    SEPARATOR,
+    join_windows,
+    leg_pipeline_from_text,
+    legislation_windows,
+    word_end,
+    word_start,
+)
+from utils.helper import parse_file
+
+FIXTURE_DIR = Path(__file__).parent.parent / "fixtures"
+FIXTURES = ["rwanda.xml", "ewhc-ch-2023-257_original.xml"]
+ACRONYM = re.compile(r"\b[A-Z]{3,}\b")
+
+
+class TestTextWindows(unittest.TestCase):
+    def setUp(self):
+        self.nlp = English()
+        self.nlp.max_length = 1500000
+
+    def test_word_bounds(self):
+        text = "  of the (Adoption and Children Act 2002) requires"
+        act = text.index("Act")
+        assert text[word_start(text, act) : word_end(text, act)] == "Act"
+        assert text[word_start(text, act + 1, 2) : word_end(text, act + 6)] == "and Children Act 2002)"
+        # the leading whitespace is kept when there are not enough words before
+        assert word_start(text, act, 10) == 0
+        assert word_end(text, len(text) + 10) == len(text)
+
+    def test_windows_are_merged_and_mapped_back(self):
+        text = "one two three four five six seven"
+        windows = join_windows(text, [(14, 18), (0, 7), (4, 13), (28, 33)])
+
+        assert windows.text == "one two three\n\nfour\n\nseven"
+        assert windows.starts == [0, 15, 21]
+        assert windows.offsets == [0, 14, 28]
+        for offset, word in [(4, "two"), (15, "four"), (21, "seven")]:
+            judgment_offset = windows.judgment_offset(offset)
+            assert text[judgment_offset : judgment_offset + len(word)] == word
+
+    def test_windows_are_tokenised_as_in_the_judgment(self):
+        for fixture in FIXTURES:
+            text = parse_file((FIXTURE_DIR / fixture).read_text())
+            leg_titles = [LegislationTitle(title, int(title[-4:]), True) for title in act_titles_in(text)]
+            doc = self.nlp(text)
+
+            windows, _ = legislation_windows(text, leg_titles, self.nlp)
+            windows_doc = self.nlp.make_doc(windows.text)
+
+            assert len(windows.text) < len(text) / 5
+            ends = [start - len(SEPARATOR) for start in windows.starts[1:]] + [len(windows.text)]
+            for start, end, offset in zip(windows.starts, ends, windows.offsets, strict=True):
+                span = doc.char_span(offset, offset + end - start, alignment_mode="expand")
+                window_span = windows_doc.char_span(start, end, alignment_mode="expand")
+                assert [token.text for token in window_span] == [token.text for token in span]
+            assert scan_judgment(windows_doc).years == scan_judgment(doc).years
+
+    def test_finds_what_the_whole_judgment_gives(self):
+        for fixture in FIXTURES:
+            text = parse_file((FIXTURE_DIR / fixture).read_text())
+            conn = create_benchmark_database(act_titles_in(text))
+            leg_titles = get_legtitles(conn)
+            # acronyms, and titles without their year, are matched exactly
+            exact_titles = [
+                LegislationTitle(title, leg_titles[0].year, False) for title in sorted(set(ACRONYM.findall(text)))
+            ]
+            exact_titles += [LegislationTitle(title.candidate_titles[:-5], title.year, False) for title in leg_titles]
+            conn.cursor().executemany(
+                "INSERT INTO ukpga_lookup VALUES (%s, %s, %s, %s, %s)",
+                [(title.candidate_titles, "ref", "citation", title.year, False) for title in exact_titles],
+            )
+            leg_titles += exact_titles
+
+            # with and without pruning the titles
+            for judgment_date, years_after_act in [(None, None), (dt.date(2022, 12, 31), 3)]:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    expected = leg_pipeline(
+                        leg_titles,
+                        self.nlp,
+                        self.nlp(text),
+                        conn,
+                        judgment_date=judgment_date,
+                        years_after_act=years_after_act,
+                    )
+                    replacements = leg_pipeline_from_text(
+                        leg_titles,
+                        self.nlp,
+                        text,
+                        conn,
+                        judgment_date,
+                        years_after_act,
+                    )
+
+                assert replacements == expected
+                for replacement in replacements:
+                    offset, length = replacement.span
+                    assert text[offset : offset + length] == replacement.detected_ref
+            assert any(replacement.href == "ref" for replacement in expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
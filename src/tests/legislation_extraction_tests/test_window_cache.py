@@ -0,0 +1,69 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from spacy.lang.en import English
+
+from benchmarks.fake_db import act_titles_in
+from legislation_extraction.legislation_matcher_hybrid import CUTOFF, fuzzy_matcher, scan_judgment
+from legislation_extraction.window_cache import CacheStats, WindowCache
+from utils.helper import parse_file
+
+FIXTURE_DIR = Path(__file__).parent.parent / "fixtures"
+
+
+class TestWindowCache(unittest.TestCase):
+    def setUp(self):
+        self.nlp = English()
+        self.nlp.max_length = 1500000
+
+    def test_least_recently_used_windows_are_evicted(self):
+        cache = WindowCache(maxsize=2)
+        cache.put(("en", "A Act 2002", "one", CUTOFF), [(0, 3, 100)])
+        cache.put(("en", "A Act 2002", "two", CUTOFF), [])
+        assert cache.get(("en", "A Act 2002", "one", CUTOFF)) == [(0, 3, 100)]
+        cache.put(("en", "A Act 2002", "three", CUTOFF), [])
+
+        assert len(cache) == 2
+        assert cache.get(("en", "A Act 2002", "two", CUTOFF)) is None
+        assert cache.get(("en", "A Act 2002", "three", CUTOFF)) == []
+        assert cache.stats == CacheStats(hits=2, disk_hits=0, misses=1)
+        assert cache.stats.hit_rate == 2 / 3
+
+    def test_windows_are_kept_on_disk_between_caches(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = str(Path(directory) / "windows.sqlite")
+            cache = WindowCache(path=path)
+            cache.put(("en", "A Act 2002", "the A Act", CUTOFF), [(1, 3, 95)])
+            cache.flush()
+
+            other = WindowCache(path=path)
+            assert other.get(("en", "A Act 2002", "the A Act", CUTOFF)) == [(1, 3, 95)]
+            assert other.get(("en", "A Act 2002", "the A Act", CUTOFF)) == [(1, 3, 95)]
+            assert other.stats == CacheStats(hits=1, disk_hits=1, misses=0)
+
+    def match(self, doc, scan, title, cache):
+        return fuzzy_matcher(title, doc, self.nlp, CUTOFF, scan.candidates_by_year.get(title[-4:], []), cache)
+
+    def test_cached_windows_give_the_same_matches(self):
+        repeated = 0
+        for fixture in ["rwanda.xml", "ewhc-ch-2023-257_original.xml"]:
+            doc = self.nlp(parse_file((FIXTURE_DIR / fixture).read_text()))
+            scan = scan_judgment(doc)
+            titles = sorted(act_titles_in(doc.text))
+
+            cache = WindowCache()
+            expected = {title: self.match(doc, scan, title, WindowCache(maxsize=0)) for title in titles}
+            assert any(expected.values())
+            assert {title: self.match(doc, scan, title, cache) for title in titles} == expected
+            repeated += cache.stats.hits
+            # the windows are only searched the first time they are seen
+            misses = cache.stats.misses
+            assert {title: self.match(doc, scan, title, cache) for title in titles} == expected
+            assert cache.stats.misses == misses
+        # including those repeated within a judgment
+        assert repeated > 0
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import lxml.etree
+
+from replacer.make_replacments import make_post_header_replacements
+from replacer.offset_replacer import align_spans, replace_at_offsets
+from utils.replacements import ReplacementLine
+
+AKN = "http://docs.oasis-open.org/legaldocml/ns/akn/3.0"
+
+JUDGMENT = f"""<akomaNtoso xmlns="{AKN}" xmlns:uk="https://caselaw.nationalarchives.gov.uk/akn">
+<judgment name="judgment"><header><p>Appeal from [2020] UKSC 1</p></header><judgmentBody><decision>
+<paragraph><content><p>See [2020] UKSC 1 and <i>Smith</i> [2020] UKSC 1, following [2019] UKSC 2.</p></content></paragraph>
+</decision></judgmentBody></judgment></akomaNtoso>"""
+
+# the text extracted from JUDGMENT is "See [2020] UKSC 1 and Smith [2020] UKSC 1, following [2019] UKSC 2."
+CASE_VALUES = ("[2020] UKSC 1", "[2020] UKSC 1", "2020", "#", True)
+
+
+def refs(xml):
+    root = lxml.etree.fromstring(xml.encode("utf-8"))
+    return [(ref.getparent().tag.split("}")[1], ref.text, ref.tail) for ref in root.iter(f"{{{AKN}}}ref")]
+
+
+class TestReplaceAtOffsets:
+    def test_only_the_detected_occurrence_is_marked_up(self):
+        """
+        Given a citation detected once in a paragraph where it appears twice, and also in the header
+        When replacements are made with its span
+        Then only the detected occurrence should be marked up
+        """
+        replacements = '{"case": ["[2020] UKSC 1", "[2020] UKSC 1", "2020", "#", true], "span": [28, 13]}\n'
+
+        enriched = make_post_header_replacements(JUDGMENT, replacements)
+
+        assert refs(enriched) == [("p", "[2020] UKSC 1", ", following [2019] UKSC 2.")]
+        assert "<i>Smith</i> <ref" in enriched
+        assert "<p>See [2020] UKSC 1 and " in enriched
+        assert "<p>Appeal from [2020] UKSC 1</p>" in enriched
+
+    def test_detections_with_and_without_spans(self):
+        """
+        Given a citation detected with its span and legislation detected without one
+        When replacements are made
+        Then the citation should be marked up where it was found and the legislation found by searching for it,
+        using the uk prefix the judgment declares
+        """
+        judgment = JUDGMENT.replace("UKSC 2.", "UKSC 2 under the Human Rights Act 1998.")
+        replacements = (
+            '{"case": ["[2020] UKSC 1", "[2020] UKSC 1", "2020", "#", true], "span": [28, 13]}\n'
+            '{"leg": ["Human Rights Act 1998", "http://www.legislation.gov.uk/ukpga/1998/42", "Human Rights Act 1998"]}\n'
+        )
+
+        enriched = make_post_header_replacements(judgment, replacements)
+
+        assert refs(enriched) == [
+            ("p", "[2020] UKSC 1", ", following [2019] UKSC 2 under the "),
+            ("p", "Human Rights Act 1998", "."),
+        ]
+        # the judgment's namespaces are not declared again inside it
+        assert enriched.count("xmlns") == 2
+
+    def test_several_detections_in_one_text_node(self):
+        """
+        Given two detections in the same text node
+        When they are replaced at their offsets
+        Then the text node should be split around both, keeping the text between them
+        """
+        root = lxml.etree.fromstring(JUDGMENT.encode("utf-8"))
+        lines = [
+            ReplacementLine("case", CASE_VALUES, (28, 13)),
+            ReplacementLine("case", ("[2019] UKSC 2", "[2019] UKSC 2", "2019", "#", True), (53, 13)),
+        ]
+
+        assert replace_at_offsets(root, lines) == []
+        assert refs(lxml.etree.tostring(root, encoding="unicode")) == [
+            ("p", "[2020] UKSC 1", ", following "),
+            ("p", "[2019] UKSC 2", "."),
+        ]
+
+    def test_unplaced_detections_are_left_for_searching(self):
+        """
+        Given one detection whose span matches nothing and another without a span
+        When they are replaced at their offsets
+        Then both should be returned to be replaced by searching for them
+        """
+        root = lxml.etree.fromstring(JUDGMENT.encode("utf-8"))
+        lines = [
+            ReplacementLine("case", ("[1999] AC 1", "[1999] AC 1", "1999", "#", False), (5, 11)),
+            ReplacementLine("abb", ("UKSC", "United Kingdom Supreme Court")),
+        ]
+
+        assert replace_at_offsets(root, lines) == lines
+
+
+class TestAlignSpans:
+    def test_spans_follow_drift(self):
+        """
+        Given spans from text with more whitespace than the replacer's text
+        When they are aligned
+        Then each should be found at its drifted position
+        """
+        text = "a [2020] UKSC 1 b [2020] UKSC 1 c [2019] UKSC 2"
+        original = "a  [2020] UKSC 1 b   [2020] UKSC 1 c    [2019] UKSC 2"
+        lines = [
+            ReplacementLine("case", CASE_VALUES, (original.rindex("[2020]"), 13)),
+            ReplacementLine("case", ("[2019] UKSC 2",), (original.index("[2019]"), 13)),
+        ]
+
+        anchored, unanchored = align_spans(text, lines)
+
+        assert [anchor.start for anchor in anchored] == [text.rindex("[2020]"), text.index("[2019]")]
+        assert unanchored == []
@@ -1,11 +1,12 @@
 """Testing the xml parser to ensure that information is extracted as expected"""
 
+import io
 import unittest
 from pathlib import Path
 
 from spacy.lang.en import English
 
-from utils.helper import parse_file
+from utils.helper import extract_text, parse_file
 
 FIXTURE_DIR = Path(__file__).parent.parent.resolve() / "rules"
 
@@ -81,6 +82,72 @@ class TestXmlParser(unittest.TestCase):
 
         assert judgment_content_text == "That point was also in College [2014] EWCA Civ 734 at [12]-[14]"
 
+    def test_nested_content_is_not_duplicated(self):
+        """
+        Given a content element nested inside an intro element
+        When the text is extracted
+        Then the nested text should appear once
+        """
+        text = """<paragraph>
+        <intro><p>The claimant relies on:</p><subparagraph><content><p>the first ground</p></content></subparagraph></intro>
+        <wrapUp><p>Both fail.</p></wrapUp>
+        </paragraph>"""
+
+        judgment_content_text = parse_file(text)
+
+        assert judgment_content_text == "The claimant relies on:the first ground Both fail."
+
+    def test_offset_map_points_to_text_nodes(self):
+        """
+        Given a namespaced judgment
+        When the text is extracted with its offset map
+        Then positions in the text should map back to the element and text node they came from
+        """
+        text = b"""<akomaNtoso xmlns="http://docs.oasis-open.org/legaldocml/ns/akn/3.0"><judgment>
+        <paragraph><content><p> See <ref>[2014] EWCA Civ 734</ref> at [12].</p></content></paragraph>
+        <paragraph><content><p>Second</p></content></paragraph>
+        </judgment></akomaNtoso>"""
+
+        output = io.StringIO()
+        offset_map = extract_text(io.BytesIO(text), output)
+
+        extracted = output.getvalue()
+        assert extracted == "See [2014] EWCA Civ 734 at [12]. Second"
+        paragraph = "/akomaNtoso[1]/judgment[1]/paragraph[{}]/content[1]/p[1]"
+        assert offset_map.locate(0) == (
+            (0, 4, paragraph.format(1), "text", 1),
+            1,
+        )
+        segment, offset = offset_map.locate(extracted.index("EWCA"))
+        assert (segment.path, segment.part, offset) == (paragraph.format(1) + "/ref[1]", "text", 7)
+        segment, offset = offset_map.locate(extracted.index(" at"))
+        assert (segment.path, segment.part, offset) == (paragraph.format(1) + "/ref[1]", "tail", 0)
+        assert offset_map.locate(extracted.index(" Second")) is None
+        segment, offset = offset_map.locate(extracted.index("Second") + 2)
+        assert (segment.path, offset) == (paragraph.format(2), 2)
+
+    def test_judgment_date_is_read_from_the_work(self):
+        """
+        Given a judgment with dates in its FRBRWork and FRBRManifestation
+        When the text is extracted
+        Then the judgment date is the one in FRBRWork, and the text is unchanged
+        """
+        text = b"""<akomaNtoso xmlns="http://docs.oasis-open.org/legaldocml/ns/akn/3.0"><judgment><meta><identification>
+        <FRBRWork><FRBRdate date="2023-02-13" name="judgment"/></FRBRWork>
+        <FRBRManifestation><FRBRdate date="2023-02-14T09:00:00" name="transform"/></FRBRManifestation>
+        </identification></meta>
+        <paragraph><content><p>First</p></content></paragraph>
+        </judgment></akomaNtoso>"""
+
+        output = io.StringIO()
+        offset_map = extract_text(io.BytesIO(text), output)
+
+        assert output.getvalue() == "First"
+        assert offset_map.judgment_date == "2023-02-13"
+        assert (
+            extract_text(b"<judgment><content><p>First</p></content></judgment>", io.StringIO()).judgment_date is None
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
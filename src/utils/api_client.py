@@ -0,0 +1,48 @@
+"""
+Shared HTTP connection pools for talking to the Find Case Law privileged API.
+
+Creating a new `urllib3.PoolManager` for every request means a new TCP and TLS handshake each time.
+Pools created here live at module scope, so every call made by a warm lambda to the same API endpoint
+reuses the same keep-alive connections.
+"""
+
+import functools
+
+import urllib3
+from urllib3.util.retry import Retry
+
+from utils.custom_types import APIEndpointBaseURL
+
+MAX_CONNECTIONS_PER_ENDPOINT = 10
+
+# Only retry requests that are safe to repeat; PATCHing a judgment is left to the caller.
+RETRY_STRATEGY = Retry(
+    total=3,
+    backoff_factor=0.5,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset({"GET", "PUT", "DELETE"}),
+    raise_on_status=False,
+)
+
+TIMEOUT = urllib3.Timeout(connect=5.0, read=60.0)
+
+
+@functools.cache
+def get_api_pool(api_endpoint: APIEndpointBaseURL) -> urllib3.PoolManager:
+    """
+    Return the keep-alive connection pool for an API endpoint, creating it on first use
+    :param api_endpoint: base URL of the API instance
+    :return: connection pool shared by every request to that endpoint
+    """
+    return urllib3.PoolManager(
+        maxsize=MAX_CONNECTIONS_PER_ENDPOINT,
+        retries=RETRY_STRATEGY,
+        timeout=TIMEOUT,
+    )
+
+
+def api_headers(username: str, pw: str) -> dict[str, str]:
+    """
+    Basic authentication headers for the API
+    """
+    return urllib3.make_headers(basic_auth=username + ":" + pw)
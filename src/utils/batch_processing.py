@@ -0,0 +1,99 @@
+"""
+Run the records of an SQS batch concurrently and report which ones failed.
+
+A handler that raises on its first bad record fails the whole batch, so every record in it gets redelivered.
+`process_batch` instead runs each record on its own, logs how long each one took, and returns the
+`batchItemFailures` response Lambda uses to redeliver only the failed messages. The event source mapping
+must have `function_response_types = ["ReportBatchItemFailures"]` for the response to be honoured.
+"""
+
+import logging
+import os
+import time
+from collections.abc import Callable, Iterable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import takewhile
+from typing import Any, TypedDict
+
+from aws_lambda_powertools.utilities.data_classes.sqs_event import SQSRecord
+
+LOGGER = logging.getLogger()
+
+DEFAULT_MAX_CONCURRENT_RECORDS = 4
+
+
+class BatchItemFailure(TypedDict):
+    itemIdentifier: str
+
+
+class BatchResponse(TypedDict):
+    batchItemFailures: list[BatchItemFailure]
+
+
+def is_test_event(sqs_rec: SQSRecord) -> bool:
+    """
+    Whether the record is the test event S3 sends when a notification is first configured
+    """
+    return "Event" in sqs_rec and sqs_rec["Event"] == "s3:TestEvent"
+
+
+def max_concurrent_records() -> int:
+    """
+    Upper bound on the number of records processed at once, from MAX_CONCURRENT_RECORDS
+    """
+    return max(1, int(os.getenv("MAX_CONCURRENT_RECORDS", DEFAULT_MAX_CONCURRENT_RECORDS)))
+
+
+def _timed_call(process_record: Callable[[SQSRecord], Any], raw_record: dict[str, Any]) -> float:
+    """
+    Process a single record, returning how long it took in seconds.
+    Takes the raw record so it can be sent to a worker process.
+    """
+    start = time.perf_counter()
+    process_record(SQSRecord(raw_record))
+    return time.perf_counter() - start
+
+
+def _make_executor(max_workers: int, use_processes: bool) -> Executor:
+    """
+    Create a process pool for CPU-bound work, falling back to threads where the
+    runtime does not support one (Lambda has no /dev/shm for multiprocessing locks)
+    """
+    if use_processes:
+        try:
+            return ProcessPoolExecutor(max_workers=max_workers)
+        except (OSError, NotImplementedError) as exception:
+            LOGGER.warning("Process pool unavailable, processing records in threads: %s", exception)
+    return ThreadPoolExecutor(max_workers=max_workers)
+
+
+def process_batch(
+    records: Iterable[SQSRecord],
+    process_record: Callable[[SQSRecord], Any],
+    use_processes: bool = False,
+) -> BatchResponse:
+    """
+    Process SQS records concurrently and collect the ones that failed
+    :param records: records from the SQS event
+    :param process_record: function that processes one record, raising if it fails
+    :param use_processes: run records in separate processes, for stages bound by NLP rather than I/O
+    :return: response listing the message ids of failed records
+    """
+    # stop the test notification event from breaking the parsing logic
+    batch = list(takewhile(lambda sqs_rec: not is_test_event(sqs_rec), records))
+    failures: list[BatchItemFailure] = []
+
+    # a single record is not worth the cost of starting worker processes
+    workers = min(max_concurrent_records(), max(len(batch), 1))
+    with _make_executor(workers, use_processes and len(batch) > 1) as executor:
+        futures = [(sqs_rec, executor.submit(_timed_call, process_record, sqs_rec.raw_event)) for sqs_rec in batch]
+
+    for sqs_rec, future in futures:
+        exception = future.exception()
+        if exception is None:
+            LOGGER.info("Processed message %s in %.3fs", sqs_rec.message_id, future.result())
+        else:
+            LOGGER.error("Failed to process message %s", sqs_rec.message_id, exc_info=exception)
+            failures.append({"itemIdentifier": sqs_rec.message_id})
+
+    return {"batchItemFailures": failures}
@@ -2,12 +2,269 @@
 Helper functions for JEP.
 """
 
+import bisect
+import io
 import re
+from collections import Counter
+from collections.abc import Iterator
+from typing import NamedTuple, Protocol
 
-import bs4 as BeautifulSoup
+from lxml import etree
 
 from utils.custom_types import DocumentAsXMLString
 
+CONTENT_ELEMENTS = re.compile(r"(content|intro|wrapUp)")
+ASCII_WHITESPACE = re.compile(r"[ \t\n\r\f]+")
+
+
+class BytesReader(Protocol):
+    """
+    A binary file-like object, such as an open file or the body of an S3 object
+    """
+
+    def read(self, size: int = -1, /) -> bytes: ...
+
+
+class TextWriter(Protocol):
+    """
+    A text file-like object, such as a StringIO or a codecs writer over a binary file
+    """
+
+    def write(self, text: str, /) -> object: ...
+
+
+class TextSegment(NamedTuple):
+    """
+    A run of extracted text and the XML text node it came from
+    """
+
+    start: int
+    """Position of the run in the extracted text"""
+    end: int
+    path: str
+    """Path to the element holding the text node, such as `/akomaNtoso[1]/judgment[1]/.../p[2]`"""
+    part: str
+    """Whether the text node is the element's `text` or its `tail`"""
+    offset: int
+    """Position in the text node where the run starts"""
+
+
+class OffsetMap:
+    """
+    Maps positions in text extracted from a judgment back to the XML text nodes they came from.
+    Positions in the separators between content elements are not mapped.
+    """
+
+    def __init__(self) -> None:
+        self.segments: list[TextSegment] = []
+        self._starts: list[int] = []
+        self.judgment_date: str | None = None
+        """Date of the judgment from its `FRBRWork/FRBRdate`, if the extraction found one"""
+
+    def __len__(self) -> int:
+        return len(self.segments)
+
+    def __iter__(self) -> Iterator[TextSegment]:
+        return iter(self.segments)
+
+    def append(self, segment: TextSegment) -> None:
+        self.segments.append(segment)
+        self._starts.append(segment.start)
+
+    def locate(self, position: int) -> tuple[TextSegment, int] | None:
+        """
+        Find the text node a position in the extracted text came from
+        :returns: the segment holding the position and the position within its text node, or None
+        """
+        index = bisect.bisect_right(self._starts, position) - 1
+        if index < 0:
+            return None
+        segment = self.segments[index]
+        if position >= segment.end:
+            return None
+        return segment, segment.offset + position - segment.start
+
+
+class _TextNode(NamedTuple):
+    path: str
+    part: str
+    text: str
+
+    @classmethod
+    def collapsed(cls, path: str, part: str, text: str) -> "_TextNode":
+        # as BeautifulSoup did, text nodes that are only ASCII whitespace are collapsed to a single newline or space
+        if not ASCII_WHITESPACE.fullmatch(text):
+            return cls(path, part, text)
+        return cls(path, part, "\n" if "\n" in text else " ")
+
+
+def _local_name(element: etree._Element) -> str:
+    return etree.QName(element).localname
+
+
+def _text_nodes(element: etree._Element, path: str) -> Iterator[_TextNode]:
+    """
+    Text nodes within an element in document order, not including the element's own tail
+    """
+    if element.text:
+        yield _TextNode.collapsed(path, "text", element.text)
+    counts: Counter[str] = Counter()
+    for child in element:
+        if isinstance(child.tag, str):
+            name = _local_name(child)
+            counts[name] += 1
+            child_path = f"{path}/{name}[{counts[name]}]"
+            yield from _text_nodes(child, child_path)
+        else:
+            child_path = path
+        if child.tail:
+            yield _TextNode.collapsed(child_path, "tail", child.tail)
+
+
+def _write_element_text(
+    element: etree._Element,
+    path: str,
+    output: TextWriter,
+    position: int,
+    offset_map: OffsetMap,
+) -> int:
+    """
+    Write the stripped text of an element and record where each part of it came from
+    :returns: position in the output after the text
+    """
+    nodes = list(_text_nodes(element, path))
+    text = "".join(node.text for node in nodes)
+    stripped = text.strip()
+    lead = len(text) - len(text.lstrip())
+    trail = lead + len(stripped)
+
+    node_start = 0
+    for node in nodes:
+        node_end = node_start + len(node.text)
+        start, end = max(node_start, lead), min(node_end, trail)
+        if start < end:
+            offset_map.append(
+                TextSegment(position + start - lead, position + end - lead, node.path, node.part, start - node_start),
+            )
+        node_start = node_end
+
+    output.write(stripped)
+    return position + len(stripped)
+
+
+def _work_date(element: etree._Element, name: str, path: list[str]) -> str | None:
+    """
+    The date of an FRBRdate element directly inside FRBRWork, which is the date of the judgment
+    """
+    if name == "FRBRdate" and path and path[-1].startswith("FRBRWork["):
+        return element.get("date")
+    return None
+
+
+def extract_text(source: BytesReader | bytes | str, output: TextWriter) -> OffsetMap:
+    """
+    Stream through an XML judgment writing the text of its content, intro and wrapUp elements to `output`.
+    Only the outermost matching elements are used, so text in nested matches is written once.
+    Each element's text is stripped and separated from the next by a space.
+    :param source: XML document, or a binary file-like object to read it from
+    :param output: text file-like object to write to
+    :returns: map from positions in the text written to the XML text nodes they came from, along with the date of
+        the judgment
+    """
+    if isinstance(source, str):
+        source = source.encode("utf-8")
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+
+    offset_map = OffsetMap()
+    position = 0
+    written_elements = 0
+    path: list[str] = []
+    child_counts: list[Counter[str]] = [Counter()]
+    match_depth = None
+
+    for event, element in etree.iterparse(
+        source,
+        events=("start", "end"),
+        recover=True,
+        huge_tree=True,
+        remove_comments=True,
+        remove_pis=True,
+    ):
+        if event == "start":
+            name = _local_name(element)
+            offset_map.judgment_date = offset_map.judgment_date or _work_date(element, name, path)
+            child_counts[-1][name] += 1
+            path.append(f"{name}[{child_counts[-1][name]}]")
+            child_counts.append(Counter())
+            if match_depth is None and CONTENT_ELEMENTS.search(name):
+                match_depth = len(path)
+            continue
+
+        if match_depth == len(path):
+            if written_elements:
+                output.write(" ")
+                position += 1
+            position = _write_element_text(element, "/" + "/".join(path), output, position, offset_map)
+            written_elements += 1
+            match_depth = None
+
+        if match_depth is None:
+            # nothing outside the element being written is needed again, so free it as we go
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+        path.pop()
+        child_counts.pop()
+
+    return offset_map
+
+
+def _outermost_matches(element: etree._Element, path: str) -> Iterator[tuple[etree._Element, str]]:
+    if CONTENT_ELEMENTS.search(_local_name(element)):
+        yield element, path
+        return
+    counts: Counter[str] = Counter()
+    for child in element:
+        if isinstance(child.tag, str):
+            name = _local_name(child)
+            counts[name] += 1
+            yield from _outermost_matches(child, f"{path}/{name}[{counts[name]}]")
+
+
+def map_tree_text(root: etree._Element) -> tuple[str, OffsetMap]:
+    """
+    Extract text from a parsed judgment in the same way as `extract_text`, for when the tree is going to be edited
+    :returns: the text and the map from positions in it to the XML text nodes they came from
+    """
+    output = io.StringIO()
+    offset_map = OffsetMap()
+    position = 0
+    for index, (element, path) in enumerate(_outermost_matches(root, f"/{_local_name(root)}[1]")):
+        if index:
+            output.write(" ")
+            position += 1
+        position = _write_element_text(element, path, output, position, offset_map)
+    return output.getvalue(), offset_map
+
+
+def element_at(root: etree._Element, path: str) -> etree._Element | None:
+    """
+    Find the element at a path from an offset map
+    """
+    steps = path.strip("/").split("/")
+    if not steps or steps[0] != f"{_local_name(root)}[1]":
+        return None
+    element = root
+    for step in steps[1:]:
+        name, _, index = step.rstrip("]").partition("[")
+        matches = [child for child in element if isinstance(child.tag, str) and _local_name(child) == name]
+        if int(index) > len(matches):
+            return None
+        element = matches[int(index) - 1]
+    return element
+
 
 def parse_file(file_data: DocumentAsXMLString) -> str:
     """
@@ -15,7 +272,6 @@ def parse_file(file_data: DocumentAsXMLString) -> str:
     :param file_data: XML file
     :returns judgement_content_text: all content elements in judgment
     """
-    soup = BeautifulSoup.BeautifulSoup(str(file_data), "xml")
-    judgment_content = soup.find_all(re.compile(r"(content|intro|wrapUp)"))
-    judgment_content_text = " ".join([content.text.strip() for content in judgment_content])
-    return DocumentAsXMLString(judgment_content_text)
+    text = io.StringIO()
+    extract_text(str(file_data), text)
+    return text.getvalue()
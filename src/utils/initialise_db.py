@@ -3,17 +3,23 @@ This module contains functions to initialise db connections
 from environment variables
 """
 
+from typing import TYPE_CHECKING
+
 import psycopg2
-import sqlalchemy
 
 from database.db_connection import create_connection
 from utils.environment_helpers import get_aws_secret, validate_env_variable
 
+if TYPE_CHECKING:
+    import sqlalchemy
+
 
-def init_db_engine() -> sqlalchemy.Engine:
+def init_db_engine() -> "sqlalchemy.Engine":
     """
     Initialise database engine from environment variables
     """
+    import sqlalchemy
+
     database_name = validate_env_variable("DATABASE_NAME")
     username = validate_env_variable("DATABASE_USERNAME")
     host = validate_env_variable("DATABASE_HOSTNAME")
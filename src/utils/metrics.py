@@ -0,0 +1,212 @@
+"""
+Lightweight per-stage instrumentation for the enrichment pipelines.
+
+Each measured stage writes a single line to stdout recording its wall time, CPU time, the peak resident memory of the
+process and, where known, the size of its input, the number of tokens and the number of replacements it produced.
+METRICS_FORMAT chooses the shape of the line:
+
+- ``json`` (default): a plain structured record, easy to query with CloudWatch Logs Insights
+- ``emf``: CloudWatch Embedded Metric Format, which CloudWatch also turns into metrics
+- ``off``: nothing is written
+
+Measured stages are also profiled when ENRICHMENT_PROFILE is set, see `utils.profiling`.
+"""
+
+import functools
+import json
+import os
+import reprlib
+import resource
+import sys
+import time
+from collections.abc import Callable, Iterator, Sized
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, ParamSpec, TypeVar
+
+from utils.profiling import profiled
+
+METRICS_NAMESPACE = "DataEnrichment"
+SUMMARY_LIMIT = 300
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+
+@dataclass
+class StageMetrics:
+    """
+    Measurements for a single run of a stage
+    """
+
+    stage: str
+    input_bytes: int | None = None
+    tokens: int | None = None
+    replacements: int | None = None
+    wall_time_ms: float = 0.0
+    cpu_time_ms: float = 0.0
+    peak_rss_mb: float = 0.0
+    properties: dict[str, Any] = field(default_factory=dict)
+
+    def as_record(self) -> dict[str, Any]:
+        """
+        Flatten the measurements into a single log record, leaving out anything that was not measured
+        """
+        record = {
+            "stage": self.stage,
+            "input_bytes": self.input_bytes,
+            "tokens": self.tokens,
+            "replacements": self.replacements,
+            "wall_time_ms": round(self.wall_time_ms, 3),
+            "cpu_time_ms": round(self.cpu_time_ms, 3),
+            "peak_rss_mb": round(self.peak_rss_mb, 1),
+            **self.properties,
+        }
+        return {key: value for key, value in record.items() if value is not None}
+
+
+EMF_UNITS = {
+    "input_bytes": "Bytes",
+    "tokens": "Count",
+    "replacements": "Count",
+    "wall_time_ms": "Milliseconds",
+    "cpu_time_ms": "Milliseconds",
+    "peak_rss_mb": "Megabytes",
+}
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident set size of this process so far, in megabytes
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def format_metrics(metrics: StageMetrics, metrics_format: str) -> dict[str, Any]:
+    """
+    Build the log record for a stage in the requested format
+    """
+    record = metrics.as_record()
+    if metrics_format != "emf":
+        return {"metrics": record}
+
+    dimensions = ["stage"]
+    if "function" in record:
+        dimensions.append("function")
+    record["_aws"] = {
+        "Timestamp": int(time.time() * 1000),
+        "CloudWatchMetrics": [
+            {
+                "Namespace": METRICS_NAMESPACE,
+                "Dimensions": [dimensions],
+                "Metrics": [{"Name": name, "Unit": unit} for name, unit in EMF_UNITS.items() if name in record],
+            },
+        ],
+    }
+    return record
+
+
+def emit(metrics: StageMetrics) -> None:
+    """
+    Write the metrics for a stage to stdout as a single line
+    """
+    metrics_format = os.getenv("METRICS_FORMAT", "json").lower()
+    if metrics_format == "off":
+        return
+    print(json.dumps(format_metrics(metrics, metrics_format), default=str), flush=True)
+
+
+@contextmanager
+def measure_stage(stage: str, **properties: Any) -> Iterator[StageMetrics]:
+    """
+    Measure the block of code run inside the context and emit the result when it finishes.
+    Sizes and counts can be filled in on the yielded StageMetrics while the block runs.
+    :param stage: name of the stage being measured
+    :param properties: extra values to include in the record, such as the document being processed
+    """
+    function_name = os.getenv("AWS_LAMBDA_FUNCTION_NAME")
+    if function_name:
+        properties.setdefault("function", function_name)
+    metrics = StageMetrics(stage, properties=properties)
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        with profiled(stage, properties.get("judgment")):
+            yield metrics
+    finally:
+        metrics.wall_time_ms = (time.perf_counter() - wall_start) * 1000
+        metrics.cpu_time_ms = (time.thread_time() - cpu_start) * 1000
+        metrics.peak_rss_mb = peak_rss_mb()
+        emit(metrics)
+
+
+def _measure_inputs(metrics: StageMetrics, args: tuple[Any, ...]) -> None:
+    """
+    Record the size of the text and the number of tokens handed to a stage
+    """
+    for arg in args:
+        if isinstance(arg, str) and metrics.input_bytes is None:
+            metrics.input_bytes = len(arg.encode("utf-8"))
+        # spaCy Doc objects carry their text and count their tokens. Doc.text is rebuilt from the tokens on every
+        # access, so it is only read once.
+        elif hasattr(arg, "vocab") and metrics.tokens is None:
+            text = getattr(arg, "text", None)
+            if isinstance(text, str):
+                metrics.tokens = len(arg)
+                metrics.input_bytes = len(text.encode("utf-8"))
+
+
+def _count_replacements(result: Any, args: tuple[Any, ...]) -> int | None:
+    """
+    Stages that find references return them as a list. Stages that apply them return the enriched
+    text, so count the replacements that were passed in instead.
+    """
+    if isinstance(result, list):
+        return len(result)
+    replacement_lists = [arg for arg in args if isinstance(arg, list)]
+    if replacement_lists:
+        return sum(len(replacements) for replacements in replacement_lists)
+    return None
+
+
+def instrument_stage(stage: str) -> Callable[[Callable[P, R]], Callable[P, R]]:
+    """
+    Decorator measuring every call to a pipeline function as a stage
+    :param stage: name of the stage being measured
+    """
+
+    def decorator(func: Callable[P, R]) -> Callable[P, R]:
+        @functools.wraps(func)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            with measure_stage(stage) as metrics:
+                call_args = (*args, *kwargs.values())
+                _measure_inputs(metrics, call_args)
+                result = func(*args, **kwargs)
+                metrics.replacements = _count_replacements(result, call_args)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def summarise(payload: Any, limit: int = SUMMARY_LIMIT) -> str:
+    """
+    Describe a payload for the logs without writing out all of it
+    :param payload: text, bytes or collection to describe
+    :param limit: maximum number of characters of the payload to include
+    :return: size of the payload followed by at most `limit` characters of it
+    """
+    if isinstance(payload, bytes):
+        size, text = f"{len(payload)} bytes", payload[: limit + 1].decode("utf-8", errors="replace")
+    elif isinstance(payload, str):
+        size, text = f"{len(payload)} characters", payload[: limit + 1]
+    elif isinstance(payload, Sized):
+        size, text = f"{len(payload)} items", reprlib.repr(payload)
+    else:
+        size, text = type(payload).__name__, reprlib.repr(payload)
+    if len(text) > limit:
+        text = text[:limit] + "..."
+    return f"<{size}> {text}"
@@ -0,0 +1,257 @@
+"""
+Opt-in profiling of handlers and pipeline stages.
+
+Profiling is off unless ENRICHMENT_PROFILE is set to where profiles should go, either a local directory or an
+``s3://bucket/prefix`` location. ENRICHMENT_PROFILE_SAMPLE_RATE=N profiles roughly one in every N invocations.
+Each profile is written as a ``.pstats`` file, for snakeviz, gprof2dot or flameprof, along with a plain text summary
+of the most expensive calls, under a folder named after the judgment being processed.
+
+Stages can be profiled offline against a local file, for example::
+
+    python -m utils.profiling run replacements src/tests/fixtures/ewhc-ch-2023-257_original.xml \\
+        --replacements src/tests/fixtures/ewhc-ch-2023-257_replacements.txt --output profiles
+    python -m utils.profiling show profiles/ewhc-ch-2023-257_original.xml/replacements-*.pstats
+"""
+
+import argparse
+import cProfile
+import datetime as dt
+import functools
+import io
+import logging
+import os
+import pstats
+import random
+import re
+import tempfile
+import threading
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, ParamSpec, TypeVar
+
+from utils.custom_types import DocumentAsXMLString
+
+LOGGER = logging.getLogger()
+
+PROFILE_TARGET_ENV = "ENRICHMENT_PROFILE"
+PROFILE_SAMPLE_RATE_ENV = "ENRICHMENT_PROFILE_SAMPLE_RATE"
+SUMMARY_LINES = 40
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+# Only one profiler can be attached to the interpreter at a time
+_PROFILER_LOCK = threading.Lock()
+# Set inside a profiled() block so that nested stages are covered by the outer profile
+_IN_PROFILED_BLOCK: ContextVar[bool] = ContextVar("in_profiled_block", default=False)
+
+
+@dataclass
+class ProfileRun:
+    """
+    Where the profile of a stage was written, if it was profiled at all
+    """
+
+    stage: str
+    key: str
+    location: str | None = None
+
+
+def profile_target() -> str | None:
+    """
+    Local directory or s3:// location profiles should be written to, or None when profiling is off
+    """
+    return os.getenv(PROFILE_TARGET_ENV) or None
+
+
+def should_sample() -> bool:
+    """
+    Decide whether this invocation is one of the 1 in N that get profiled
+    """
+    sample_rate = int(os.getenv(PROFILE_SAMPLE_RATE_ENV, "1"))
+    return sample_rate <= 1 or random.randrange(sample_rate) == 0  # noqa: S311
+
+
+def safe_key(key: str) -> str:
+    """
+    Turn a judgment URI or S3 key into a single path segment
+    """
+    return re.sub(r"[^\w.-]+", "-", key.replace("/", "-")).strip("-.") or "unknown"
+
+
+def record_key(record: Any) -> str:
+    """
+    Name the judgment carried by an SQS or S3 event record, falling back to the message id
+    """
+    raw = getattr(record, "raw_event", record)
+    if not isinstance(raw, dict):
+        return "unknown"
+    source_key = raw.get("messageAttributes", {}).get("source_key", {}).get("stringValue")
+    s3_key = raw.get("s3", {}).get("object", {}).get("key")
+    return source_key or s3_key or raw.get("messageId") or "unknown"
+
+
+def summarise_profile(stats: pstats.Stats, limit: int = SUMMARY_LINES, sort: str = "cumulative") -> str:
+    """
+    Text listing of the most expensive calls in a profile
+    """
+    stream = io.StringIO()
+    stats.stream = stream  # type: ignore[attr-defined]
+    stats.sort_stats(sort).print_stats(limit)
+    return stream.getvalue()
+
+
+def write_profile(profiler: cProfile.Profile, target: str, stage: str, key: str) -> str:
+    """
+    Write a profile and its text summary to a local directory or S3
+    :return: location of the .pstats file
+    """
+    timestamp = dt.datetime.now(tz=dt.UTC).strftime("%Y%m%dT%H%M%S%f")
+    name = f"{safe_key(key)}/{stage}-{timestamp}-{os.getpid()}"
+    summary = summarise_profile(pstats.Stats(profiler))
+
+    if target.startswith("s3://"):
+        import boto3
+
+        bucket, _, prefix = target.removeprefix("s3://").partition("/")
+        s3_key = f"{prefix.rstrip('/')}/{name}" if prefix else name
+        s3_client = boto3.client("s3")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            stats_path = os.path.join(tmp_dir, "profile.pstats")
+            profiler.dump_stats(stats_path)
+            s3_client.upload_file(stats_path, bucket, f"{s3_key}.pstats")
+        s3_client.put_object(Bucket=bucket, Key=f"{s3_key}.txt", Body=summary.encode("utf-8"))
+        return f"s3://{bucket}/{s3_key}.pstats"
+
+    stats_path = os.path.join(target, f"{name}.pstats")
+    os.makedirs(os.path.dirname(stats_path), exist_ok=True)
+    profiler.dump_stats(stats_path)
+    with open(os.path.join(target, f"{name}.txt"), "w", encoding="utf-8") as summary_file:
+        summary_file.write(summary)
+    return stats_path
+
+
+@contextmanager
+def profiled(stage: str, key: str | None = None) -> Iterator[ProfileRun]:
+    """
+    Profile the block of code run inside the context, if profiling is switched on and this invocation is sampled.
+    Stages nested inside a profiled block are covered by the outer profile rather than profiled again.
+    :param stage: name of the stage being profiled
+    :param key: judgment URI or S3 key the profile is filed under
+    """
+    run = ProfileRun(stage, key or stage)
+    target = profile_target()
+    if target is None or _IN_PROFILED_BLOCK.get():
+        yield run
+        return
+
+    token = _IN_PROFILED_BLOCK.set(True)
+    try:
+        if not should_sample() or not _PROFILER_LOCK.acquire(blocking=False):
+            yield run
+            return
+        try:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield run
+            finally:
+                profiler.disable()
+                try:
+                    run.location = write_profile(profiler, target, stage, run.key)
+                    LOGGER.info("Wrote %s profile for %s to %s", stage, run.key, run.location)
+                except Exception as exception:  # noqa: BLE001 -- a failed write must not fail the judgment
+                    LOGGER.warning("Could not write %s profile for %s: %s", stage, run.key, exception)
+        finally:
+            _PROFILER_LOCK.release()
+    finally:
+        _IN_PROFILED_BLOCK.reset(token)
+
+
+def profile_record(stage: str) -> Callable[[Callable[P, R]], Callable[P, R]]:
+    """
+    Decorator profiling a handler's process_event, filing the profile under the judgment in the event record
+    :param stage: name of the stage being profiled
+    """
+
+    def decorator(func: Callable[P, R]) -> Callable[P, R]:
+        @functools.wraps(func)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            with profiled(stage, record_key(args[0]) if args else None):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+############################################
+# COMMAND LINE
+############################################
+
+
+def _run_stage(stage: str, xml_path: str, replacements_path: str | None) -> None:
+    """
+    Run one of the stages that need neither a database nor a trained model against a local file
+    """
+    with open(xml_path, encoding="utf-8") as xml_file:
+        file_content = DocumentAsXMLString(xml_file.read())
+
+    if stage == "replacements":
+        from replacer.make_replacments import make_post_header_replacements
+
+        if replacements_path is None:
+            msg = "The replacements stage needs --replacements"
+            raise SystemExit(msg)
+        with open(replacements_path, "rb") as replacements_file:
+            make_post_header_replacements(file_content, replacements_file.read())
+    elif stage == "provisions":
+        from legislation_provisions_extraction.legislation_provisions import provisions_pipeline
+
+        provisions_pipeline(file_content)
+    elif stage == "oblique":
+        from oblique_references.enrich_oblique_references import enrich_oblique_references
+
+        enrich_oblique_references(file_content)
+    elif stage == "abbreviations":
+        import spacy
+
+        from abbreviation_extraction.abbreviations_matcher import abb_pipeline
+        from utils.helper import parse_file
+
+        nlp = spacy.blank("en")
+        nlp.max_length = 2500000
+        abb_pipeline(parse_file(file_content), nlp)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m utils.profiling", description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="profile a stage against a local judgment")
+    run_parser.add_argument("stage", choices=["replacements", "provisions", "oblique", "abbreviations"])
+    run_parser.add_argument("xml", help="path to the judgment XML")
+    run_parser.add_argument("--replacements", help="path to a replacements file, for the replacements stage")
+    run_parser.add_argument("--output", default="profiles", help="directory or s3:// location for the profile")
+
+    show_parser = commands.add_parser("show", help="print the most expensive calls in a saved profile")
+    show_parser.add_argument("pstats", nargs="+", help="path to one or more .pstats files")
+    show_parser.add_argument("--limit", type=int, default=SUMMARY_LINES)
+    show_parser.add_argument("--sort", default="cumulative", help="pstats sort key, for example tottime")
+
+    args = parser.parse_args(argv)
+    if args.command == "show":
+        print(summarise_profile(pstats.Stats(*args.pstats), args.limit, args.sort))
+        return
+
+    os.environ[PROFILE_TARGET_ENV] = args.output
+    os.environ[PROFILE_SAMPLE_RATE_ENV] = "1"
+    with profiled(args.stage, os.path.basename(args.xml)) as run:
+        _run_stage(args.stage, args.xml, args.replacements)
+    print(run.location)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,13 @@ namespaces = {
     "uk": "https://caselaw.nationalarchives.gov.uk/akn",
 }
 
+# a fragment cut from a judgment can use the namespaces declared on the judgment's root
+FRAGMENT_START = (
+    '<fragment xmlns="http://docs.oasis-open.org/legaldocml/ns/akn/3.0" '
+    'xmlns:uk="https://caselaw.nationalarchives.gov.uk/akn">'
+)
+FRAGMENT_END = "</fragment>"
+
 XSLT_TEMPLATE = """
 <xsl:stylesheet xmlns:xsl="http://www.w3.org/1999/XSL/Transform" version="1.0"
   xmlns:uk="https://caselaw.nationalarchives.gov.uk/akn">
@@ -41,13 +48,21 @@ def replace_string_with_tag(xml: XMLFragmentAsString, string: str, tag: str) ->
     Replace citations in running text, but not in XML attributes
     This is probably quite inefficient, being called once per replacement! But we can make it better later
     """
-    root = lxml.etree.fromstring(xml)
+    try:
+        root = lxml.etree.fromstring(xml)
+        wrapped = False
+    except lxml.etree.XMLSyntaxError:
+        # declare the judgment's namespaces around the fragment, so they are not declared again inside it
+        root = lxml.etree.fromstring(FRAGMENT_START + xml + FRAGMENT_END)
+        wrapped = True
     # DRAGON: this currently isn't working but stops it crashing
     sanitised_string = xml_escape(string, entities={"'": "&amp;apos;", '"': "&amp;quot;"})
     stylesheet = lxml.etree.XML(XSLT_TEMPLATE.format(replaced_string=sanitised_string, replacement_tag=tag))
     transformer = lxml.etree.XSLT(stylesheet)
-    output = lxml.etree.tostring(transformer(root))
-    return XMLFragmentAsString(output.decode("utf-8"))
+    output = lxml.etree.tostring(transformer(root)).decode("utf-8")
+    if wrapped:
+        output = output.partition(">")[2].removesuffix(FRAGMENT_END)
+    return XMLFragmentAsString(output)
 
 
 def expand_namespace(namespaced_name: str) -> str:
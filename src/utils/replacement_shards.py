@@ -0,0 +1,117 @@
+"""
+Per-stage shards of the replacements for a judgment.
+
+Each detection stage writes its replacements to its own object under the judgment's key in the replacements bucket,
+so the stages can run at the same time without reading and rewriting each other's output. Replacements containers
+can be concatenated, so the shards are read in parallel and joined in stage order for the replacer.
+
+The stage that finds every shard written starts the replacer. Two stages finishing together can both find every shard,
+so the one that starts the replacer is the one that first writes a marker alongside the shards.
+"""
+
+import logging
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+import boto3
+from botocore.exceptions import ClientError
+
+if TYPE_CHECKING:
+    from mypy_boto3_s3.client import S3Client
+
+LOGGER = logging.getLogger()
+
+SHARD_KINDS = ("case", "leg", "abb")
+"""The kinds of replacement written by each detection stage, in the order they are applied"""
+
+DONE_MARKER = "done"
+"""Written alongside the shards by the stage that starts the replacer"""
+
+
+def shard_key(replacements_key: str, kind: str) -> str:
+    """
+    Key of the shard holding one kind of replacement for a judgment
+    """
+    return f"{replacements_key}/{kind}"
+
+
+def upload_shard(replacements_bucket: str, replacements_key: str, kind: str, replacements: bytes) -> str:
+    """
+    Upload one stage's replacements for a judgment, replacing any it wrote before
+    :return: key of the shard
+    """
+    key = shard_key(replacements_key, kind)
+    LOGGER.info("Uploading %s replacements to %s/%s", kind, replacements_bucket, key)
+    boto3.client("s3").put_object(Bucket=replacements_bucket, Key=key, Body=replacements)
+    return key
+
+
+def mark_shards_done(replacements_bucket: str, replacements_key: str) -> bool:
+    """
+    Write the marker that every shard for a judgment has been written, unless another stage already has
+    :return: whether this call wrote the marker, and so should start the replacer
+    """
+    key = shard_key(replacements_key, DONE_MARKER)
+    try:
+        boto3.client("s3").put_object(Bucket=replacements_bucket, Key=key, Body=b"", IfNoneMatch="*")
+    except ClientError as error:
+        # a conflict means another stage's write of the marker is in flight, and that one will win
+        if error.response["Error"]["Code"] in ("PreconditionFailed", "ConditionalRequestConflict"):
+            LOGGER.info("%s/%s has already been written", replacements_bucket, key)
+            return False
+        raise
+    return True
+
+
+def clear_shards(replacements_bucket: str, replacements_key: str, kinds: Iterable[str] = SHARD_KINDS) -> None:
+    """
+    Delete the shards and marker left by an earlier enrichment of a judgment, so they are not mistaken for this one's
+    """
+    keys = [shard_key(replacements_key, kind) for kind in [*kinds, DONE_MARKER]]
+    boto3.client("s3").delete_objects(
+        Bucket=replacements_bucket,
+        Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True},
+    )
+
+
+def missing_shards(
+    replacements_bucket: str,
+    replacements_key: str,
+    kinds: Iterable[str] = SHARD_KINDS,
+    s3_client: "S3Client | None" = None,
+) -> list[str]:
+    """
+    The kinds of replacement that have not yet been written for a judgment
+    """
+    s3_client = s3_client or boto3.client("s3")
+    prefix = shard_key(replacements_key, "")
+    written: set[str] = set()
+    for page in s3_client.get_paginator("list_objects_v2").paginate(Bucket=replacements_bucket, Prefix=prefix):
+        written.update(item["Key"].removeprefix(prefix) for item in page.get("Contents", []))
+    return [kind for kind in kinds if kind not in written]
+
+
+def read_shards(
+    replacements_bucket: str,
+    replacements_key: str,
+    kinds: Iterable[str] = SHARD_KINDS,
+    s3_client: "S3Client | None" = None,
+) -> bytes:
+    """
+    Fetch the shards for a judgment in parallel and join them in stage order.
+    Shards that have not been written are left out.
+    """
+    s3_client = s3_client or boto3.client("s3")
+    kinds = list(kinds)
+
+    def fetch(kind: str) -> bytes:
+        try:
+            shard = s3_client.get_object(Bucket=replacements_bucket, Key=shard_key(replacements_key, kind))
+        except s3_client.exceptions.NoSuchKey:
+            LOGGER.warning("No %s replacements for %s", kind, replacements_key)
+            return b""
+        return shard["Body"].read()
+
+    with ThreadPoolExecutor(max_workers=len(kinds) or 1) as executor:
+        return b"".join(executor.map(fetch, kinds))
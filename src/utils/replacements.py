@@ -0,0 +1,193 @@
+"""
+Reading and writing the replacements files passed between the enrichment stages.
+
+Replacements are stored in a versioned msgpack container. A container is a sequence of blocks, each starting with a
+header record of the format name and version, followed by one record per detection of its kind, its values in the
+order given by that kind's schema, and the span of [offset, length] where it was found in the text extracted from the
+judgment, if known. Blocks can be concatenated, so the containers written by each stage are joined without decoding
+them, and records are decoded one at a time as the container is read.
+
+Older files are JSON lines, with each detection keyed by its kind. These are still read, and can still be written.
+"""
+
+import io
+import itertools
+import json
+from collections.abc import Iterable, Iterator
+from typing import IO, Any, NamedTuple
+
+import msgpack
+
+from utils.custom_types import Replacement
+
+SPAN_KEY = "span"
+
+CONTAINER_FORMAT = "tna-replacements"
+CONTAINER_VERSION = 1
+READ_CHUNK_SIZE = 64 * 1024
+
+SCHEMAS: dict[str, tuple[str, ...]] = {
+    "case": ("citation_match", "corrected_citation", "year", "URI", "is_neutral"),
+    "leg": ("detected_ref", "href", "canonical"),
+    "abb": ("abb_match", "longform"),
+    "oblique": ("detected_ref", "ref_position", "ref_para", "ref_tag"),
+    "provision": ("detected_ref", "ref_position", "ref_para", "ref_tag"),
+}
+"""The values stored for each kind of replacement, in order"""
+
+
+class ReplacementLine(NamedTuple):
+    replacement_type: str
+    replacement: Replacement
+    span: tuple[int, int] | None = None
+
+
+def _fields(replacement: Any, kind: str | None) -> tuple[str, list[Any], Any]:
+    """
+    Split a detection into its kind, its values in schema order and its span
+    :param replacement: named tuple of a detection, or a dictionary of one, which needs its kind given
+    """
+    if isinstance(replacement, dict):
+        fields = dict(replacement)
+        if kind is None:
+            msg = "The kind of a replacement given as a dictionary must be given"
+            raise ValueError(msg)
+    else:
+        fields = replacement._asdict()
+        kind = kind or type(replacement).__name__
+    span = fields.pop(SPAN_KEY, None)
+
+    schema = SCHEMAS.get(kind)
+    if schema is None:
+        msg = f"Unknown replacement kind {kind!r}"
+        raise ValueError(msg)
+    if len(fields) != len(schema):
+        msg = f"A {kind} replacement has {len(schema)} values, got {len(fields)}"
+        raise ValueError(msg)
+    values = [fields[name] for name in schema] if isinstance(replacement, dict) else list(fields.values())
+    return kind, values, span
+
+
+class ReplacementWriter:
+    """
+    Writes detections to a binary stream as one block of a replacements container.
+    Opening a file in append mode adds a block to the container already in it.
+    """
+
+    def __init__(self, stream: IO[bytes]) -> None:
+        self._stream = stream
+        self._packer = msgpack.Packer()
+        self._stream.write(self._packer.pack([CONTAINER_FORMAT, CONTAINER_VERSION]))
+
+    def write(self, replacement: Any, kind: str | None = None) -> None:
+        kind, values, span = _fields(replacement, kind)
+        self._stream.write(self._packer.pack([kind, values, list(span) if span is not None else None]))
+
+    def write_line(self, line: ReplacementLine) -> None:
+        """
+        Write a detection that has been read from another file
+        """
+        span = list(line.span) if line.span is not None else None
+        self._stream.write(self._packer.pack([line.replacement_type, list(line.replacement), span]))
+
+    def write_all(self, replacements: Iterable[Any], kind: str | None = None) -> None:
+        for replacement in replacements:
+            self.write(replacement, kind)
+
+
+def encode_replacements(replacements: Iterable[Any], kind: str | None = None) -> bytes:
+    """
+    Encode detections as a block of a replacements container
+    :param replacements: named tuples of detections, or dictionaries of detections of the given kind
+    """
+    encoded = io.BytesIO()
+    ReplacementWriter(encoded).write_all(replacements, kind)
+    return encoded.getvalue()
+
+
+def write_replacements_file(replacement_list: list[Any]) -> str:
+    """
+    Writes named tuples of detections as lines of JSON, moving any `span` field out of the tuple's values
+    :param replacement_list: named tuples of detections
+    :return: tuple json file
+    """
+    lines = []
+    for replacement in replacement_list:
+        fields = replacement._asdict()
+        span = fields.pop(SPAN_KEY, None)
+        replacement_object: dict[str, Any] = {type(replacement).__name__: list(fields.values())}
+        if span is not None:
+            replacement_object[SPAN_KEY] = list(span)
+        lines.append(json.dumps(replacement_object) + "\n")
+    return "".join(lines)
+
+
+def _chunks(source: bytes | str | IO[bytes]) -> Iterator[bytes]:
+    if isinstance(source, str):
+        source = source.encode("utf-8")
+    if isinstance(source, bytes):
+        yield source
+        return
+    yield from iter(lambda: source.read(READ_CHUNK_SIZE), b"")
+
+
+def _is_json_lines(first_chunk: bytes) -> bool:
+    return first_chunk.lstrip()[:1] == b"{"
+
+
+def _span(span: Any) -> tuple[int, int] | None:
+    return (int(span[0]), int(span[1])) if span else None
+
+
+def _read_json_lines(chunks: Iterable[bytes]) -> Iterator[ReplacementLine]:
+    buffered = b""
+    for chunk in itertools.chain(chunks, [b"\n"]):
+        *lines, buffered = (buffered + chunk).split(b"\n")
+        for replacement_json in lines:
+            if not replacement_json.strip():
+                continue
+            replacement_dict = json.loads(replacement_json)
+            span = replacement_dict.pop(SPAN_KEY, None)
+            replacement_type, replacement_values = next(iter(replacement_dict.items()))
+            yield ReplacementLine(replacement_type, Replacement(tuple(replacement_values)), _span(span))
+
+
+def _read_container(chunks: Iterable[bytes]) -> Iterator[ReplacementLine]:
+    unpacker = msgpack.Unpacker(raw=False)
+    version = None
+    for chunk in chunks:
+        unpacker.feed(chunk)
+        for record in unpacker:
+            if record[0] == CONTAINER_FORMAT:
+                version = record[1]
+                if version != CONTAINER_VERSION:
+                    msg = f"Unsupported replacements container version {version}"
+                    raise ValueError(msg)
+            elif version is None:
+                msg = "Replacements container does not start with a header"
+                raise ValueError(msg)
+            else:
+                kind, values, span = record
+                yield ReplacementLine(kind, Replacement(tuple(values)), _span(span))
+
+
+def iter_replacements(source: bytes | str | IO[bytes]) -> Iterator[ReplacementLine]:
+    """
+    Read detections one at a time from a replacements container or a JSON lines file
+    :param source: the file's content, or a binary file-like object to stream it from
+    """
+    chunks = _chunks(source)
+    # only JSON lines files can start with whitespace, which can be skipped
+    first_chunk = next((chunk for chunk in chunks if chunk.strip()), b"")
+    all_chunks = itertools.chain([first_chunk], chunks)
+    if _is_json_lines(first_chunk):
+        yield from _read_json_lines(all_chunks)
+    elif first_chunk:
+        yield from _read_container(all_chunks)
+
+
+def read_replacements_file(replacements_content: bytes | str | IO[bytes]) -> list[ReplacementLine]:
+    """
+    Reads the detections in a replacements container or JSON lines file
+    """
+    return list(iter_replacements(replacements_content))
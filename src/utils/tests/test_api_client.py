@@ -0,0 +1,46 @@
+"""Unit tests for api_client"""
+
+from utils.api_client import RETRY_STRATEGY, api_headers, get_api_pool
+from utils.custom_types import APIEndpointBaseURL
+
+
+class TestGetApiPool:
+    def test_pool_is_shared_per_endpoint(self):
+        """
+        Given the same API endpoint
+        When get_api_pool is called more than once
+        Then the same connection pool should be returned each time
+        """
+        endpoint = APIEndpointBaseURL("https://api.example.com/")
+        assert get_api_pool(endpoint) is get_api_pool(endpoint)
+
+    def test_pool_is_separate_per_endpoint(self):
+        """
+        Given two different API endpoints
+        When get_api_pool is called for each
+        Then each endpoint should get its own connection pool
+        """
+        staging = get_api_pool(APIEndpointBaseURL("https://api.staging.example.com/"))
+        production = get_api_pool(APIEndpointBaseURL("https://api.example.com/"))
+        assert staging is not production
+
+    def test_pool_retries_idempotent_requests(self):
+        """
+        Given a connection pool for an API endpoint
+        When it is configured
+        Then it should retry GET, PUT and DELETE but not PATCH
+        """
+        pool = get_api_pool(APIEndpointBaseURL("https://api.example.com/"))
+        assert pool.connection_pool_kw["retries"] is RETRY_STRATEGY
+        assert RETRY_STRATEGY.is_retry("GET", 503)
+        assert RETRY_STRATEGY.is_retry("PUT", 503)
+        assert not RETRY_STRATEGY.is_retry("PATCH", 503)
+
+
+def test_api_headers():
+    """
+    Given a username and password
+    When api_headers is called
+    Then a basic authentication header should be returned
+    """
+    assert api_headers("user", "pass") == {"authorization": "Basic dXNlcjpwYXNz"}
@@ -0,0 +1,71 @@
+"""Unit tests for batch_processing"""
+
+import json
+from unittest.mock import patch
+
+from aws_lambda_powertools.utilities.data_classes.sqs_event import SQSRecord
+
+from utils.batch_processing import is_test_event, process_batch
+
+
+def make_record(message_id, body):
+    return SQSRecord({"messageId": message_id, "body": json.dumps(body), "messageAttributes": {}})
+
+
+def process_record(sqs_rec):
+    if json.loads(sqs_rec.body).get("fail"):
+        msg = "Could not process record"
+        raise ValueError(msg)
+
+
+class TestProcessBatch:
+    def test_all_records_succeed(self):
+        """
+        Given a batch of records that all process successfully
+        When process_batch is called
+        Then no batch item failures should be reported
+        """
+        records = [make_record(str(i), {}) for i in range(5)]
+        assert process_batch(records, process_record) == {"batchItemFailures": []}
+
+    def test_only_failed_records_are_reported(self):
+        """
+        Given a batch of records where some fail
+        When process_batch is called
+        Then only the failed records should be reported, and the others should still be processed
+        """
+        processed = []
+
+        def record_and_process(sqs_rec):
+            process_record(sqs_rec)
+            processed.append(sqs_rec.message_id)
+
+        records = [make_record("1", {}), make_record("2", {"fail": True}), make_record("3", {})]
+        response = process_batch(records, record_and_process)
+        assert response == {"batchItemFailures": [{"itemIdentifier": "2"}]}
+        assert sorted(processed) == ["1", "3"]
+
+    def test_stops_at_s3_test_event(self):
+        """
+        Given a batch containing the S3 test notification
+        When process_batch is called
+        Then records from the test event onwards should not be processed
+        """
+        processed = []
+        test_event = SQSRecord({"messageId": "2", "Event": "s3:TestEvent"})
+        records = [make_record("1", {}), test_event, make_record("3", {})]
+        assert is_test_event(test_event)
+        process_batch(records, lambda sqs_rec: processed.append(sqs_rec.message_id))
+        assert processed == ["1"]
+
+    @patch("utils.batch_processing.ProcessPoolExecutor", side_effect=OSError("Function not implemented"))
+    def test_falls_back_to_threads_without_process_pool(self, mock_process_pool):
+        """
+        Given a runtime that cannot create a process pool
+        When process_batch is asked to use processes
+        Then the records should be processed in threads instead
+        """
+        records = [make_record("1", {}), make_record("2", {"fail": True})]
+        response = process_batch(records, process_record, use_processes=True)
+        mock_process_pool.assert_called_once()
+        assert response == {"batchItemFailures": [{"itemIdentifier": "2"}]}
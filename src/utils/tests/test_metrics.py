@@ -0,0 +1,118 @@
+"""Unit tests for metrics"""
+
+import json
+
+from utils.metrics import instrument_stage, measure_stage, summarise
+
+
+def read_record(capsys):
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 1
+    return json.loads(lines[0])
+
+
+class TestMeasureStage:
+    def test_json_record(self, capsys, monkeypatch):
+        """
+        Given the default metrics format
+        When a stage is measured
+        Then a single JSON record with its timings and sizes should be written
+        """
+        monkeypatch.delenv("METRICS_FORMAT", raising=False)
+        with measure_stage("fetch", judgment="uksc/2023/1") as metrics:
+            metrics.input_bytes = 42
+        record = read_record(capsys)["metrics"]
+        assert record["stage"] == "fetch"
+        assert record["judgment"] == "uksc/2023/1"
+        assert record["input_bytes"] == 42
+        assert record["wall_time_ms"] >= 0
+        assert record["cpu_time_ms"] >= 0
+        assert record["peak_rss_mb"] > 0
+        assert "tokens" not in record
+
+    def test_emf_record(self, capsys, monkeypatch):
+        """
+        Given the EMF metrics format
+        When a stage is measured
+        Then the record should declare its metrics for CloudWatch
+        """
+        monkeypatch.setenv("METRICS_FORMAT", "emf")
+        with measure_stage("fetch") as metrics:
+            metrics.replacements = 3
+        record = read_record(capsys)
+        assert record["replacements"] == 3
+        declaration = record["_aws"]["CloudWatchMetrics"][0]
+        assert declaration["Dimensions"] == [["stage"]]
+        assert {"Name": "replacements", "Unit": "Count"} in declaration["Metrics"]
+
+    def test_metrics_off(self, capsys, monkeypatch):
+        """
+        Given metrics are turned off
+        When a stage is measured
+        Then nothing should be written
+        """
+        monkeypatch.setenv("METRICS_FORMAT", "off")
+        with measure_stage("fetch"):
+            pass
+        assert capsys.readouterr().out == ""
+
+
+class TestInstrumentStage:
+    def test_counts_input_and_returned_replacements(self, capsys, monkeypatch):
+        """
+        Given a pipeline that returns a list of replacements
+        When it is decorated with instrument_stage
+        Then the size of its input and the number of replacements should be recorded
+        """
+        monkeypatch.delenv("METRICS_FORMAT", raising=False)
+
+        @instrument_stage("abbreviations")
+        def pipeline(text):
+            return text.split()
+
+        assert pipeline("one two three") == ["one", "two", "three"]
+        record = read_record(capsys)["metrics"]
+        assert record["stage"] == "abbreviations"
+        assert record["input_bytes"] == 13
+        assert record["replacements"] == 3
+
+    def test_counts_replacements_applied(self, capsys, monkeypatch):
+        """
+        Given a pipeline that applies lists of replacements to text
+        When it is decorated with instrument_stage
+        Then the number of replacements passed in should be recorded
+        """
+        monkeypatch.delenv("METRICS_FORMAT", raising=False)
+
+        @instrument_stage("replacer")
+        def pipeline(text, first, second):
+            return text
+
+        pipeline("text", [1, 2], [3])
+        assert read_record(capsys)["metrics"]["replacements"] == 3
+
+
+class TestSummarise:
+    def test_long_text_is_truncated(self):
+        """
+        Given a payload longer than the limit
+        When it is summarised
+        Then only the start of it should be kept, along with its full size
+        """
+        assert summarise(b"x" * 1000, limit=5) == "<1000 bytes> xxxxx..."
+
+    def test_short_text_is_kept(self):
+        """
+        Given a payload shorter than the limit
+        When it is summarised
+        Then all of it should be kept
+        """
+        assert summarise("abc") == "<3 characters> abc"
+
+    def test_collection(self):
+        """
+        Given a long list
+        When it is summarised
+        Then its length and first few items should be given
+        """
+        assert summarise(list(range(100))) == "<100 items> [0, 1, 2, 3, 4, 5, ...]"
@@ -0,0 +1,113 @@
+"""Unit tests for profiling"""
+
+import pstats
+from pathlib import Path
+from unittest.mock import patch
+
+from aws_lambda_powertools.utilities.data_classes.sqs_event import SQSRecord
+
+from utils.profiling import main, profile_record, profiled, record_key
+
+FIXTURE_DIR = Path(__file__).parent.parent.parent.resolve() / "tests" / "fixtures"
+
+
+def busy_work():
+    return sum(i * i for i in range(1000))
+
+
+class TestProfiled:
+    def test_off_by_default(self, tmp_path, monkeypatch):
+        """
+        Given ENRICHMENT_PROFILE is not set
+        When a stage runs inside profiled
+        Then no profile should be written
+        """
+        monkeypatch.delenv("ENRICHMENT_PROFILE", raising=False)
+        with profiled("stage", "uksc/2023/1") as run:
+            busy_work()
+        assert run.location is None
+
+    def test_writes_profile_keyed_by_judgment(self, tmp_path, monkeypatch):
+        """
+        Given ENRICHMENT_PROFILE is set to a local directory
+        When a stage runs inside profiled
+        Then a .pstats profile and a text summary should be written under the judgment
+        """
+        monkeypatch.setenv("ENRICHMENT_PROFILE", str(tmp_path))
+        monkeypatch.delenv("ENRICHMENT_PROFILE_SAMPLE_RATE", raising=False)
+        with profiled("stage", "uksc/2023/1") as run:
+            busy_work()
+        location = Path(run.location)
+        assert location.parent == tmp_path / "uksc-2023-1"
+        assert location.suffix == ".pstats"
+        assert pstats.Stats(str(location)).total_calls > 0
+        assert "busy_work" in location.with_suffix(".txt").read_text()
+
+    def test_nested_stages_share_one_profile(self, tmp_path, monkeypatch):
+        """
+        Given a profiled stage running inside another
+        When both finish
+        Then only the outer stage should write a profile
+        """
+        monkeypatch.setenv("ENRICHMENT_PROFILE", str(tmp_path))
+        with profiled("outer", "judgment") as outer, profiled("inner", "judgment") as inner:
+            busy_work()
+        assert outer.location is not None
+        assert inner.location is None
+        assert len(list(tmp_path.rglob("*.pstats"))) == 1
+
+    @patch("utils.profiling.random.randrange", return_value=1)
+    def test_sampling_skips_invocations(self, mock_randrange, tmp_path, monkeypatch):
+        """
+        Given a sample rate of 1 in 10
+        When the invocation is not picked
+        Then no profile should be written
+        """
+        monkeypatch.setenv("ENRICHMENT_PROFILE", str(tmp_path))
+        monkeypatch.setenv("ENRICHMENT_PROFILE_SAMPLE_RATE", "10")
+        with profiled("stage", "judgment") as run:
+            busy_work()
+        mock_randrange.assert_called_once_with(10)
+        assert run.location is None
+
+
+def test_profile_record_uses_source_key(tmp_path, monkeypatch):
+    """
+    Given a process_event function decorated with profile_record
+    When it is called with an SQS record
+    Then the profile should be filed under the record's source key
+    """
+    monkeypatch.setenv("ENRICHMENT_PROFILE", str(tmp_path))
+    record = SQSRecord(
+        {"messageId": "1", "body": "{}", "messageAttributes": {"source_key": {"stringValue": "ewhc/ch/2023/257.txt"}}},
+    )
+    assert record_key(record) == "ewhc/ch/2023/257.txt"
+
+    @profile_record("lambda")
+    def process_event(sqs_rec):
+        busy_work()
+
+    process_event(record)
+    assert len(list((tmp_path / "ewhc-ch-2023-257.txt").glob("lambda-*.pstats"))) == 1
+
+
+def test_command_line_profiles_fixture(tmp_path, capsys):
+    """
+    Given a fixture judgment and its replacements
+    When the replacements stage is profiled from the command line
+    Then the location of the profile should be printed
+    """
+    main(
+        [
+            "run",
+            "replacements",
+            str(FIXTURE_DIR / "ewhc-ch-2023-257_original.xml"),
+            "--replacements",
+            str(FIXTURE_DIR / "ewhc-ch-2023-257_replacements.txt"),
+            "--output",
+            str(tmp_path),
+        ],
+    )
+    location = capsys.readouterr().out.strip().splitlines()[-1]
+    assert Path(location).parent == tmp_path / "ewhc-ch-2023-257_original.xml"
+    assert Path(location).exists()
@@ -61,6 +61,19 @@ class TestReplaceStringWithTag:
             b'<p>In <ref nc="[2024] UKSC 1">the previous judgment</ref> ...</p>',
         )
 
+    def test_fragment_using_namespaces_declared_by_judgment(self):
+        """
+        A fragment cut from a judgment can use the uk prefix declared on the judgment's root, and is returned without
+        declaring the judgment's namespaces, so it reads the same once put back
+        """
+        fragment = '<p>The <ref uk:type="case">[2024] UKSC 1</ref> and the HRA</p>'
+        tag = create_tag_string("abbr", "HRA", {"title": "Human Rights Act", "uk:origin": "TNA"})
+
+        assert replace_string_with_tag(fragment, "HRA", tag) == (
+            '<p>The <ref uk:type="case">[2024] UKSC 1</ref> and the '
+            '<abbr title="Human Rights Act" uk:origin="TNA">HRA</abbr></p>'
+        )
+
 
 def test_simple_tag():
     assert_equal_xml(
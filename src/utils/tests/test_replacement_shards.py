@@ -0,0 +1,87 @@
+"""Unit tests for replacement shards"""
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from utils.replacement_shards import clear_shards, mark_shards_done, missing_shards, read_shards, upload_shard
+from utils.replacements import ReplacementLine, encode_replacements, read_replacements_file
+
+BUCKET = "replacements"
+KEY = "uksc/2023/1.txt"
+
+
+@pytest.fixture()
+def s3_bucket(monkeypatch):
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with mock_aws():
+        boto3.client("s3").create_bucket(Bucket=BUCKET)
+        yield
+
+
+@pytest.mark.usefixtures("s3_bucket")
+class TestReplacementShards:
+    def test_missing_until_every_stage_has_written(self):
+        """
+        Given some stages have written their shards for a judgment
+        When the missing shards are checked
+        Then only the stages still to write should be missing, whatever shards other judgments have
+        """
+        upload_shard(BUCKET, KEY, "leg", b"")
+        upload_shard(BUCKET, "uksc/2023/10.txt", "case", b"")
+        assert missing_shards(BUCKET, KEY) == ["case", "abb"]
+
+        upload_shard(BUCKET, KEY, "abb", b"")
+        upload_shard(BUCKET, KEY, "case", b"")
+        assert missing_shards(BUCKET, KEY) == []
+
+    def test_shards_are_joined_in_stage_order(self):
+        """
+        Given shards written out of order
+        When they are read
+        Then the replacements should be in stage order, whichever stage finished first
+        """
+        abbreviation = {"abb_match": "CA", "longform": "Court of Appeal"}
+        citation = {
+            "citation_match": "[2022] UKSC 3",
+            "corrected_citation": "[2022] UKSC 3",
+            "year": "2022",
+            "URI": "#",
+            "is_neutral": True,
+        }
+        upload_shard(BUCKET, KEY, "abb", encode_replacements([abbreviation], kind="abb"))
+        upload_shard(BUCKET, KEY, "case", encode_replacements([citation], kind="case"))
+
+        lines = read_replacements_file(read_shards(BUCKET, KEY))
+
+        assert [line.replacement_type for line in lines] == ["case", "abb"]
+        assert lines[1] == ReplacementLine("abb", ("CA", "Court of Appeal"))
+
+    def test_shards_are_marked_done_once(self):
+        """
+        Given every shard for a judgment has been written
+        When more than one stage marks the shards done
+        Then only the first should be told to start the replacer
+        """
+        for kind in ("case", "leg", "abb"):
+            upload_shard(BUCKET, KEY, kind, b"")
+
+        assert mark_shards_done(BUCKET, KEY)
+        assert not mark_shards_done(BUCKET, KEY)
+        assert mark_shards_done(BUCKET, "uksc/2023/10.txt")
+        assert missing_shards(BUCKET, KEY) == []
+
+    def test_cleared_shards_are_missing(self):
+        """
+        Given shards and a done marker left by an earlier enrichment
+        When they are cleared
+        Then every stage should be missing, and the shards can be marked done again
+        """
+        for kind in ("case", "leg", "abb"):
+            upload_shard(BUCKET, KEY, kind, b"")
+        mark_shards_done(BUCKET, KEY)
+
+        clear_shards(BUCKET, KEY)
+
+        assert missing_shards(BUCKET, KEY) == ["case", "leg", "abb"]
+        assert mark_shards_done(BUCKET, KEY)
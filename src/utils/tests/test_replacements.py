@@ -0,0 +1,117 @@
+import io
+from collections import namedtuple
+
+import msgpack
+import pytest
+
+from utils.replacements import (
+    CONTAINER_FORMAT,
+    ReplacementLine,
+    encode_replacements,
+    iter_replacements,
+    read_replacements_file,
+    write_replacements_file,
+)
+
+case = namedtuple("case", "citation_match corrected_citation year URI is_neutral span", defaults=(None,))
+abb = namedtuple("abb", "abb_match longform")
+
+
+class TestReplacementsFile:
+    def test_spans_are_written_alongside_the_values(self):
+        """
+        Given detections with and without spans
+        When they are written to a replacements file
+        Then spans should be written under their own key and not with the detection's values
+        """
+        replacements = [
+            case("[2022] UKSC 3", "[2022] UKSC 3", "2022", "#", True, (120, 13)),
+            abb("CA", "Court of Appeal"),
+        ]
+
+        assert write_replacements_file(replacements) == (
+            '{"case": ["[2022] UKSC 3", "[2022] UKSC 3", "2022", "#", true], "span": [120, 13]}\n'
+            '{"abb": ["CA", "Court of Appeal"]}\n'
+        )
+
+    def test_read_lines_with_and_without_spans(self):
+        """
+        Given a replacements file with lines written before and after spans were added
+        When it is read
+        Then each line should give its type, values and span if it has one
+        """
+        content = (
+            '{"case": ["[2022] UKSC 3", "[2022] UKSC 3", "2022", "#", true], "span": [120, 13]}\n'
+            '{"leg": ["Children Act 1989", "http://www.legislation.gov.uk/id/ukpga/1989/41", "1989 c. 41"]}\n'
+            "\n"
+        )
+
+        assert read_replacements_file(content) == [
+            ReplacementLine("case", ("[2022] UKSC 3", "[2022] UKSC 3", "2022", "#", True), (120, 13)),
+            ReplacementLine(
+                "leg",
+                ("Children Act 1989", "http://www.legislation.gov.uk/id/ukpga/1989/41", "1989 c. 41"),
+            ),
+        ]
+
+
+class TestReplacementsContainer:
+    def test_round_trip(self):
+        """
+        Given detections of several kinds, with and without spans
+        When they are encoded in a container and read back
+        Then each should give its kind, values and span
+        """
+        oblique = {"detected_ref": "that Act", "ref_position": 42, "ref_para": 3, "ref_tag": "<ref>that Act</ref>"}
+        content = encode_replacements(
+            [case("[2022] UKSC 3", "[2022] UKSC 3", "2022", "#", True, (120, 13)), abb("CA", "Court of Appeal")],
+        ) + encode_replacements([oblique], kind="oblique")
+
+        assert read_replacements_file(content) == [
+            ReplacementLine("case", ("[2022] UKSC 3", "[2022] UKSC 3", "2022", "#", True), (120, 13)),
+            ReplacementLine("abb", ("CA", "Court of Appeal")),
+            ReplacementLine("oblique", ("that Act", 42, 3, "<ref>that Act</ref>")),
+        ]
+
+    def test_streamed_in_small_chunks(self, monkeypatch):
+        """
+        Given a container larger than the chunk size it is read in
+        When it is read from a file-like object
+        Then every detection should be read
+        """
+        monkeypatch.setattr("utils.replacements.READ_CHUNK_SIZE", 16)
+        replacements = [abb(f"A{index}", f"Abbreviation {index}") for index in range(50)]
+
+        lines = list(iter_replacements(io.BytesIO(encode_replacements(replacements))))
+
+        assert [line.replacement for line in lines] == [tuple(replacement) for replacement in replacements]
+
+    def test_empty_file(self):
+        """
+        Given an empty replacements file
+        When it is read
+        Then there should be no detections
+        """
+        assert read_replacements_file(b"") == []
+
+    def test_unsupported_version(self):
+        """
+        Given a container written by a later version
+        When it is read
+        Then it should be rejected rather than misread
+        """
+        content = msgpack.packb([CONTAINER_FORMAT, 2]) + msgpack.packb(["abb", ["CA", "Court of Appeal"], None])
+
+        with pytest.raises(ValueError, match="version 2"):
+            read_replacements_file(content)
+
+    def test_unknown_kind(self):
+        """
+        Given a detection of a kind with no schema
+        When it is encoded
+        Then it should be rejected
+        """
+        unknown = namedtuple("unknown", "detected")
+
+        with pytest.raises(ValueError, match="Unknown replacement kind"):
+            encode_replacements([unknown("CA")])
@@ -31,6 +31,11 @@ module "lambda-extract-judgement-contents" {
       actions   = ["s3:PutObject", "s3:PutObjectAcl"],
       resources = ["${module.text_content_bucket.s3_bucket_arn}/*"]
     },
+    s3_delete = {
+      effect    = "Allow",
+      actions   = ["s3:DeleteObject"],
+      resources = ["${module.replacements_bucket.s3_bucket_arn}/*"]
+    },
     kms_get_key = {
       effect = "Allow",
       actions = [
@@ -40,7 +45,19 @@ module "lambda-extract-judgement-contents" {
         "kms:Decrypt",
         "kms:ReEncryptTo"
       ],
-      resources = [module.text_content_bucket.kms_key_arn, module.xml_original_bucket.kms_key_arn]
+      resources = [module.text_content_bucket.kms_key_arn, module.xml_original_bucket.kms_key_arn, module.replacements_bucket.kms_key_arn]
+    },
+    sqs_put_message = {
+      effect = "Allow",
+      actions = [
+        "sqs:SendMessage",
+        "sqs:GetQueueAttributes"
+      ],
+      resources = [
+        aws_sqs_queue.replacement-caselaw-queue.arn,
+        aws_sqs_queue.replacement-legislation-queue.arn,
+        aws_sqs_queue.replacement-abbreviations-queue.arn
+      ]
     },
     log_lambda = {
       effect = "Allow",
@@ -62,7 +79,14 @@ module "lambda-extract-judgement-contents" {
   }
 
   environment_variables = {
-    DEST_BUCKET_NAME = "${module.text_content_bucket.s3_bucket_id}"
+    DEST_BUCKET_NAME    = "${module.text_content_bucket.s3_bucket_id}"
+    REPLACEMENTS_BUCKET = "${module.replacements_bucket.s3_bucket_id}"
+    # the replacement detection lambdas run at the same time, each started from its own queue
+    DETECTION_QUEUE_NAMES = join(",", [
+      aws_sqs_queue.replacement-caselaw-queue.url,
+      aws_sqs_queue.replacement-legislation-queue.url,
+      aws_sqs_queue.replacement-abbreviations-queue.url
+    ])
   }
 
   cloudwatch_logs_retention_in_days = 365
@@ -224,6 +248,11 @@ module "lambda-determine-replacements-caselaw" {
       actions   = ["s3:PutObject", "s3:PutObjectAcl"],
       resources = ["${module.replacements_bucket.s3_bucket_arn}/*"]
     },
+    s3_list = {
+      effect    = "Allow",
+      actions   = ["s3:ListBucket"],
+      resources = [module.replacements_bucket.s3_bucket_arn]
+    },
     kms_get_key = {
       effect = "Allow",
       actions = [
@@ -245,6 +274,16 @@ module "lambda-determine-replacements-caselaw" {
       ],
       resources = ["${var.postgress_master_password_secret_id}"]
     },
+    sqs_get_message = {
+      effect = "Allow",
+      actions = [
+        "sqs:ReceiveMessage",
+        "sqs:DeleteMessage",
+        "sqs:GetQueueAttributes"
+      ],
+      "Effect" : "Allow",
+      resources = [aws_sqs_queue.replacement-caselaw-queue.arn]
+    },
     sqs_put_message = {
       effect = "Allow",
       actions = [
@@ -252,7 +291,7 @@ module "lambda-determine-replacements-caselaw" {
         "sqs:GetQueueAttributes"
       ],
       "Effect" : "Allow",
-      resources = [aws_sqs_queue.replacement-caselaw-queue.arn]
+      resources = [aws_sqs_queue.replacements-queue.arn]
     },
     log_lambda = {
       effect = "Allow",
@@ -265,14 +304,6 @@ module "lambda-determine-replacements-caselaw" {
     }
   }
 
-  allowed_triggers = {
-    S3BucketUpload = {
-      service    = "s3"
-      principal  = "s3.amazonaws.com"
-      source_arn = "${module.text_content_bucket.s3_bucket_arn}"
-    }
-  }
-
   attach_policies    = true
   number_of_policies = 2
   policies = [
@@ -311,7 +342,7 @@ module "lambda-determine-replacements-caselaw" {
     HOSTNAME   = "${var.postgress_hostname}"
 
 
-    DEST_QUEUE_NAME     = aws_sqs_queue.replacement-caselaw-queue.url
+    DEST_QUEUE_NAME     = aws_sqs_queue.replacements-queue.url
     RULES_FILE_BUCKET   = "${module.rules_bucket.s3_bucket_id}"
     RULES_FILE_KEY      = "citation_patterns.jsonl"
     REPLACEMENTS_BUCKET = "${module.replacements_bucket.s3_bucket_id}"
@@ -357,6 +388,11 @@ module "lambda-determine-replacements-legislation" {
       actions   = ["s3:PutObject", "s3:PutObjectAcl"],
       resources = ["${module.replacements_bucket.s3_bucket_arn}/*", "${module.tracking_bucket.s3_bucket_arn}/*"]
     },
+    s3_list = {
+      effect    = "Allow",
+      actions   = ["s3:ListBucket"],
+      resources = [module.replacements_bucket.s3_bucket_arn]
+    },
     kms_get_key = {
       effect = "Allow",
       actions = [
@@ -376,7 +412,7 @@ module "lambda-determine-replacements-legislation" {
         "sqs:GetQueueAttributes"
       ],
       "Effect" : "Allow",
-      resources = [aws_sqs_queue.replacement-caselaw-queue.arn]
+      resources = [aws_sqs_queue.replacement-legislation-queue.arn]
     },
     sqs_put_message = {
       effect = "Allow",
@@ -385,7 +421,7 @@ module "lambda-determine-replacements-legislation" {
         "sqs:GetQueueAttributes"
       ],
       "Effect" : "Allow",
-      resources = [aws_sqs_queue.replacement-legislation-queue.arn]
+      resources = [aws_sqs_queue.replacements-queue.arn]
     },
     secrets_get = {
       effect = "Allow",
@@ -445,7 +481,7 @@ module "lambda-determine-replacements-legislation" {
     PORT       = "5432"
     HOSTNAME   = "${var.postgress_hostname}"
 
-    DEST_QUEUE_NAME = aws_sqs_queue.replacement-legislation-queue.url
+    DEST_QUEUE_NAME = aws_sqs_queue.replacements-queue.url
 
     REPLACEMENTS_BUCKET = "${module.replacements_bucket.s3_bucket_id}"
     SOURCE_BUCKET       = "${module.text_content_bucket.s3_bucket_arn}"
@@ -492,6 +528,11 @@ module "lambda-determine-replacements-abbreviations" {
       actions   = ["s3:PutObject", "s3:PutObjectAcl"],
       resources = ["${module.replacements_bucket.s3_bucket_arn}/*"]
     },
+    s3_list = {
+      effect    = "Allow",
+      actions   = ["s3:ListBucket"],
+      resources = [module.replacements_bucket.s3_bucket_arn]
+    },
     kms_get_key = {
       effect = "Allow",
       actions = [
@@ -511,7 +552,7 @@ module "lambda-determine-replacements-abbreviations" {
         "sqs:GetQueueAttributes"
       ],
       "Effect" : "Allow",
-      resources = [aws_sqs_queue.replacement-legislation-queue.arn]
+      resources = [aws_sqs_queue.replacement-abbreviations-queue.arn]
     },
 
     sqs_put_message = {
@@ -521,7 +562,7 @@ module "lambda-determine-replacements-abbreviations" {
         "sqs:GetQueueAttributes"
       ],
       "Effect" : "Allow",
-      resources = [aws_sqs_queue.replacement-abbreviations-queue.arn]
+      resources = [aws_sqs_queue.replacements-queue.arn]
     },
     log_lambda = {
       effect = "Allow",
@@ -559,7 +600,7 @@ module "lambda-determine-replacements-abbreviations" {
 
   environment_variables = {
 
-    DEST_QUEUE_NAME     = aws_sqs_queue.replacement-abbreviations-queue.url
+    DEST_QUEUE_NAME     = aws_sqs_queue.replacements-queue.url
     REPLACEMENTS_BUCKET = "${module.replacements_bucket.s3_bucket_id}"
     SOURCE_BUCKET       = "${module.text_content_bucket.s3_bucket_arn}"
   }
@@ -791,6 +832,11 @@ module "lambda-make-replacements" {
       actions   = ["s3:PutObject", "s3:PutObjectAcl"],
       resources = ["${module.xml_enriched_bucket.s3_bucket_arn}/*"]
     },
+    s3_list = {
+      effect    = "Allow",
+      actions   = ["s3:ListBucket"],
+      resources = [module.replacements_bucket.s3_bucket_arn]
+    },
     kms_get_key = {
       effect = "Allow",
       actions = [
@@ -809,7 +855,7 @@ module "lambda-make-replacements" {
         "sqs:DeleteMessage",
         "sqs:GetQueueAttributes"
       ],
-      resources = ["${aws_sqs_queue.replacements-queue.arn}", "${aws_sqs_queue.replacement-caselaw-queue.arn}", "${aws_sqs_queue.replacement-legislation-queue.arn}", "${aws_sqs_queue.replacement-abbreviations-queue.arn}"]
+      resources = ["${aws_sqs_queue.replacements-queue.arn}"]
     },
     log_lambda = {
       effect = "Allow",
@@ -848,15 +894,6 @@ module "lambda-make-replacements" {
 
 }
 
-resource "aws_s3_bucket_notification" "text_content_bucket_notification" {
-  bucket = module.text_content_bucket.s3_bucket_id
-
-  lambda_function {
-    lambda_function_arn = module.lambda-determine-replacements-caselaw.lambda_function_arn
-    events              = ["s3:ObjectCreated:*"]
-  }
-}
-
 
 resource "aws_s3_bucket_notification" "xml_enriched_bucket_notification" {
   bucket = module.xml_enriched_bucket.s3_bucket_id
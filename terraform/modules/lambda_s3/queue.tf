@@ -22,7 +22,7 @@ resource "aws_sqs_queue_policy" "replacement-caselaw-queue-policy" {
       "Action": "sqs:SendMessage",
       "Resource": "${aws_sqs_queue.replacement-caselaw-queue.arn}",
       "Condition": {
-        "ArnEquals": { "aws:SourceArn": "${module.lambda-determine-replacements-caselaw.lambda_function_arn}" }
+        "ArnEquals": { "aws:SourceArn": "${module.lambda-extract-judgement-contents.lambda_function_arn}" }
       }
     }
   ]
@@ -80,7 +80,13 @@ resource "aws_sqs_queue_policy" "replacements-queue-policy" {
       "Action": "sqs:SendMessage",
       "Resource": "${aws_sqs_queue.replacements-queue.arn}",
       "Condition": {
-        "ArnEquals": { "aws:SourceArn": "${module.lambda-make-replacements.lambda_function_arn}" }
+        "ArnEquals": {
+          "aws:SourceArn": [
+            "${module.lambda-determine-replacements-caselaw.lambda_function_arn}",
+            "${module.lambda-determine-replacements-legislation.lambda_function_arn}",
+            "${module.lambda-determine-replacements-abbreviations.lambda_function_arn}"
+          ]
+        }
       }
     }
   ]
@@ -114,7 +120,7 @@ resource "aws_sqs_queue_policy" "replacement-legislation-queue-policy" {
       "Action": "sqs:SendMessage",
       "Resource": "${aws_sqs_queue.replacement-legislation-queue.arn}",
       "Condition": {
-        "ArnEquals": { "aws:SourceArn": "${module.lambda-determine-replacements-legislation.lambda_function_arn}" }
+        "ArnEquals": { "aws:SourceArn": "${module.lambda-extract-judgement-contents.lambda_function_arn}" }
       }
     }
   ]
@@ -159,7 +165,7 @@ resource "aws_sqs_queue_policy" "replacements-abbreviations-queue-policy" {
       "Action": "sqs:SendMessage",
       "Resource": "${aws_sqs_queue.replacement-abbreviations-queue.arn}",
       "Condition": {
-        "ArnEquals": { "aws:SourceArn": "${module.lambda-determine-replacements-abbreviations.lambda_function_arn}" }
+        "ArnEquals": { "aws:SourceArn": "${module.lambda-extract-judgement-contents.lambda_function_arn}" }
       }
     }
   ]
@@ -329,32 +335,48 @@ resource "aws_sns_topic" "enrichment_error_alerts" {
 }
 
 # Event source from SQS
+# extract-judgement-contents starts each replacement detection lambda from its own queue, so they run at the same time
 resource "aws_lambda_event_source_mapping" "sqs_replacements_event_source_mapping_caselaw" {
-  event_source_arn = aws_sqs_queue.replacement-caselaw-queue.arn
-  enabled          = true
-  function_name    = module.lambda-determine-replacements-legislation.lambda_function_arn
-  batch_size       = 1
+  event_source_arn        = aws_sqs_queue.replacement-caselaw-queue.arn
+  enabled                 = true
+  function_name           = module.lambda-determine-replacements-caselaw.lambda_function_arn
+  batch_size              = 1
+  function_response_types = ["ReportBatchItemFailures"]
 }
 
 resource "aws_lambda_event_source_mapping" "sqs_replacements_legislation_event_source_mapping" {
-  event_source_arn = aws_sqs_queue.replacement-legislation-queue.arn
-  enabled          = true
-  function_name    = module.lambda-determine-replacements-abbreviations.lambda_function_arn
-  batch_size       = 1
+  event_source_arn        = aws_sqs_queue.replacement-legislation-queue.arn
+  enabled                 = true
+  function_name           = module.lambda-determine-replacements-legislation.lambda_function_arn
+  batch_size              = 1
+  function_response_types = ["ReportBatchItemFailures"]
 }
 
 resource "aws_lambda_event_source_mapping" "sqs_replacements_abbreviations_event_source_mapping" {
-  event_source_arn = aws_sqs_queue.replacement-abbreviations-queue.arn
-  enabled          = true
-  function_name    = module.lambda-make-replacements.lambda_function_arn
-  batch_size       = 1
+  event_source_arn        = aws_sqs_queue.replacement-abbreviations-queue.arn
+  enabled                 = true
+  function_name           = module.lambda-determine-replacements-abbreviations.lambda_function_arn
+  batch_size              = 1
+  function_response_types = ["ReportBatchItemFailures"]
+}
+
+# the last detection lambda to write its replacements starts make-replacements
+# each record parses and rewrites a whole judgment, which is CPU bound and shares the GIL between the batch's threads,
+# so a batch of one keeps a large judgment within the lambda's 30s timeout without a timeout redelivering its neighbours
+resource "aws_lambda_event_source_mapping" "sqs_replacements_event_source_mapping" {
+  event_source_arn        = aws_sqs_queue.replacements-queue.arn
+  enabled                 = true
+  function_name           = module.lambda-make-replacements.lambda_function_arn
+  batch_size              = 1
+  function_response_types = ["ReportBatchItemFailures"]
 }
 
 resource "aws_lambda_event_source_mapping" "sqs_validated_xml_event_source_mapping" {
-  event_source_arn = aws_sqs_queue.xml-validated-queue.arn
-  enabled          = true
-  function_name    = module.lambda-push-enriched-xml.lambda_function_arn
-  batch_size       = 1
+  event_source_arn        = aws_sqs_queue.xml-validated-queue.arn
+  enabled                 = true
+  function_name           = module.lambda-push-enriched-xml.lambda_function_arn
+  batch_size              = 10
+  function_response_types = ["ReportBatchItemFailures"]
 }
 
 
@@ -453,10 +475,11 @@ resource "aws_sqs_queue_policy" "fetch_xml_queue_policy" {
 
 
 resource "aws_lambda_event_source_mapping" "sqs_replacements_fetch_xml_event_source_mapping" {
-  event_source_arn = aws_sqs_queue.fetch_xml_queue.arn
-  enabled          = true
-  function_name    = module.lambda-fetch-xml.lambda_function_arn
-  batch_size       = 1
+  event_source_arn        = aws_sqs_queue.fetch_xml_queue.arn
+  enabled                 = true
+  function_name           = module.lambda-fetch-xml.lambda_function_arn
+  batch_size              = 10
+  function_response_types = ["ReportBatchItemFailures"]
 }
 
 resource "aws_sns_topic_subscription" "fetch_xml_queue_subscription" {